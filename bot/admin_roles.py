@@ -0,0 +1,143 @@
+"""
+Роли сотрудников и проверка прав.
+
+Роли хранятся в таблице admin_roles и держатся в памяти процесса: проверка права — поиск в словаре,
+без запросов к базе и записи в лог. Администраторы из переменных окружения (ADMIN_MAKSIM, ADMIN_ROMAN,
+ADMIN_ACCOUNT) имеют роль admin всегда, даже при пустой таблице. Администратор имеет права всех ролей.
+
+Триггер на admin_roles присылает уведомление admin_roles_changed при любом изменении таблицы
+(в том числе ручном), и каждый процесс бота перечитывает роли.
+
+Права проверяются фильтром RoleFilter на роутерах ролей (bot_work.py), а не в каждом обработчике.
+"""
+import asyncio
+import logging
+from typing import Optional
+from aiogram.filters import BaseFilter
+from aiogram.types import TelegramObject, User as TelegramUser
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from config import ADMIN_MAKSIM, ADMIN_ROMAN, ADMIN_ACCOUNT
+from database import AdminRole, engine, get_async_session
+
+logger = logging.getLogger(__name__)
+
+ADMIN = "admin"
+PAYOUT_OPERATOR = "payout_operator"
+VACANCY_MODERATOR = "vacancy_moderator"
+
+ROLE_TITLES = {
+    ADMIN: "Администратор",
+    PAYOUT_OPERATOR: "Оператор выплат",
+    VACANCY_MODERATOR: "Модератор вакансий",
+}
+
+CHANGE_CHANNEL = "admin_roles_changed"
+
+BOOTSTRAP_ADMINS = frozenset(int(user_id) for user_id in (ADMIN_MAKSIM, ADMIN_ROMAN, ADMIN_ACCOUNT))  # type: ignore
+
+# Telegram ID -> роли; заменяется целиком при перечитывании
+_roles: dict[int, frozenset[str]] = {user_id: frozenset({ADMIN}) for user_id in BOOTSTRAP_ADMINS}
+_listener_connection = None
+_reload_tasks: set[asyncio.Task] = set()
+
+
+def has_role(user_id: int, *roles: str) -> bool:
+    """
+    Есть ли у пользователя одна из ролей. Без ролей — есть ли у него хоть какая-то роль.
+    """
+    user_roles = _roles.get(user_id)
+    if not user_roles:
+        return False
+    return not roles or ADMIN in user_roles or not user_roles.isdisjoint(roles)
+
+
+def roles_of(user_id: int) -> frozenset[str]:
+    return _roles.get(user_id, frozenset())
+
+
+class RoleFilter(BaseFilter):
+    """
+    Пропускает сообщения и нажатия только от пользователей с одной из ролей (без ролей — с любой ролью).
+    """
+
+    def __init__(self, *roles: str):
+        self.roles = roles
+
+    async def __call__(self, event: TelegramObject, event_from_user: Optional[TelegramUser] = None) -> bool:
+        return event_from_user is not None and has_role(event_from_user.id, *self.roles)
+
+
+async def load_roles():
+    """
+    Перечитывает роли из базы.
+    """
+    global _roles
+    async with get_async_session() as session:
+        result = await session.execute(select(AdminRole.user_id, AdminRole.role))
+        rows = result.all()
+
+    roles: dict[int, set[str]] = {user_id: {ADMIN} for user_id in BOOTSTRAP_ADMINS}
+    for user_id, role in rows:
+        roles.setdefault(user_id, set()).add(role)
+    _roles = {user_id: frozenset(user_roles) for user_id, user_roles in roles.items()}
+    logger.info(f"Loaded roles of {len(_roles)} staff members")
+
+
+async def grant_role(user_id: int, role: str, granted_by: int) -> bool:
+    """
+    Выдает роль. Возвращает False, если роль у пользователя уже была.
+    """
+    async with get_async_session() as session:
+        result = await session.execute(
+            pg_insert(AdminRole)
+            .values(user_id=user_id, role=role, granted_by=granted_by)
+            .on_conflict_do_nothing(index_elements=[AdminRole.user_id, AdminRole.role])
+        )
+        await session.commit()
+    await load_roles()  # Не ждем уведомления, чтобы роль действовала сразу в этом процессе
+    return bool(result.rowcount)  # type: ignore
+
+
+async def revoke_role(user_id: int, role: str) -> bool:
+    """
+    Отзывает роль. Возвращает False, если такой роли не было.
+    """
+    async with get_async_session() as session:
+        result = await session.execute(delete(AdminRole).where(AdminRole.user_id == user_id, AdminRole.role == role))
+        await session.commit()
+    await load_roles()
+    return bool(result.rowcount)  # type: ignore
+
+
+async def _reload():
+    try:
+        await load_roles()
+    except Exception as e:
+        logger.error(f"Failed to reload roles: {e}")
+
+
+def _on_change(connection, pid, channel, payload):
+    task = asyncio.get_running_loop().create_task(_reload())
+    _reload_tasks.add(task)  # Держим ссылку, иначе задача может быть собрана до завершения
+    task.add_done_callback(_reload_tasks.discard)
+
+
+async def start_role_listener():
+    """
+    Загружает роли и подписывается на их изменения. Держит отдельное соединение из пула.
+    """
+    global _listener_connection
+    await load_roles()
+    _listener_connection = await engine.connect()
+    raw_connection = await _listener_connection.get_raw_connection()
+    await raw_connection.driver_connection.add_listener(CHANGE_CHANNEL, _on_change)  # type: ignore
+    logger.info("Listening for role changes")
+
+
+async def stop_role_listener():
+    global _listener_connection
+    if _listener_connection is not None:
+        await _listener_connection.close()
+        _listener_connection = None
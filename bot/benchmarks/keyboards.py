@@ -0,0 +1,97 @@
+"""
+Микробенчмарк клавиатур: сборка клавиатуры на каждый вызов против готовых объектов из keyboards.py.
+
+Для каждого случая выводятся время одного рендера и число выделенных объектов/байт на рендер
+(по tracemalloc).
+
+    cd bot
+    python -m benchmarks.keyboards --iterations 20000
+"""
+import argparse
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+import pytz
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+import keyboards
+
+NOW = datetime.now(timezone.utc)
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+
+def build_main_menu():
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="👷🏻‍♂️ Актуальные вакансии"), KeyboardButton(text="🫂 Рефералы")],
+            [KeyboardButton(text="🆘 Помощь")],
+            [KeyboardButton(text="👤 Профиль")]
+        ],
+        resize_keyboard=True
+    )
+
+
+def build_admin_menu():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=button.text, callback_data=button.callback_data)]
+        for (button,) in keyboards.ADMIN_MENU.inline_keyboard
+    ])
+
+
+def build_bank_selection():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=button.text, callback_data=button.callback_data) for button in row]
+        for row in keyboards.BANK_SELECTION.inline_keyboard
+    ])
+
+
+def build_pagination(page: int = 3):
+    buttons = [
+        InlineKeyboardButton(text="⬅️ Назад", callback_data=f"vacancy_page_{page - 1}"),
+        InlineKeyboardButton(text="➡️ Вперед", callback_data=f"vacancy_page_{page + 1}"),
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+CASES = {
+    "main_menu": (build_main_menu, lambda: keyboards.MAIN_MENU),
+    "admin_menu": (build_admin_menu, lambda: keyboards.ADMIN_MENU),
+    "bank_selection": (build_bank_selection, lambda: keyboards.BANK_SELECTION),
+    "pagination": (build_pagination, lambda: keyboards.paginated_keyboard("vacancy_page_", 3, True)),
+    "moscow_time": (
+        lambda: NOW.astimezone(pytz.timezone('Europe/Moscow')).strftime('%d.%m.%Y %H:%M'),
+        lambda: NOW.astimezone(MOSCOW_TZ).strftime('%d.%m.%Y %H:%M'),
+    ),
+}
+
+
+def allocations_per_call(function, iterations: int) -> tuple[float, float]:
+    """
+    Количество блоков и байт, выделенных за один вызов (включая освобожденные позже).
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [function() for _ in range(iterations)]  # Держим результаты, чтобы учесть их память
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del results
+    return blocks / iterations, size / iterations
+
+
+def main(args):
+    print(f"{'Клавиатура':<16}{'Вариант':<10}{'мкс/рендер':>12}{'блоков':>10}{'байт':>10}")
+    for name, variants in CASES.items():
+        for label, function in zip(("сборка", "реестр"), variants):
+            function()  # Прогрев (в том числе кэша lru_cache)
+            seconds = timeit.timeit(function, number=args.iterations)
+            blocks, size = allocations_per_call(function, min(args.iterations, 2000))
+            print(f"{name:<16}{label:<10}{seconds / args.iterations * 1e6:>12.2f}{blocks:>10.1f}{size:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарк клавиатур")
+    parser.add_argument("--iterations", type=int, default=20000, help="Сколько раз собрать каждую клавиатуру")
+    main(parser.parse_args())
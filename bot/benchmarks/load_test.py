@@ -0,0 +1,212 @@
+"""
+Нагрузочный тест: прогоняет синтетические Telegram-обновления через настоящий Dispatcher из bot_work.py.
+
+Запросы к Telegram API перехватываются подменной сессией бота, база данных — настоящая
+(локальный Postgres из DATABASE_URL). Для каждого сценария выводятся p50/p99 времени обработки,
+число SQL-запросов и вызовов Telegram API на одно обновление, а в конце — общая пропускная способность.
+
+    cd bot
+    python -m benchmarks.load_test --seed 10000 --updates 5000 --concurrency 50
+"""
+import os
+
+# Бот импортирует config при загрузке модулей, поэтому подставляем значения до импортов
+os.environ.setdefault("API_KEY", "123456:LOAD-TEST")
+os.environ.setdefault("GROUP_CHAT_ID", "-1001")
+os.environ.setdefault("ADMIN_MAKSIM", "1")
+os.environ.setdefault("ADMIN_ROMAN", "2")
+os.environ.setdefault("ADMIN_ACCOUNT", "3")
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetChatMember, GetMe, SendMessage, SendDocument, EditMessageText, EditMessageReplyMarkup
+from aiogram.methods.base import TelegramMethod
+from aiogram.types import Update, Message, Chat, User as TgUser, CallbackQuery, Contact, ChatMemberMember
+from sqlalchemy import event
+import bot_work
+from database import engine
+from handlers.registration import Registration
+from query_plans import seed, LOCAL_HOSTS, SEED_USER_ID_BASE
+
+# Статистика сценария, который сейчас обрабатывается в данной задаче asyncio
+current_stats = contextvars.ContextVar("current_stats", default=None)
+message_ids = itertools.count(1)
+
+
+class ScenarioStats:
+    def __init__(self):
+        self.latencies = []
+        self.queries = 0
+        self.api_calls = 0
+        self.errors = 0
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия бота, которая не ходит в сеть и отвечает правдоподобными объектами.
+    """
+
+    async def make_request(self, bot, method: TelegramMethod, timeout=None):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.api_calls += 1
+
+        if isinstance(method, GetChatMember):
+            return ChatMemberMember(user=TgUser(id=method.user_id, is_bot=False, first_name="Load"))
+        if isinstance(method, GetMe):
+            return TgUser(id=1, is_bot=True, first_name="Bot", username="load_test_bot")
+        if isinstance(method, (SendMessage, SendDocument, EditMessageText, EditMessageReplyMarkup)):
+            chat_id = getattr(method, "chat_id", 0) or 0
+            return Message(
+                message_id=next(message_ids), date=datetime.now(), chat=Chat(id=int(chat_id), type="private"), text=""
+            ).as_(bot)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def _private_message(user_id: int, **fields) -> Message:
+    return Message(
+        message_id=next(message_ids), date=datetime.now(), chat=Chat(id=user_id, type="private"),
+        from_user=TgUser(id=user_id, is_bot=False, first_name="Load"), **fields
+    )
+
+
+def text_update(text: str):
+    def build(update_id: int, user_id: int) -> Update:
+        return Update(update_id=update_id, message=_private_message(user_id, text=text))
+    return build
+
+
+def callback_update(data: str):
+    def build(update_id: int, user_id: int) -> Update:
+        return Update(update_id=update_id, callback_query=CallbackQuery(
+            id=str(update_id), from_user=TgUser(id=user_id, is_bot=False, first_name="Load"),
+            chat_instance="load", message=_private_message(user_id, text="..."), data=data
+        ))
+    return build
+
+
+def contact_update(update_id: int, user_id: int) -> Update:
+    return Update(update_id=update_id, message=_private_message(
+        user_id, contact=Contact(phone_number=f"+7000{user_id % 10**9:09d}", first_name="Load", user_id=user_id)
+    ))
+
+
+def group_vacancy_update(update_id: int, user_id: int) -> Update:
+    return Update(update_id=update_id, message=Message(
+        message_id=next(message_ids), date=datetime.now(), chat=Chat(id=-1001, type="supergroup"),
+        from_user=TgUser(id=user_id, is_bot=False, first_name="Load"), text=f"#вакансия Нагрузочный тест {update_id}"
+    ))
+
+
+# Сценарий: (построитель обновления, нужен ли зарегистрированный пользователь, вес)
+SCENARIOS = {
+    "start": (text_update("/start"), True, 2),
+    "profile": (text_update("👤 Профиль"), True, 4),
+    "referrals": (text_update("🫂 Рефералы"), True, 2),
+    "vacancies": (text_update("👷🏻‍♂️ Актуальные вакансии"), True, 3),
+    "history_receipts": (callback_update("history_of_receipts"), True, 2),
+    "history_withdrawals": (callback_update("history_of_withdrawal"), True, 2),
+    "vacancy_page": (callback_update("vacancy_page_2"), True, 2),
+    "registration_contact": (contact_update, False, 1),
+    "group_vacancy_post": (group_vacancy_update, True, 1),
+}
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+
+
+async def prepare_registration(bot, user_id: int):
+    """
+    Переводит нового пользователя в состояние ожидания контакта, как после ввода ФИО.
+    """
+    context = bot_work.dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+    await context.set_state(Registration.waiting_for_contact)
+    await context.set_data({"full_name": "Иванов Иван Иванович"})
+
+
+async def run(args):
+    bot = bot_work.bot
+    bot.session = FakeTelegramSession()
+    bot_work.dp.include_router(bot_work.router)
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    stats = defaultdict(ScenarioStats)
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][2] for name in names]
+    # Новые пользователи для сценария регистрации не пересекаются с засеянными и с прошлыми запусками
+    new_user_ids = itertools.count(SEED_USER_ID_BASE + int(time.time()) * 1000)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def process(update_id: int, name: str):
+        build, registered, _ = SCENARIOS[name]
+        if registered:
+            user_id = SEED_USER_ID_BASE + random.randint(1, args.users)
+        else:
+            user_id = next(new_user_ids)
+            await prepare_registration(bot, user_id)
+        update = build(update_id, user_id)
+
+        async with semaphore:
+            scenario_stats = stats[name]
+            current_stats.set(scenario_stats)
+            started = time.perf_counter()
+            try:
+                await bot_work.dp.feed_update(bot, update)
+            except Exception:
+                scenario_stats.errors += 1
+            scenario_stats.latencies.append(time.perf_counter() - started)
+
+    plan = random.choices(names, weights=weights, k=args.updates)
+    started = time.perf_counter()
+    await asyncio.gather(*(process(update_id, name) for update_id, name in enumerate(plan, start=1)))
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{'Сценарий':<22}{'N':>7}{'p50, мс':>10}{'p99, мс':>10}{'SQL/upd':>9}{'API/upd':>9}{'Ошибки':>8}")
+    for name in names:
+        scenario_stats = stats.get(name)
+        if not scenario_stats or not scenario_stats.latencies:
+            continue
+        latencies = sorted(scenario_stats.latencies)
+        count = len(latencies)
+        p50 = latencies[int(count * 0.50)] * 1000
+        p99 = latencies[min(count - 1, int(count * 0.99))] * 1000
+        print(f"{name:<22}{count:>7}{p50:>10.1f}{p99:>10.1f}{scenario_stats.queries / count:>9.1f}{scenario_stats.api_calls / count:>9.1f}{scenario_stats.errors:>8}")
+
+    print(f"\nОбработано {args.updates} обновлений за {elapsed:.2f} с: {args.updates / elapsed:.1f} обновлений/с")
+
+
+async def main(args):
+    if engine.url.host not in LOCAL_HOSTS:
+        raise RuntimeError(f"Нагрузочный тест пишет в базу и запускается только на локальной базе, а не {engine.url.host}")
+
+    try:
+        if args.seed:
+            await seed(args.seed)
+        await run(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--updates", type=int, default=2000, help="Сколько обновлений отправить")
+    parser.add_argument("--concurrency", type=int, default=50, help="Сколько обновлений обрабатывать одновременно")
+    parser.add_argument("--users", type=int, default=1000, help="Сколько синтетических пользователей использовать")
+    parser.add_argument("--seed", type=int, default=0, help="Предварительно заполнить базу указанным числом пользователей")
+    asyncio.run(main(parser.parse_args()))
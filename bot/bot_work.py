@@ -1,29 +1,70 @@
 import asyncio
-import logging
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, StateFilter, ChatMemberUpdatedFilter, IS_MEMBER, IS_NOT_MEMBER
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import API_KEY
+from config import API_KEY, GROUP_CHAT_ID, METRICS_HOST, METRICS_PORT, UPDATE_WORKERS, UPDATE_QUEUE_SIZE, UPDATE_MAX_PENDING, FSM_STORAGE, CALLBACK_DEBOUNCE_SECONDS
 from handlers.user_profile import profile_handler, history_of_withdrawal, money_withdrawal, card_or_phone_number_for_slow, enter_card_or_phone_number_for_slow, enter_instant_withdrawal, back_in_profile, enter_slow_withdrawal, NavigationForProfile, history, history_of_receipts, bank_selection, card_or_phone_number_for_instant, enter_card_or_phone_number_for_instant, back_to_instant_withdrawal, back_to_slow_withdrawal, use_stored_phone_number
 from handlers.help import help_handler, user_agreement_callback_handler
 from referral_system import referral_callback_handler, referrals_handler, back_in_referral
 from handlers.registration import contact_handler, process_full_name, start_command, Registration
-from handlers.admin_menu import admin_menu, change_balance, change_balance_command, delete_user_command, process_delete_user, AdminMenu, list_transactions, approve_transaction, cancel_transaction, back_in_admin_menu, blacklist_user, blacklist_user_command, unblock_user_command, unblock_user, process_broadcast, broadcast_command, funds_transfer, funds_transfer_command, change_vacancies_command, process_change_vacancies, info_about_user, info_about_user_command, info_about_bot
-from check_user_in_group import process_check_membership
+from handlers.admin_menu import admin_menu, change_balance, change_balance_command, delete_user_command, process_delete_user, AdminMenu, list_transactions, change_transaction_queue, approve_transaction_page, export_transaction_queue, export_payouts, redownload_payouts, approve_transaction, cancel_transaction, back_in_admin_menu, blacklist_user, blacklist_user_command, unblock_user_command, unblock_user, process_broadcast, broadcast_command, funds_transfer, funds_transfer_command, funds_transfer_confirm, change_vacancies_command, process_change_vacancies, info_about_user, info_about_user_command, user_info_section, info_about_bot, fraud_flags_list, fraud_flag_review, grant_role_command, revoke_role_command, access_denied
+from check_user_in_group import process_check_membership, member_left_group
 from membership import CheckUserMiddleware
 from handlers.available_work import track_vacancies, show_vacancies, change_page
+from database import init_db, engine
+from metrics import InstrumentationMiddleware, TelegramApiMetricsMiddleware, instrument_engine, start_metrics_server
+from update_queues import PerUserQueueMiddleware
+from callback_debounce import CallbackDebounceMiddleware
+from fsm_storage import PostgresStorage
+from user_cache import BROADCAST as USER_CACHE_BROADCAST, start_invalidation_listener, stop_invalidation_listener
+from jobs import build_scheduler
+from logging_setup import setup_logging, RequestIdMiddleware
+from admin_roles import RoleFilter, ADMIN, PAYOUT_OPERATOR, VACANCY_MODERATOR, start_role_listener, stop_role_listener
 
 #TODO сделать сотрудничество, правила, связь с админами и тд (работодатель, человек который будет приводить людей)
 #TODO сделать предложить идею
 #TODO на потом: можно сделать типо заработок за продвижение, например 50 рублей за историю или еще что-нибудь
 
-# Логирование
-logging.basicConfig(level=logging.INFO)
+# Логирование: JSON через отдельный поток, с ID обновления и маскировкой телефонов и карт
+setup_logging()
 
 bot = Bot(token=API_KEY)  # type: ignore
-storage = MemoryStorage()
+storage = PostgresStorage() if FSM_STORAGE == "postgres" else MemoryStorage()
 dp = Dispatcher(bot=bot, storage=storage)
 
+# Метрики: время обработчиков, SQL-запросы и вызовы Telegram API
+instrument_engine(engine)
+bot.session.middleware(TelegramApiMetricsMiddleware())
+dp.message.middleware(InstrumentationMiddleware())
+dp.callback_query.middleware(InstrumentationMiddleware())
+
+# Обновления разных пользователей обрабатываются параллельно, одного пользователя — по очереди
+update_queues = PerUserQueueMiddleware(UPDATE_WORKERS, UPDATE_QUEUE_SIZE, UPDATE_MAX_PENDING) if UPDATE_WORKERS else None
+if update_queues:
+    dp.update.outer_middleware(update_queues)
+    dp.startup.register(update_queues.start)
+    dp.shutdown.register(update_queues.stop)
+
+# После очередей: ID обновления должен быть виден в обработчике очереди, где выполняются хэндлеры
+dp.update.outer_middleware(RequestIdMiddleware())
+
+# Кэш профилей сбрасывается по уведомлениям из других процессов и экземпляров бота
+if USER_CACHE_BROADCAST:
+    dp.startup.register(start_invalidation_listener)
+    dp.shutdown.register(stop_invalidation_listener)
+
+# Фоновые задачи: запускаются вместе с диспетчером, при остановке дописывают накопленную активность
+scheduler = build_scheduler()
+dp.startup.register(scheduler.start)
+dp.shutdown.register(scheduler.stop)
+
+# Повторные нажатия на кнопки отбрасываются до проверки пользователя и обработчиков
+dp.callback_query.outer_middleware(CallbackDebounceMiddleware(CALLBACK_DEBOUNCE_SECONDS))
+
+# Роли сотрудников: загружаются при старте и перечитываются при изменении таблицы admin_roles
+dp.startup.register(start_role_listener)
+dp.shutdown.register(stop_role_listener)
+
 dp.message.middleware(CheckUserMiddleware())
 dp.callback_query.middleware(CheckUserMiddleware())
 
@@ -31,7 +72,6 @@ router = Router()
 
 # Регистрация обработчиков и меню
 router.message.register(start_command, Command("start"))
-router.message.register(admin_menu, Command("admin_menu"))
 router.message.register(help_handler, Command("help"))
 router.message.register(contact_handler, F.content_type == "contact")
 router.message.register(profile_handler, F.text == "👤 Профиль")
@@ -42,19 +82,9 @@ router.message.register(show_vacancies, F.text == "👷🏻‍♂️ Актуа
 # Обработчик вспомогательных функций (кнопок)
 router.callback_query.register(referral_callback_handler, F.data == "generate_referral_url")
 router.callback_query.register(process_check_membership, F.data == "check_user_in_group")
+router.chat_member.register(member_left_group, ChatMemberUpdatedFilter(IS_MEMBER >> IS_NOT_MEMBER), F.chat.id == int(GROUP_CHAT_ID))  # type: ignore
 router.callback_query.register(user_agreement_callback_handler, F.data == "user_agreement")
 
-# Обработчик админки
-router.callback_query.register(funds_transfer, F.data == "funds_transfer")
-router.callback_query.register(change_balance, F.data == "change_balance")
-router.callback_query.register(process_delete_user, F.data == "delete_user")
-router.callback_query.register(blacklist_user, F.data == "blacklist_user")
-router.callback_query.register(process_change_vacancies, F.data == "change_vacancies")
-router.callback_query.register(unblock_user, F.data == "unblock_user")
-router.callback_query.register(process_broadcast, F.data == "broadcast")
-router.callback_query.register(info_about_user, F.data == "info_about_user")
-router.callback_query.register(info_about_bot, F.data == "info_about_bot")
-
 # Обработчик вывода средств и вывода истории
 router.callback_query.register(history, F.data == "history")
 router.callback_query.register(history_of_receipts, F.data.startswith("history_of_receipts") | F.data.startswith("history_page_receipt_"))
@@ -75,19 +105,62 @@ router.message.register(enter_slow_withdrawal, NavigationForProfile.slow_withdra
 router.message.register(enter_card_or_phone_number_for_instant, NavigationForProfile.card_or_phone_number_for_instant)
 router.message.register(enter_card_or_phone_number_for_slow, NavigationForProfile.card_or_phone_number_for_slow)
 
-# Обработчики для админских функций
-router.message.register(funds_transfer_command ,AdminMenu.funds_transfer)
-router.message.register(change_balance_command, AdminMenu.change_balance)
-router.message.register(delete_user_command, AdminMenu.delete_user)
-router.message.register(blacklist_user_command, AdminMenu.blacklist_user)
-router.message.register(change_vacancies_command, AdminMenu.change_vacancies)
-router.message.register(unblock_user_command, AdminMenu.unblock_user)
-router.message.register(broadcast_command, AdminMenu.broadcast)
-router.message.register(info_about_user_command, AdminMenu.info_about_user)
-router.callback_query.register(list_transactions, F.data == "transactions")
-router.callback_query.register(approve_transaction, F.data.startswith("approve_"))
-router.callback_query.register(cancel_transaction, F.data.startswith("cancel_"))
-router.callback_query.register(back_in_admin_menu, F.data == "back_in_admin_menu", StateFilter("*"))
+# Обработчики для сотрудников: права проверяются фильтром роли на роутере
+staff_router = Router()  # Любая роль
+admin_router = Router()
+payout_router = Router()
+vacancy_router = Router()
+for role_router, role_filter in ((staff_router, RoleFilter()), (admin_router, RoleFilter(ADMIN)), (payout_router, RoleFilter(PAYOUT_OPERATOR)), (vacancy_router, RoleFilter(VACANCY_MODERATOR))):
+    role_router.message.filter(role_filter)
+    role_router.callback_query.filter(role_filter)
+router.include_routers(staff_router, admin_router, payout_router, vacancy_router)
+
+staff_router.message.register(admin_menu, Command("admin_menu"))
+staff_router.callback_query.register(back_in_admin_menu, F.data == "back_in_admin_menu", StateFilter("*"))
+
+# Админка
+admin_router.message.register(grant_role_command, Command("grant_role"))
+admin_router.message.register(revoke_role_command, Command("revoke_role"))
+admin_router.callback_query.register(funds_transfer, F.data == "funds_transfer")
+admin_router.callback_query.register(change_balance, F.data == "change_balance")
+admin_router.callback_query.register(process_delete_user, F.data == "delete_user")
+admin_router.callback_query.register(blacklist_user, F.data == "blacklist_user")
+admin_router.callback_query.register(unblock_user, F.data == "unblock_user")
+admin_router.callback_query.register(process_broadcast, F.data == "broadcast")
+admin_router.callback_query.register(info_about_user, F.data == "info_about_user")
+admin_router.callback_query.register(user_info_section, F.data.startswith("uinfo_"))
+admin_router.callback_query.register(info_about_bot, F.data == "info_about_bot")
+admin_router.callback_query.register(fraud_flags_list, F.data == "fraud_flags")
+admin_router.callback_query.register(fraud_flag_review, F.data.startswith("fraud_review_"))
+admin_router.message.register(funds_transfer_command ,AdminMenu.funds_transfer)
+admin_router.message.register(change_balance_command, AdminMenu.change_balance)
+admin_router.message.register(delete_user_command, AdminMenu.delete_user)
+admin_router.message.register(blacklist_user_command, AdminMenu.blacklist_user)
+admin_router.message.register(unblock_user_command, AdminMenu.unblock_user)
+admin_router.message.register(broadcast_command, AdminMenu.broadcast)
+admin_router.message.register(info_about_user_command, AdminMenu.info_about_user)
+admin_router.callback_query.register(funds_transfer_confirm, F.data == "payroll_confirm", AdminMenu.funds_transfer_confirm)
+
+# Очередь заявок на вывод и выплаты
+payout_router.callback_query.register(list_transactions, F.data == "transactions")
+payout_router.callback_query.register(change_transaction_queue, F.data.startswith("txq_page_") | F.data.in_({"txq_bank", "txq_urgency", "txq_amount"}))
+payout_router.callback_query.register(approve_transaction_page, F.data == "txq_approve_page")
+payout_router.callback_query.register(export_transaction_queue, F.data == "txq_export")
+payout_router.callback_query.register(export_payouts, F.data == "payout_export")
+payout_router.callback_query.register(redownload_payouts, F.data.startswith("payout_batch_"))
+payout_router.callback_query.register(approve_transaction, F.data.startswith("approve_"))
+payout_router.callback_query.register(cancel_transaction, F.data.startswith("cancel_"))
+
+# Вакансии
+vacancy_router.callback_query.register(process_change_vacancies, F.data == "change_vacancies")
+vacancy_router.message.register(change_vacancies_command, AdminMenu.change_vacancies)
+
+# Сотрудник нажал кнопку, на которую у него нет роли: роутер подключен последним и ловит только то,
+# что не подошло ни одному обработчику
+denied_router = Router()
+denied_router.callback_query.filter(RoleFilter())
+denied_router.callback_query.register(access_denied, StateFilter("*"))
+router.include_router(denied_router)
 
 # Обработчик кнопки "Доступная работа"
 router.message.register(track_vacancies,F.chat.type.in_(['group', 'supergroup']) & F.text.contains("#вакансия"))
@@ -100,10 +173,18 @@ router.callback_query.register(back_to_slow_withdrawal, F.data == "back_to_slow_
 router.callback_query.register(back_to_instant_withdrawal, F.data == "back_to_instant_withdrawal")
 
 async def main():
+    await init_db()  # Отказываемся работать с устаревшей схемой базы данных
     dp.include_router(router)
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        # С очередями polling только раскладывает обновления по очередям пользователей и ждет лишь при их переполнении
+        await dp.start_polling(bot, handle_as_tasks=update_queues is None)
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Защита от двойных нажатий на инлайн-кнопки.
+
+- Повтор того же нажатия (пользователь, данные кнопки, сообщение) в течение CALLBACK_DEBOUNCE_SECONDS
+  не доходит до обработчика: на callback отвечаем без текста, чтобы у пользователя пропали "часики".
+- Начисление по таблице выполняется один раз на состояние сообщения: токен действия — сообщение,
+  время его последнего изменения и данные кнопки. Пока сообщение не изменилось, повторное нажатие получает
+  ответ "уже выполнено" вместо повторного действия. Если обработчик упал, токен освобождается; если начисление
+  не удалось, обработчик заново показывает кнопку — сообщение изменилось, и нажатие можно повторить.
+  Одобрение и отмена выплат и закрытие флагов не нуждаются в токене: их UPDATE меняет только записи
+  в исходном статусе, поэтому повтор безопасен, а повтор после ошибки базы должен проходить.
+
+Обновления одного пользователя обрабатываются по очереди (update_queues.py), поэтому проверка
+и запись в кэш не пересекаются между его нажатиями. Кэши у каждого процесса свои, но обновления
+пользователя всегда попадают в один и тот же процесс (sharded_bot.py).
+"""
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+from cachetools import TTLCache
+from metrics import registry
+
+# Префиксы данных кнопок, действие которых нельзя выполнять дважды и повтор которого база не отсекает сама
+IDEMPOTENT_PREFIXES = ("payroll_confirm",)
+ACTION_TOKEN_TTL = 600  # Сколько помнить выполненные действия, секунд
+MAX_TRACKED_CALLBACKS = 50000
+
+callback_duplicates = registry.counter("bot_callback_duplicates_total", "Отброшенные повторные нажатия на кнопки")
+
+
+class CallbackDebounceMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для dp.callback_query: отбрасывает повторные нажатия до фильтров и обработчиков.
+    """
+
+    def __init__(self, window: float):
+        self.recent: TTLCache = TTLCache(maxsize=MAX_TRACKED_CALLBACKS, ttl=window) if window > 0 else None  # type: ignore
+        self.actions: TTLCache = TTLCache(maxsize=MAX_TRACKED_CALLBACKS, ttl=ACTION_TOKEN_TTL)
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, dict], Awaitable[Any]],
+        event: CallbackQuery,
+        data: dict
+    ) -> Any:
+        message = event.message
+        message_id = message.message_id if message else event.inline_message_id
+
+        if self.recent is not None:
+            key = (event.from_user.id, event.data, message_id)
+            if key in self.recent:
+                callback_duplicates.inc(kind="debounce")
+                await event.answer()
+                return None
+            self.recent[key] = True
+
+        if not event.data or not event.data.startswith(IDEMPOTENT_PREFIXES):
+            return await handler(event, data)
+
+        # Обычные сообщения без edit_date (не изменялись) — берем дату отправки
+        version = getattr(message, "edit_date", None) or getattr(message, "date", None)
+        token = (message.chat.id if message else None, message_id, version, event.data)
+        if token in self.actions:
+            callback_duplicates.inc(kind="action")
+            await event.answer("Это действие уже выполнено.")
+            return None
+
+        self.actions[token] = True
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.actions.pop(token, None)
+            raise
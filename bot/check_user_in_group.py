@@ -1,6 +1,7 @@
 from aiogram import Router, F
+from aiogram.filters import ChatMemberUpdatedFilter, IS_MEMBER, IS_NOT_MEMBER
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery
+from aiogram.types import CallbackQuery, ChatMemberUpdated
 from config import GROUP_CHAT_ID
 from utils import menu_handler
 from database import get_async_session, User
@@ -8,6 +9,9 @@ from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 from handlers.registration import start_command
+import fraud
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
@@ -42,7 +46,7 @@ async def process_check_membership(callback_query: CallbackQuery, state: FSMCont
                     await start_command(callback_query.message, state)
 
             except SQLAlchemyError as e:
-                logging.error(e)
+                logger.error(e)
     
 
     else:
@@ -52,3 +56,12 @@ async def process_check_membership(callback_query: CallbackQuery, state: FSMCont
             "Пожалуйста, вступите в группу и попробуйте снова.",
             show_alert=True
         )
+
+
+@router.chat_member(ChatMemberUpdatedFilter(IS_MEMBER >> IS_NOT_MEMBER), F.chat.id == int(GROUP_CHAT_ID))  # type: ignore
+async def member_left_group(event: ChatMemberUpdated):
+    """
+    Выход пользователя из группы (приходит, только если бот — администратор группы).
+    Выход сразу после регистрации по реферальной ссылке — сигнал накрутки.
+    """
+    fraud.observe_group_leave(event.new_chat_member.user.id)
@@ -0,0 +1,99 @@
+"""
+Многоуровневые реферальные начисления.
+
+Уровень 1 — реферер работника, уровень 2 — реферер реферера и т.д. Для каждого уровня задается
+процент (REFERRAL_LEVELS) и необязательный потолок начисления за одну смену (REFERRAL_LEVEL_CAPS).
+У вакансии может быть свой процент первого уровня (vacancies.referral_percentage), тогда проценты
+остальных уровней меняются в той же пропорции.
+
+Цепочки рефереров для всей пачки начислений читаются одним запросом из таблицы замыкания
+referral_closure (referral_tree.py), бонусы считаются за один проход по его результату.
+"""
+from typing import Iterable, NamedTuple, Optional
+from sqlalchemy import bindparam, text
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import REFERRAL_LEVELS, REFERRAL_LEVEL_CAPS
+from database import Vacancy
+
+
+class Bonus(NamedTuple):
+    user_id: int  # Telegram ID получателя
+    source_user_id: int  # Telegram ID работника, за смену которого начислен бонус
+    level: int
+    amount: float
+
+
+# Рефереры каждого работника до max_depth уровней по таблице замыкания: (работник, уровень, Telegram ID реферера)
+ANCESTORS_SQL = text("""
+    SELECT d.user_id, c.depth, a.user_id
+    FROM referral_closure c
+    JOIN users d ON d.id = c.descendant_id
+    JOIN users a ON a.id = c.ancestor_id
+    WHERE d.user_id IN :user_ids AND c.depth BETWEEN 1 AND :max_depth
+""").bindparams(bindparam("user_ids", expanding=True))
+
+
+def level_cap(level: int) -> Optional[float]:
+    if level <= len(REFERRAL_LEVEL_CAPS) and REFERRAL_LEVEL_CAPS[level - 1] > 0:
+        return REFERRAL_LEVEL_CAPS[level - 1]
+    return None
+
+
+def describe(bonus: Bonus) -> str:
+    if bonus.level == 1:
+        return f"Реферальное поступление за пользователя ID: {bonus.source_user_id}"
+    return f"Реферальное поступление (уровень {bonus.level}) за пользователя ID: {bonus.source_user_id}"
+
+
+async def ancestor_chains(session: AsyncSession, user_ids: Iterable[int]) -> dict[int, dict[int, int]]:
+    """
+    Для каждого работника — {уровень: Telegram ID реферера этого уровня}.
+    """
+    user_ids = list(set(user_ids))
+    if not user_ids:
+        return {}
+
+    result = await session.execute(ANCESTORS_SQL, {"user_ids": user_ids, "max_depth": len(REFERRAL_LEVELS)})
+    chains: dict[int, dict[int, int]] = {}
+    for source_user_id, depth, ancestor_id in result:
+        chains.setdefault(source_user_id, {})[depth] = ancestor_id
+    return chains
+
+
+async def vacancy_rates(session: AsyncSession, vacancy_ids: Iterable[Optional[int]]) -> dict[int, Optional[float]]:
+    """
+    Процент реферала для каждой существующей вакансии (None — процент по умолчанию).
+    Вакансий, которых нет в базе, в результате нет.
+    """
+    vacancy_ids = [vacancy_id for vacancy_id in set(vacancy_ids) if vacancy_id is not None]
+    if not vacancy_ids:
+        return {}
+
+    result = await session.execute(select(Vacancy.id, Vacancy.referral_percentage).where(Vacancy.id.in_(vacancy_ids)))
+    return dict(result.all())  # type: ignore
+
+
+async def compute_bonuses(session: AsyncSession, items: list, rates: Optional[dict[int, Optional[float]]] = None) -> list[Bonus]:
+    """
+    Реферальные бонусы за пачку смен: два запроса на всю пачку, независимо от ее размера.
+    items — отдельные смены с полями user_id, vacancy_id и amount (например, payroll.PayrollLine):
+    потолок уровня применяется к каждой смене, поэтому смены одного работника нельзя складывать заранее.
+    rates — уже прочитанный результат vacancy_rates.
+    """
+    chains = await ancestor_chains(session, (item.user_id for item in items))
+    if rates is None:
+        rates = await vacancy_rates(session, (item.vacancy_id for item in items))
+
+    bonuses = []
+    for item in items:
+        rate = rates.get(item.vacancy_id)
+        scale = rate / REFERRAL_LEVELS[0] if rate is not None and REFERRAL_LEVELS[0] else 1.0
+        for level, ancestor_id in sorted(chains.get(item.user_id, {}).items()):
+            amount = item.amount * REFERRAL_LEVELS[level - 1] * scale
+            cap = level_cap(level)
+            if cap is not None:
+                amount = min(amount, cap)
+            if amount > 0:
+                bonuses.append(Bonus(ancestor_id, item.user_id, level, amount))
+    return bonuses
@@ -20,12 +20,39 @@ GROUP_CHAT_ID = env_vars["GROUP_CHAT_ID"]
 ADMIN_MAKSIM = env_vars["ADMIN_MAKSIM"]
 ADMIN_ROMAN = env_vars["ADMIN_ROMAN"]
 ADMIN_ACCOUNT = env_vars["ADMIN_ACCOUNT"]
-REFERRAL_PERCENTAGE = 0.1
+# Доля от суммы смены для рефереров 1-го, 2-го и следующих уровней и потолок начисления за смену (0 — без потолка)
+REFERRAL_LEVELS = [float(share) for share in os.getenv("REFERRAL_LEVELS", "0.1").split(",")]
+REFERRAL_LEVEL_CAPS = [float(cap) for cap in os.getenv("REFERRAL_LEVEL_CAPS", "").split(",") if cap]
+REFERRAL_PERCENTAGE = REFERRAL_LEVELS[0]
+
+# Необязательные параметры
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 — не запускать эндпоинт метрик (по умолчанию); в sharded_bot.py процессы займут следующие порты
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))  # Сколько обработчиков обновлений выполняется одновременно, 0 — обрабатывать как раньше
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "100"))  # Сколько обновлений одного пользователя может ждать обработки, лишние нажатия на кнопки отбрасываются
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "1000"))  # Сколько обновлений всего может ждать обработки, дальше polling ждет
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")  # memory или postgres (общее для всех процессов хранилище)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))  # Число процессов-обработчиков для sharded_bot.py
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Сколько обновлений может ждать одного процесса
+CALLBACK_DEBOUNCE_SECONDS = float(os.getenv("CALLBACK_DEBOUNCE_SECONDS", "1.5"))  # Окно, в котором повторное нажатие кнопки отбрасывается, 0 — не отбрасывать
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))  # Сколько профилей пользователей держать в кэше
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))  # Время жизни профиля в кэше, секунд
+USER_CACHE_BROADCAST = int(os.getenv("USER_CACHE_BROADCAST", "1"))  # Рассылать сбросы кэша профилей другим процессам и экземплярам бота, 0 — бот запущен в одном экземпляре
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))  # Как часто записывать активность пользователей, секунд
+VACANCY_TTL_DAYS = int(os.getenv("VACANCY_TTL_DAYS", "30"))  # Через сколько дней вакансия снимается с публикации, 0 — никогда
+STATS_ROLLUP_INTERVAL = int(os.getenv("STATS_ROLLUP_INTERVAL", "3600"))  # Как часто обновлять daily_stats, секунд, 0 — не обновлять
+FRAUD_SCORE_THRESHOLD = float(os.getenv("FRAUD_SCORE_THRESHOLD", "5"))  # С какого счета подозрительности реферер попадает на проверку
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "24"))  # Сколько месяцев истории держать в основных таблицах, 0 — не архивировать
+FSM_STATE_TTL_DAYS = int(os.getenv("FSM_STATE_TTL_DAYS", "7"))  # Через сколько дней удалять брошенные состояния FSM (postgres), 0 — никогда
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json или text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")  # Доля записей ниже WARNING для шумных логгеров: "membership=0.01,update_queues=0.1"
 
 STATUS_MAP = {
     'pending': 'В обработке',
     'cancelled': 'Отменено',
-    'approved': 'Одобрено'
+    'approved': 'Одобрено',
+    'paid': 'Выплачено'
 }
 
 
@@ -0,0 +1,245 @@
+"""
+Выгрузка и загрузка пользователей и их истории (users, referrals, user_history_totals,
+receipt_history, withdrawal_history и архивные секции истории из схемы archive).
+
+Выгрузка читает таблицы потоково (COPY TO для CSV, серверный курсор для JSONL) и сразу пишет
+сжатые файлы, поэтому память не зависит от размера таблиц. Все таблицы выгружаются в одной
+транзакции REPEATABLE READ: файлы соответствуют одному моменту времени и согласованы по внешним
+ключам, даже если бот в это время работает. Загрузка выполняется через COPY
+в одной транзакции в порядке внешних ключей и работает только с пустыми таблицами.
+
+История загружается через временную таблицу: сначала создаются месячные секции для всех
+дат из выгрузки, иначе строки старше текущего месяца попали бы в секцию DEFAULT, которая
+не архивируется. Архивные секции восстанавливаются в схеме archive под прежними именами
+вместе с итогами user_history_totals. Дерево рефералов (referral_closure) после загрузки
+перестраивается по referrals.
+
+    python data_transfer.py export backup/ [--format csv|jsonl]
+    python data_transfer.py import backup/ [--format csv|jsonl]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import TIMESTAMP
+from database import engine, User, Referral, ReceiptHistory, WithdrawalHistory, UserHistoryTotals
+from history_archive import partition_ddl, partition_name
+from referral_tree import REBUILD_SQL
+
+logger = logging.getLogger("data_transfer")  # Запускается как скрипт, где __name__ == "__main__"
+
+# Порядок важен: таблицы загружаются так, чтобы внешние ключи ссылались на уже загруженные строки
+TABLES = [User.__table__, Referral.__table__, UserHistoryTotals.__table__, ReceiptHistory.__table__, WithdrawalHistory.__table__]
+# Секционированные по месяцам таблицы истории и колонка секционирования (миграция 9)
+PARTITION_COLUMNS = {
+    ReceiptHistory.__table__.name: ReceiptHistory.date.name,
+    WithdrawalHistory.__table__.name: WithdrawalHistory.withdrawal_date.name,
+}
+HISTORY_TABLES = {table.name: table for table in TABLES if table.name in PARTITION_COLUMNS}
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_PARTITION = re.compile(rf"^({'|'.join(PARTITION_COLUMNS)})_y[0-9]{{4}}m[0-9]{{2}}$")
+FETCH_SIZE = 5000  # Сколько строк забирать с сервера за раз при выгрузке в JSONL
+CHUNK_SIZE = 1024 * 1024  # Размер блока при потоковом чтении сжатого CSV
+
+
+def file_path(directory: str, name: str, file_format: str) -> str:
+    return os.path.join(directory, f"{name}.{file_format}.gz")
+
+
+def column_names(table) -> list[str]:
+    return [column.name for column in table.columns]
+
+
+def archive_files(directory: str, file_format: str) -> list[str]:
+    """
+    Имена архивных секций, файлы которых есть в каталоге выгрузки.
+    """
+    prefix, suffix = f"{ARCHIVE_SCHEMA}.", f".{file_format}.gz"
+    names = (
+        file_name[len(prefix):-len(suffix)] for file_name in os.listdir(directory)
+        if file_name.startswith(prefix) and file_name.endswith(suffix)
+    )
+    return sorted(name for name in names if ARCHIVE_PARTITION.match(name))
+
+
+async def export_table(connection, table, path: str, file_format: str, relation: str | None = None) -> int:
+    """
+    relation — откуда читать строки, если не из самой таблицы (архивная секция с теми же колонками).
+    """
+    columns = ", ".join(column_names(table))
+    order = ", ".join(column.name for column in table.primary_key.columns)
+    query = f"SELECT {columns} FROM {relation or table.name} ORDER BY {order}"
+    rows = 0
+
+    with gzip.open(path, "wb") as output:
+        if file_format == "csv":
+            async def write(chunk: bytes):
+                output.write(chunk)
+            status = await connection.copy_from_query(query, output=write, format="csv", header=True)
+            rows = int(status.split()[-1])
+        else:
+            # Курсор работает внутри транзакции выгрузки (main)
+            async for record in connection.cursor(query, prefetch=FETCH_SIZE):
+                line = json.dumps(dict(record), ensure_ascii=False, default=lambda value: value.isoformat())
+                output.write(line.encode("utf-8") + b"\n")
+                rows += 1
+
+    return rows
+
+
+async def read_chunks(path: str):
+    with gzip.open(path, "rb") as source:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def read_records(path: str, table):
+    columns = column_names(table)
+    timestamp_columns = {column.name for column in table.columns if isinstance(column.type, TIMESTAMP)}
+
+    with gzip.open(path, "rt", encoding="utf-8") as source:
+        for line in source:
+            item = json.loads(line)
+            yield tuple(
+                datetime.fromisoformat(item[name]) if name in timestamp_columns and item.get(name) is not None else item.get(name)
+                for name in columns
+            )
+
+
+async def copy_file(connection, table, path: str, file_format: str, target: str, schema: str | None = None) -> int:
+    if file_format == "csv":
+        status = await connection.copy_to_table(
+            target, source=read_chunks(path), columns=column_names(table), schema_name=schema, format="csv", header=True
+        )
+    else:
+        status = await connection.copy_records_to_table(
+            target, records=read_records(path, table), columns=column_names(table), schema_name=schema
+        )
+    return int(status.split()[-1])
+
+
+async def create_partitions(connection, table: str, source: str):
+    """
+    Создает недостающие месячные секции table для всех дат из source.
+    """
+    column = PARTITION_COLUMNS[table]
+    months = await connection.fetch(
+        f"SELECT DISTINCT date_trunc('month', {column} AT TIME ZONE 'UTC') AS month FROM {source} ORDER BY month"
+    )
+    for record in months:
+        year, month = record["month"].year, record["month"].month
+        if await connection.fetchval("SELECT to_regclass($1) IS NOT NULL", partition_name(table, year, month)):
+            continue
+        await connection.execute(partition_ddl(table, year, month))
+        logger.info(f"Created partition {partition_name(table, year, month)}")
+
+
+async def import_table(connection, table, path: str, file_format: str) -> int:
+    has_rows = await connection.fetchval(f"SELECT EXISTS (SELECT 1 FROM {table.name})")
+    if has_rows:
+        raise RuntimeError(f"Таблица {table.name} не пуста — загрузка выполняется только в пустую базу")
+
+    if table.name in PARTITION_COLUMNS:
+        # Секции нужно создать до вставки, а диапазон дат известен только после чтения файла
+        staging = f"{table.name}_import"
+        await connection.execute(f"CREATE TEMP TABLE {staging} (LIKE {table.name}) ON COMMIT DROP")
+        rows = await copy_file(connection, table, path, file_format, staging)
+        await create_partitions(connection, table.name, staging)
+        await connection.execute(f"INSERT INTO {table.name} SELECT * FROM {staging}")
+    else:
+        # Один COPY на таблицу: ссылки users.referrer_id внутри таблицы проверяются в конце команды
+        rows = await copy_file(connection, table, path, file_format, table.name)
+
+    # Последовательность id продолжается после загруженных строк
+    if "id" in table.columns:
+        await connection.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table.name}"
+        )
+    return rows
+
+
+async def import_archive_partition(connection, name: str, path: str, file_format: str) -> int:
+    """
+    Восстанавливает архивную секцию как отдельную таблицу в схеме archive, без внешних ключей (как после архивации).
+    """
+    table = HISTORY_TABLES[ARCHIVE_PARTITION.match(name).group(1)]  # type: ignore
+    await connection.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+    await connection.execute(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{name} (LIKE {table.name})")
+    if await connection.fetchval(f"SELECT EXISTS (SELECT 1 FROM {ARCHIVE_SCHEMA}.{name})"):
+        raise RuntimeError(f"Таблица {ARCHIVE_SCHEMA}.{name} не пуста — загрузка выполняется только в пустую базу")
+    return await copy_file(connection, table, path, file_format, name, schema=ARCHIVE_SCHEMA)
+
+
+async def main(args) -> int:
+    if args.command == "export":
+        os.makedirs(args.directory, exist_ok=True)
+
+    try:
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            connection = raw_connection.driver_connection  # Соединение asyncpg: COPY и курсоры без ORM
+
+            if args.command == "export":
+                # Один снимок базы на все таблицы
+                async with connection.transaction(isolation="repeatable_read", readonly=True):
+                    for table in TABLES:
+                        started = time.perf_counter()
+                        rows = await export_table(connection, table, file_path(args.directory, table.name, args.format), args.format)
+                        logger.info(f"Exported {rows} rows from {table.name} in {time.perf_counter() - started:.1f}s")
+
+                    partitions = await connection.fetch(
+                        "SELECT tablename FROM pg_tables WHERE schemaname = $1 ORDER BY tablename", ARCHIVE_SCHEMA
+                    )
+                    for record in partitions:
+                        name = record["tablename"]
+                        match = ARCHIVE_PARTITION.match(name)
+                        if not match:
+                            continue
+                        started = time.perf_counter()
+                        rows = await export_table(
+                            connection, HISTORY_TABLES[match.group(1)], file_path(args.directory, f"{ARCHIVE_SCHEMA}.{name}", args.format),
+                            args.format, relation=f"{ARCHIVE_SCHEMA}.{name}"
+                        )
+                        logger.info(f"Exported {rows} rows from {ARCHIVE_SCHEMA}.{name} in {time.perf_counter() - started:.1f}s")
+            else:
+                for table in TABLES:
+                    if not os.path.exists(file_path(args.directory, table.name, args.format)):
+                        print(f"Нет файла {file_path(args.directory, table.name, args.format)}")
+                        return 1
+
+                async with connection.transaction():
+                    for table in TABLES:
+                        started = time.perf_counter()
+                        rows = await import_table(connection, table, file_path(args.directory, table.name, args.format), args.format)
+                        logger.info(f"Imported {rows} rows into {table.name} in {time.perf_counter() - started:.1f}s")
+
+                    for name in archive_files(args.directory, args.format):
+                        started = time.perf_counter()
+                        rows = await import_archive_partition(connection, name, file_path(args.directory, f"{ARCHIVE_SCHEMA}.{name}", args.format), args.format)
+                        logger.info(f"Imported {rows} rows into {ARCHIVE_SCHEMA}.{name} in {time.perf_counter() - started:.1f}s")
+
+                    status = await connection.execute(REBUILD_SQL)
+                    logger.info(f"Rebuilt referral tree: {status.split()[-1]} rows")
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        await engine.dispose()
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Выгрузка и загрузка пользователей и их истории")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("directory", help="Каталог с файлами выгрузки")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Формат файлов (сжатые gzip)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,10 +1,13 @@
 from contextlib import asynccontextmanager
 import logging
-from sqlalchemy import ForeignKey, Column, Integer, String, TIMESTAMP, Float, BigInteger, func, Text, Boolean, UniqueConstraint, Index
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import ForeignKey, Column, Integer, String, TIMESTAMP, Float, BigInteger, func, Text, Boolean, UniqueConstraint, Index, Date, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 from config import DATABASE_URL
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from migrations import check_schema
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -32,7 +35,7 @@ class User(Base):
 
 
     __table_args__ = (
-        Index('idx_user_id', 'user_id', unique=True),
+        Index('idx_users_last_activity', 'last_activity'),
     )
 
     def __repr__(self):
@@ -51,24 +54,53 @@ class Referral(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'referral_id', name='_user_referral_uc'),  # Уникальность рефералов
+        Index('uq_referrals_referral_id', 'referral_id', unique=True),  # У пользователя один реферер; поиск реферера по рефералу
     )
 
     def __repr__(self):
         return f"<Referral(id={self.id}, user_id={self.user_id}, referral_id={self.referral_id}, date_joined={self.date_joined})>"
 
+class ReferralClosure(Base):
+    __tablename__ = 'referral_closure'
+
+    # Все пары (предок, потомок) реферального дерева, включая (сам, сам, 0); см. referral_tree.py
+    ancestor_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('idx_referral_closure_descendant_depth', 'descendant_id', 'depth'),  # Цепочка рефереров пользователя
+    )
+
+    def __repr__(self):
+        return f"<ReferralClosure(ancestor_id={self.ancestor_id}, descendant_id={self.descendant_id}, depth={self.depth})>"
+
 class WithdrawalHistory(Base):
     __tablename__ = 'withdrawal_history'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     amount = Column(Float, nullable=False)
-    withdrawal_date = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    withdrawal_date = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False, server_default=func.now())  # Ключ секционирования, входит в первичный ключ
     status = Column(String(20), default='pending')
     is_urgent = Column(Boolean, default=False)
     description = Column(Text, nullable=False)
+    bank = Column(String(32), nullable=True)  # Ключ банка из BANK_MAP
+    requisites = Column(String(255), nullable=True)  # Номер карты или телефона для вывода
+    paid_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Время выплаты
+    payout_batch = Column(String(32), nullable=True)  # Выгрузка (реестр), в которой заявка была выплачена
 
     user = relationship("User", back_populates="withdrawals")
 
+    __table_args__ = (
+        Index('idx_withdrawal_status_urgent_date', 'status', 'is_urgent', 'withdrawal_date'),  # Очередь заявок на вывод
+        Index('idx_withdrawal_user_date', 'user_id', 'withdrawal_date'),  # История выводов пользователя
+        Index('idx_withdrawal_payout_batch', 'payout_batch'),
+        Index('idx_withdrawal_status_bank', 'status', 'bank'),  # Фильтр очереди и статистика по банкам
+        # Секции по месяцам; первичный ключ (id, withdrawal_date) обязан содержать ключ секционирования, старые секции уходят в схему archive
+        {'postgresql_partition_by': 'RANGE (withdrawal_date)'},
+    )
+
     def __repr__(self):
         return f"<WithdrawalHistory(id={self.id}, user_id={self.user_id}, amount={self.amount}, withdrawal_date={self.withdrawal_date}, status={self.status})>"
 
@@ -81,9 +113,11 @@ class Vacancy(Base):
     text = Column(Text, nullable=False)  # Текст вакансии
     posted_at = Column(TIMESTAMP(timezone=True), server_default=func.now())  # Дата публикации вакансии
     status = Column(String(20), default='active')  # Статус вакансии (active/inactive)
+    referral_percentage = Column(Float, nullable=True)  # Доля реферера 1-го уровня для смен по вакансии (вместо REFERRAL_LEVELS[0])
 
     __table_args__ = (
         Index('idx_chat_message', 'chat_id', 'message_id'),
+        Index('idx_vacancies_status_posted_at', 'status', 'posted_at'),  # Список активных вакансий и их истечение
     )
     def __repr__(self):
         return f"<Vacancy(id={self.id}, chat_id={self.chat_id}, message_id={self.message_id}, status={self.status})>"
@@ -98,7 +132,6 @@ class BlackList(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', name='_user_uc'),
-        Index('idx_user_id_blacklist', 'user_id')
     )
     def __repr__(self):
         return f"<BlackList(id={self.id}, user_id={self.user_id}, chat_id={self.chat_id}, date={self.date})>"
@@ -110,33 +143,151 @@ class ReceiptHistory(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey('users.user_id'), nullable=False)  # Связь с таблицей пользователей
     amount = Column(Float, nullable=False)
-    date = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    date = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False, server_default=func.now())  # Ключ секционирования, входит в первичный ключ
     description = Column(Text, nullable=True)
 
     # Связь с таблицей пользователей
     user = relationship("User", back_populates="receipt_history")
 
     __table_args__ = (
-        Index('idx_receipt_user_id', 'user_id'),  # Индекс на поле user_id
+        Index('idx_receipt_user_date', 'user_id', 'date'),  # История поступлений пользователя
         Index('idx_receipt_date', 'date'),  # Индекс на поле timestamp
+        # Секции по месяцам; первичный ключ (id, date) обязан содержать ключ секционирования, старые секции уходят в схему archive
+        {'postgresql_partition_by': 'RANGE (date)'},
     )
 
     def __repr__(self):
         return f"<ReceiptHistory(id={self.id}, user_id={self.user_id}, amount={self.amount}, date={self.date})>"
 
 
+class FsmState(Base):
+    __tablename__ = 'fsm_states'
+
+    key = Column(String(255), primary_key=True)  # Ключ FSM: бот, чат, пользователь, тема и destiny
+    state = Column(String(255), nullable=True)
+    data = Column(JSONB, nullable=False, server_default='{}')
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_fsm_states_updated_at', 'updated_at'),  # Очистка заброшенных состояний
+    )
+
+    def __repr__(self):
+        return f"<FsmState(key={self.key}, state={self.state})>"
+
+
+class FraudFlag(Base):
+    __tablename__ = 'fraud_flags'
+
+    # Подозрительные рефереры для проверки администратором (fraud.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    score = Column(Float, nullable=False)
+    reasons = Column(Text, nullable=False)  # Сигналы через запятую
+    status = Column(String(20), nullable=False, default='new')  # new/reviewed
+    reviewed_by = Column(BigInteger, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('uq_fraud_flags_open', 'user_id', unique=True, postgresql_where=text("status = 'new'")),  # Один открытый флаг на пользователя
+        Index('idx_fraud_flags_status_score', 'status', 'score'),
+    )
+
+    def __repr__(self):
+        return f"<FraudFlag(id={self.id}, user_id={self.user_id}, score={self.score}, status={self.status})>"
+
+
+class FraudSignal(Base):
+    __tablename__ = 'fraud_signals'
+
+    # Сигналы накрутки в многопроцессном режиме: счет реферера суммируется по таблице (fraud.py)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)  # Реферер
+    signal = Column(String(32), nullable=False)
+    weight = Column(Float, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('idx_fraud_signals_user_created', 'user_id', 'created_at'),  # Счет реферера за окно
+    )
+
+    def __repr__(self):
+        return f"<FraudSignal(id={self.id}, user_id={self.user_id}, signal={self.signal}, weight={self.weight})>"
+
+
+class PayrollImport(Base):
+    __tablename__ = 'payroll_imports'
+
+    # Загруженные таблицы начислений (payroll.py); повтор таблицы с тем же содержимым отклоняется
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String(64), nullable=False, unique=True)  # sha256 содержимого таблицы
+    source = Column(Text, nullable=False)  # Ссылка на таблицу
+    admin_id = Column(BigInteger, nullable=False)
+    users_count = Column(Integer, nullable=False)
+    work_amount = Column(Float, nullable=False)
+    referral_amount = Column(Float, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<PayrollImport(id={self.id}, content_hash={self.content_hash}, users_count={self.users_count})>"
+
+
+class UserHistoryTotals(Base):
+    __tablename__ = 'user_history_totals'
+
+    # Итоги по истории пользователя, перенесенной в архив (history_archive.py)
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    receipts_count = Column(Integer, nullable=False, default=0)
+    receipts_amount = Column(Float, nullable=False, default=0.0)
+    withdrawals_count = Column(Integer, nullable=False, default=0)
+    withdrawals_paid_amount = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<UserHistoryTotals(user_id={self.user_id}, receipts_count={self.receipts_count}, withdrawals_count={self.withdrawals_count})>"
+
+
+class DailyStats(Base):
+    __tablename__ = 'daily_stats'
+
+    day = Column(Date, primary_key=True)  # День по московскому времени
+    users_total = Column(Integer, nullable=False, default=0)  # Пользователей на конец дня (на момент подсчета)
+    new_users = Column(Integer, nullable=False, default=0)
+    active_users = Column(Integer, nullable=False, default=0)  # Пользователи с активностью в этот день
+    withdrawals_count = Column(Integer, nullable=False, default=0)
+    withdrawals_amount = Column(Float, nullable=False, default=0.0)
+    receipts_amount = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DailyStats(day={self.day}, users_total={self.users_total}, new_users={self.new_users})>"
+
+
+
+class AdminRole(Base):
+    __tablename__ = 'admin_roles'
+
+    # Роли сотрудников (admin_roles.py); администраторы из переменных окружения здесь не хранятся
+    user_id = Column(BigInteger, primary_key=True)
+    role = Column(String(32), primary_key=True)  # admin/payout_operator/vacancy_moderator
+    granted_by = Column(BigInteger, nullable=True)
+    granted_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<AdminRole(user_id={self.user_id}, role={self.role})>"
+
 engine = create_async_engine(DATABASE_URL) # type: ignore
 
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) # type: ignore
 
 async def init_db():
-    async with engine.begin() as conn:
-        try:
-            # Удаление индексов вручную перед созданием (если нужно)
-            await conn.run_sync(Base.metadata.create_all, checkfirst=True)  # Пересоздание таблиц и индексов
-            logging.info("Таблицы и индексы успешно созданы")
-        except SQLAlchemyError as e:
-            logging.error(f"Error initializing database: {e}")
+    """
+    Проверяет, что схема базы данных актуальна. Таблицы и индексы создаются
+    миграциями (`python migrate.py upgrade`), а не при старте бота.
+    """
+    await check_schema(engine)
+    logger.info("Схема базы данных актуальна")
 
 
 @asynccontextmanager
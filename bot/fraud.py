@@ -0,0 +1,261 @@
+"""
+Выявление накруток реферальной программы.
+
+Каждая регистрация по реферальной ссылке и каждый выход из группы сразу после регистрации
+дают сигналы, которые увеличивают счет подозрительности реферера:
+- burst — много регистраций по ссылке реферера за короткое время;
+- phone_cluster — несколько рефералов реферера с одинаковым префиксом телефона;
+- fresh_chain — реферер сам зарегистрировался совсем недавно (цепочки свежих аккаунтов);
+- ancestor_phone — префикс телефона реферала совпадает с кем-то выше по цепочке (регистрация самого себя);
+- early_leave — реферал вышел из группы вскоре после регистрации.
+
+Счетчики — скользящие окна в памяти процесса. В многопроцессном режиме (WORKER_PROCESSES > 0)
+обновления распределяются по Telegram ID регистрирующегося, и регистрации одного реферера попадают
+в разные процессы — окна в памяти занизили бы счетчики в число процессов раз. Поэтому там burst,
+phone_cluster и fresh_chain считаются запросом к базе, а счет реферера суммируется по fraud_signals.
+Проверка запускается фоновой задачей и не задерживает регистрацию; в базу пишется только флаг
+для проверки администратором, когда счет достигает FRAUD_SCORE_THRESHOLD.
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import defaultdict, deque
+from cachetools import TTLCache
+from sqlalchemy import text
+from config import FRAUD_SCORE_THRESHOLD, WORKER_PROCESSES
+from database import get_async_session
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BURST_WINDOW = 3600  # Окно для всплеска регистраций, секунд
+BURST_LIMIT = 5  # Сколько регистраций по одной ссылке за окно считается нормой
+CLUSTER_WINDOW = 86400
+CLUSTER_LIMIT = 3  # Сколько рефералов с одинаковым префиксом телефона за окно считается нормой
+PHONE_PREFIX_LENGTH = 8  # Код страны, оператора и первые цифры номера
+FRESH_WINDOW = 86400  # Реферер, зарегистрированный позже этого, считается свежим
+EARLY_LEAVE_WINDOW = 3600  # Выход из группы раньше этого после регистрации подозрителен
+SCORE_WINDOW = 7 * 86400  # За какой период суммируется счет реферера
+MAX_TRACKED_USERS = 100000
+PRUNE_INTERVAL = 60  # Как часто удалять из окон ключи без свежих событий, секунд
+
+SIGNAL_WEIGHTS = {
+    "burst": 2,
+    "phone_cluster": 2,
+    "fresh_chain": 1,
+    "ancestor_phone": 3,
+    "early_leave": 1,
+}
+
+SHARED_COUNTERS = WORKER_PROCESSES > 0  # Считать сигналы по базе, а не в памяти процесса
+
+fraud_signals = registry.counter("bot_fraud_signals_total", "Сигналы накрутки рефералов")
+
+# Регистрации по ссылке реферера за окна burst и phone_cluster и свежесть самого реферера
+REGISTRATION_COUNTS_SQL = text("""
+    SELECT
+        count(d.id) FILTER (WHERE rf.date_joined > now() - make_interval(secs => :burst_window)),
+        count(d.id) FILTER (
+            WHERE rf.date_joined > now() - make_interval(secs => :cluster_window)
+            AND left(regexp_replace(d.phone_number, '\\D', '', 'g'), :length) = :prefix
+        ),
+        coalesce(r.created_at > now() - make_interval(secs => :fresh_window), false)
+    FROM users r
+    LEFT JOIN referrals rf ON rf.user_id = r.id AND rf.date_joined > now() - make_interval(secs => :join_window)
+    LEFT JOIN users d ON d.id = rf.referral_id
+    WHERE r.user_id = :referrer_id
+    GROUP BY r.id, r.created_at
+""")
+
+
+class SlidingWindow:
+    """
+    Отметки времени по ключам; устаревшие отбрасываются при каждом обращении.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.events: dict = defaultdict(deque)
+
+    def add(self, key, value: float = 1.0, now: float | None = None) -> float:
+        """
+        Добавляет событие и возвращает сумму значений по ключу за окно.
+        """
+        now = time.monotonic() if now is None else now
+        events = self.events[key]
+        events.append((now, value))
+        while events and events[0][0] <= now - self.window:
+            events.popleft()
+        return sum(weight for _, weight in events)
+
+    def prune(self, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        for key in [key for key, events in self.events.items() if not events or events[-1][0] <= now - self.window]:
+            del self.events[key]
+
+
+_registrations_by_referrer = SlidingWindow(BURST_WINDOW)
+_phone_prefixes = SlidingWindow(CLUSTER_WINDOW)
+_scores = SlidingWindow(SCORE_WINDOW)
+# Недавно зарегистрированные: Telegram ID -> (время регистрации, Telegram ID реферера)
+_recent_users: TTLCache = TTLCache(maxsize=MAX_TRACKED_USERS, ttl=max(FRESH_WINDOW, EARLY_LEAVE_WINDOW))
+_tasks: set[asyncio.Task] = set()
+_last_prune = 0.0
+
+
+def phone_prefix(phone_number: str) -> str:
+    return re.sub(r"\D", "", phone_number)[:PHONE_PREFIX_LENGTH]
+
+
+def _spawn(coroutine):
+    task = asyncio.create_task(coroutine)
+    _tasks.add(task)  # Держим ссылку, иначе задача может быть собрана до завершения
+    task.add_done_callback(_tasks.discard)
+
+
+def _prune(now: float):
+    global _last_prune
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = now
+    for window in (_registrations_by_referrer, _phone_prefixes, _scores):
+        window.prune(now)
+
+
+def observe_registration(user_id: int, referrer_id: int | None, phone_number: str):
+    """
+    Учитывает новую регистрацию. Только обновляет счетчики в памяти, проверки в базе — в фоне.
+    """
+    now = time.monotonic()
+    _prune(now)
+    _recent_users[user_id] = (now, referrer_id)
+    if not referrer_id:
+        return
+    if SHARED_COUNTERS:
+        _spawn(_evaluate(referrer_id, user_id, phone_number, None))
+        return
+
+    signals = []
+    if _registrations_by_referrer.add(referrer_id, now=now) > BURST_LIMIT:
+        signals.append("burst")
+    if _phone_prefixes.add((referrer_id, phone_prefix(phone_number)), now=now) > CLUSTER_LIMIT:
+        signals.append("phone_cluster")
+    referrer = _recent_users.get(referrer_id)
+    if referrer and now - referrer[0] < FRESH_WINDOW:
+        signals.append("fresh_chain")
+
+    _spawn(_evaluate(referrer_id, user_id, phone_number, signals))
+
+
+def observe_group_leave(user_id: int):
+    """
+    Учитывает выход пользователя из группы: подозрительно, если он только что зарегистрировался по ссылке.
+    """
+    registered = _recent_users.get(user_id)
+    if not registered or not registered[1] or time.monotonic() - registered[0] > EARLY_LEAVE_WINDOW:
+        return
+    _spawn(_evaluate(registered[1], user_id, None, ["early_leave"]))
+
+
+async def _evaluate(referrer_id: int, user_id: int, phone_number: str | None, signals: list[str] | None):
+    """
+    signals=None — сигналы регистрации еще не посчитаны (SHARED_COUNTERS), считаем их по базе.
+    """
+    try:
+        if signals is None:
+            signals = await _registration_signals(referrer_id, phone_number or "")
+        if phone_number and await _shares_phone_with_ancestor(user_id, phone_number):
+            signals.append("ancestor_phone")
+        if not signals:
+            return
+
+        score = 0.0
+        for signal in signals:
+            fraud_signals.inc(signal=signal)
+            if not SHARED_COUNTERS:
+                score = _scores.add(referrer_id, SIGNAL_WEIGHTS[signal])
+        if SHARED_COUNTERS:
+            score = await _record_signals(referrer_id, signals)
+        logger.info(f"Fraud signals for referrer {referrer_id} (user {user_id}): {', '.join(signals)}, score {score}")
+
+        if score >= FRAUD_SCORE_THRESHOLD:
+            await _flag(referrer_id, score, signals)
+    except Exception as e:
+        logger.error(f"Fraud check failed for referrer {referrer_id}: {e}")
+
+
+async def _registration_signals(referrer_id: int, phone_number: str) -> list[str]:
+    """
+    Сигналы burst, phone_cluster и fresh_chain по базе. Регистрация уже записана и входит в счетчики,
+    как и при подсчете в памяти.
+    """
+    async with get_async_session() as session:
+        result = await session.execute(REGISTRATION_COUNTS_SQL, {
+            "referrer_id": referrer_id, "burst_window": BURST_WINDOW, "cluster_window": CLUSTER_WINDOW,
+            "join_window": max(BURST_WINDOW, CLUSTER_WINDOW), "fresh_window": FRESH_WINDOW, "length": PHONE_PREFIX_LENGTH, "prefix": phone_prefix(phone_number)
+        })
+        row = result.first()
+
+    if row is None:
+        return []
+    registrations, same_prefix, fresh = row
+    signals = []
+    if registrations > BURST_LIMIT:
+        signals.append("burst")
+    if same_prefix > CLUSTER_LIMIT:
+        signals.append("phone_cluster")
+    if fresh:
+        signals.append("fresh_chain")
+    return signals
+
+
+async def _record_signals(referrer_id: int, signals: list[str]) -> float:
+    """
+    Записывает сигналы в fraud_signals и возвращает счет реферера за SCORE_WINDOW по всем процессам.
+    """
+    async with get_async_session() as session:
+        await session.execute(
+            text("DELETE FROM fraud_signals WHERE user_id = :user_id AND created_at <= now() - make_interval(secs => :window)"),
+            {"user_id": referrer_id, "window": SCORE_WINDOW}
+        )
+        await session.execute(
+            text("INSERT INTO fraud_signals (user_id, signal, weight) SELECT user_id, :signal, :weight FROM users WHERE user_id = :user_id"),
+            [{"user_id": referrer_id, "signal": signal, "weight": SIGNAL_WEIGHTS[signal]} for signal in signals]
+        )
+        result = await session.execute(
+            text("SELECT coalesce(sum(weight), 0) FROM fraud_signals WHERE user_id = :user_id"),
+            {"user_id": referrer_id}
+        )
+        score = float(result.scalar() or 0)
+        await session.commit()
+    return score
+
+
+async def _shares_phone_with_ancestor(user_id: int, phone_number: str) -> bool:
+    async with get_async_session() as session:
+        result = await session.execute(text(
+            "SELECT EXISTS ("
+            "SELECT 1 FROM users d "
+            "JOIN referral_closure c ON c.descendant_id = d.id AND c.depth > 0 "
+            "JOIN users a ON a.id = c.ancestor_id "
+            "WHERE d.user_id = :user_id AND left(regexp_replace(a.phone_number, '\\D', '', 'g'), :length) = :prefix)"
+        ), {"user_id": user_id, "length": PHONE_PREFIX_LENGTH, "prefix": phone_prefix(phone_number)})
+        return bool(result.scalar())
+
+
+async def _flag(referrer_id: int, score: float, signals: list[str]):
+    """
+    Открытый флаг на реферера один: повторные сигналы обновляют его счет и причины.
+    """
+    async with get_async_session() as session:
+        await session.execute(text(
+            "INSERT INTO fraud_flags (user_id, score, reasons) "
+            "SELECT user_id, :score, :reasons FROM users WHERE user_id = :user_id "
+            "ON CONFLICT (user_id) WHERE status = 'new' DO UPDATE SET "
+            "score = EXCLUDED.score, "
+            "reasons = (SELECT string_agg(DISTINCT reason, ', ') FROM unnest(string_to_array(fraud_flags.reasons || ', ' || EXCLUDED.reasons, ', ')) AS reason), "
+            "updated_at = now()"
+        ), {"user_id": referrer_id, "score": score, "reasons": ", ".join(signals)})
+        await session.commit()
+    logger.warning(f"Referrer {referrer_id} flagged for review, score {score}")
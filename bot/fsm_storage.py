@@ -0,0 +1,50 @@
+"""
+Хранилище FSM в PostgreSQL (таблица fsm_states).
+
+В отличие от MemoryStorage состояние переживает перезапуск бота и общее
+для всех процессов, поэтому обновление пользователя может обработать любой из них.
+"""
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from database import get_async_session, FsmState
+
+
+def build_key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.business_connection_id or "", key.destiny
+    ))
+
+
+class PostgresStorage(BaseStorage):
+
+    async def _upsert(self, key: StorageKey, **values):
+        statement = insert(FsmState).values(key=build_key(key), **values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[FsmState.key], set_={**values, "updated_at": func.now()}
+        )
+        async with get_async_session() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        async with get_async_session() as session:
+            result = await session.execute(select(FsmState.state).where(FsmState.key == build_key(key)))
+            return result.scalar_one_or_none()
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._upsert(key, data=data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        async with get_async_session() as session:
+            result = await session.execute(select(FsmState.data).where(FsmState.key == build_key(key)))
+            return dict(result.scalar_one_or_none() or {})
+
+    async def close(self) -> None:
+        pass
@@ -1,36 +1,72 @@
 import logging
 import asyncio
+import csv
+import io
+import os
+import tempfile
 import gspread
-import pytz
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 from aiogram import Router, types, F
 from aiogram.filters import Command, StateFilter
-from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 from aiolimiter import AsyncLimiter
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import joinedload
 from sqlalchemy.future import select
-from sqlalchemy import delete, func
-from utils import is_admins, send_transaction_list, save_previous_state, get_bank_and_phone
-from config import GROUP_CHAT_ID, REFERRAL_PERCENTAGE
-from database import get_async_session, User, WithdrawalHistory, BlackList, Referral, ReceiptHistory, Vacancy
+from sqlalchemy import delete, func, update
+from utils import save_previous_state, format_bank_and_requisites, escape_markdown, format_moscow_time
+from config import GROUP_CHAT_ID, BANK_MAP, STATUS_MAP
+from database import get_async_session, User, WithdrawalHistory, BlackList, Referral, ReceiptHistory, Vacancy, FraudFlag
+from payouts import new_payout_batch_id, mark_approved_as_paid, write_payout_files
+from user_cache import invalidate_user_snapshot
+from keyboards import ADMIN_MENU
+import payroll
+import navigation
+from admin_roles import ROLE_TITLES, BOOTSTRAP_ADMINS, grant_role, revoke_role, roles_of
+from referral_tree import detach_subtree
+from views import QueueTransactionRow, fetch_rows, transaction_queue_select, receipts_page, withdrawals_page, archived_totals, downline_stats, branch_stats
+
+logger = logging.getLogger(__name__)
 
 #TODO сделать админку для вакансий
 
 router = Router()
 limiter = AsyncLimiter(30, 1)
+_tasks: set[asyncio.Task] = set()  # Рассылки, которые выполняются в фоне
 
 scopes = ["https://www.googleapis.com/auth/spreadsheets"]
-creds = Credentials.from_service_account_file("credentials.json", scopes=scopes)
-client = gspread.authorize(creds) # type: ignore
+_sheets_client = None
+
+
+def get_sheets_client():
+    """
+    Клиент Google Sheets создается при первом использовании,
+    чтобы модуль импортировался без credentials.json (например, в нагрузочном тесте).
+    """
+    global _sheets_client
+    if _sheets_client is None:
+        creds = Credentials.from_service_account_file("credentials.json", scopes=scopes)
+        _sheets_client = gspread.authorize(creds) # type: ignore
+    return _sheets_client
+
+
+def _spawn(coroutine):
+    task = asyncio.create_task(coroutine)
+    _tasks.add(task)  # Держим ссылку, иначе задача может быть собрана до завершения
+    task.add_done_callback(_tasks.discard)
+
+
+def read_payroll_sheet(doc_url: str) -> list[dict]:
+    sheet = get_sheets_client().open_by_url(doc_url)
+    return sheet.get_worksheet(0).get_all_records()
 
 class AdminMenu(StatesGroup):
     menu = State()
     funds_transfer = State()
+    funds_transfer_confirm = State()
     change_balance = State()
     blacklist_user = State()
     unblock_user = State()
@@ -40,6 +76,7 @@ class AdminMenu(StatesGroup):
     broadcast = State()
     info_about_user = State()
     info_about_bot = State()
+    fraud_flags = State()
 
 back_button = InlineKeyboardButton(text="Назад", callback_data="back_in_admin_menu")
 
@@ -50,33 +87,15 @@ async def admin_menu(message: types.Message, state: FSMContext):
     """
     await save_previous_state(state)
     user_id = message.from_user.id  # type: ignore
-    logging.info(f"Admin menu called by user: {user_id}")
-
-    # Проверяем, является ли пользователь администратором
-    if not await is_admins(user_id):
-        logging.warning(f"Access denied for user: {user_id}")
-        return
+    logger.info(f"Admin menu called by user: {user_id}")
 
-    # Клавиатура для админских действий
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💸 Перевод средств", callback_data="funds_transfer")],
-        [InlineKeyboardButton(text="💰 Изменить баланс", callback_data="change_balance")],
-        [InlineKeyboardButton(text="🚫 Заблокировать пользователя", callback_data="blacklist_user")],
-        [InlineKeyboardButton(text="✅ Разблокировать пользователя", callback_data="unblock_user")],
-        [InlineKeyboardButton(text="🗑 Удалить пользователя", callback_data="delete_user")],
-        [InlineKeyboardButton(text="📝 Вакансии", callback_data="change_vacancies")],
-        [InlineKeyboardButton(text="🧾 Транзакции", callback_data="transactions")],
-        [InlineKeyboardButton(text="📨 Рассылка всем пользователям", callback_data="broadcast")],
-        [InlineKeyboardButton(text="👤 Информация о пользователе", callback_data="info_about_user")],
-        [InlineKeyboardButton(text="📊 Статистика бота", callback_data="info_about_bot")],
-    ])
 
     text = "⚙️ *Панель администратора* ⚙️\nВыберите действие ниже:"
     await state.update_data(last_message=text)
     # Отправляем сообщение с админским меню
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await message.answer(text, reply_markup=ADMIN_MENU, parse_mode="Markdown")
     await state.set_state(AdminMenu.menu)
-    logging.info(f"Admin menu displayed for user: {user_id}")
+    logger.info(f"Admin menu displayed for user: {user_id}")
 
 
 @router.callback_query(F.data == "funds_transfer")
@@ -84,87 +103,111 @@ async def funds_transfer(callback_query: CallbackQuery, state: FSMContext):
     """
     По docs google переводит средства на счета отработавших пользователей и их реферрерам.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer( # type: ignore
+    await navigation.show(
+        callback_query,
         "💸 *Перевод средств*\n\n"
         "Введите ссылку на docs google:",
         parse_mode="Markdown",
-        reply_markup=inline_kb
+        reply_markup=inline_kb,
+        screen="funds_transfer"
     )
     await state.set_state(AdminMenu.funds_transfer)
 
 
 @router.message(AdminMenu.funds_transfer)
 async def funds_transfer_command(message: Message, state: FSMContext):
-    logging.info(f"Received command for funds transfer: {message.text}")
+    """
+    Проверяет таблицу начислений и показывает сводку. Средства перечисляются только после подтверждения.
+    """
+    logger.info(f"Received command for funds transfer: {message.text}")
 
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-    
     doc_url = message.text
 
     if not doc_url.startswith("https://docs.google.com/"):  # type: ignore
         await message.answer("Некорректная ссылка. Попробуйте ещё раз.")
         return
 
-    sheet = client.open_by_url(doc_url)  # type: ignore
-    worksheet = sheet.get_worksheet(0)
-    rows = worksheet.get_all_records()
+    # Клиент gspread синхронный — читаем таблицу в отдельном потоке, чтобы не блокировать бота
+    try:
+        rows = await asyncio.to_thread(read_payroll_sheet, doc_url)  # type: ignore
+    except Exception as e:
+        logger.error(f"Error reading payroll sheet {doc_url}: {e}")
+        await message.answer("❌ Не удалось прочитать таблицу. Проверьте ссылку и доступ к таблице.")
+        return
+
+    digest = payroll.content_hash(rows)
+    lines, duplicates, invalid_rows = payroll.parse_rows(rows)
 
     async with get_async_session() as session:
-        with session.no_autoflush:  # Синхронное использование session.no_autoflush
-            for row in rows:
-                try:
-                    user_id = int(row["ID tg"])
-                    earning = float(row["зп"])
+        try:
+            imported_at = await payroll.find_import(session, digest)
+            plan = await payroll.build_plan(session, lines, duplicates, invalid_rows)
+        except SQLAlchemyError as e:
+            logger.error(f"Error planning payroll: {e}")
+            await message.answer("Произошла ошибка. Пожалуйста, повторите попытку позже.")
+            return
 
-                    result = await session.execute(select(User).where(User.user_id == user_id))
-                    user = result.scalar_one_or_none()
+    inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
+    if imported_at:
+        await message.answer(
+            f"⛔ Эта таблица уже была загружена {format_moscow_time(imported_at)}, повторное начисление невозможно.",
+            reply_markup=inline_kb
+        )
+        return
+    if not plan.lines:
+        await message.answer(payroll.format_summary(plan) + "\nНачислять нечего.", reply_markup=inline_kb, parse_mode="Markdown")
+        return
 
-                    if user:
-                        user.account_balance += earning
-                        user.work_earnings += earning
+    await state.update_data(
+        payroll_source=doc_url, payroll_hash=digest,
+        payroll_lines=[list(line) for line in lines],
+        payroll_duplicates=duplicates, payroll_invalid_rows=invalid_rows
+    )
+    await message.answer(payroll.format_summary(plan), reply_markup=payroll_confirm_keyboard(), parse_mode="Markdown")
+    await state.set_state(AdminMenu.funds_transfer_confirm)
+
+
+def payroll_confirm_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Начислить", callback_data="payroll_confirm")],
+        [back_button]
+    ])
+
+
+@router.callback_query(F.data == "payroll_confirm", AdminMenu.funds_transfer_confirm)
+async def funds_transfer_confirm(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Начисляет средства по проверенной таблице одной транзакцией.
+    """
+    data = await state.get_data()
+    lines = [payroll.PayrollLine(*line) for line in data.get("payroll_lines", [])]
+    await callback_query.message.edit_reply_markup(reply_markup=None)  # type: ignore
+
+    async with get_async_session() as session:
+        try:
+            # Рефереры определяются заново: между проверкой и подтверждением могли появиться изменения
+            plan = await payroll.build_plan(session, lines, data.get("payroll_duplicates", []), data.get("payroll_invalid_rows", []))
+            applied = await payroll.apply_plan(session, plan, data["payroll_hash"], data["payroll_source"], callback_query.from_user.id)
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Error applying payroll {data.get('payroll_hash')}: {e}")
+            # Возвращаем кнопку: сообщение изменилось, и повторное нажатие не будет отклонено как уже выполненное
+            await callback_query.message.edit_reply_markup(reply_markup=payroll_confirm_keyboard())  # type: ignore
+            await callback_query.message.answer("Произошла ошибка, средства не начислены. Пожалуйста, повторите попытку позже.")  # type: ignore
+            await callback_query.answer()
+            return
 
-                        # Добавляем запись в историю поступлений
-                        receipt_history = ReceiptHistory(
-                            user_id=user.user_id,
-                            amount=earning,
-                            description="Поступление средств за отработанную смену"
-                        )
-                        session.add(receipt_history)
-
-                        results = await session.execute(select(Referral).where(Referral.referral_id == user.id))
-                        referral = results.scalar_one_or_none()
-
-                        if referral:
-                            result = await session.execute(select(User).where(User.id == referral.user_id))
-                            referrer = result.scalar_one_or_none()
-                            if referrer:
-                                referrer_earning = earning * REFERRAL_PERCENTAGE
-                                referrer.referral_earnings += referrer_earning
-                                referrer.account_balance += referrer_earning
-
-                                referrer_receipt_history = ReceiptHistory(
-                                    user_id=referrer.user_id,
-                                    amount=referrer_earning,
-                                    description=f"Реферальное поступление за пользователя ID: {user.user_id}"
-                                )
-                                session.add(referrer_receipt_history)
-
-                        await session.commit()
-                    else:
-                        logging.warning(f"User with ID {user_id} not found.")
-                        await message.answer(f"Пользователь с ID {user_id} не найден.")
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    logging.error(f"Error processing row: {row}")
-                    logging.error(f"Error: {e}")
-                    await message.answer("Произошла ошибка. Пожалуйста, повторите попытку позже.")
-    
     await state.clear()
-    await message.answer("✅ Средства перечислены.")
+    await callback_query.answer()
+    if not applied:
+        await callback_query.message.answer("⛔ Эта таблица уже была загружена, повторное начисление невозможно.")  # type: ignore
+        return
+
+    paid_user_ids = {line.user_id for line in plan.lines}
+    await invalidate_user_snapshot(*paid_user_ids, *plan.referral_bonuses)
+    logger.info(f"Payroll {data['payroll_hash']} applied by {callback_query.from_user.id}: {len(paid_user_ids)} users, {plan.work_total:.2f}")
+    await callback_query.message.answer(f"✅ Средства перечислены: {len(paid_user_ids)} пользователям на {plan.work_total:.2f} ₽.")  # type: ignore
 
 
 @router.callback_query(F.data == "change_balance")
@@ -173,27 +216,23 @@ async def change_balance(callback_query: CallbackQuery, state: FSMContext):
     Обрабатывает запрос на изменение баланса.
     Запрашивает ID пользователя и новый баланс.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer( # type: ignore
+    await navigation.show(
+        callback_query,
         "💳 *Изменение баланса*\n\n"
         "Введите ID пользователя и новый баланс в формате:\n\n"
         "`<user_id> <new_balance>`\n\n"
         "Например: `123456789 1000`",
         parse_mode="Markdown",
-        reply_markup=inline_kb
-    )  # type: ignore
+        reply_markup=inline_kb,
+        screen="change_balance"
+    )
     await state.set_state(AdminMenu.change_balance)
 
 
 @router.message(AdminMenu.change_balance)
 async def change_balance_command(message: Message, state: FSMContext):
-    logging.info(f"Received command for changing balance: {message.text}")
-
-    # Проверка прав администратора
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
+    logger.info(f"Received command for changing balance: {message.text}")
 
     # Парсинг введенных данных
     args = message.text.split()  # type: ignore
@@ -220,15 +259,16 @@ async def change_balance_command(message: Message, state: FSMContext):
 
         if db_user:
             db_user.account_balance = new_balance
-            logging.info(f"Changing balance for user {user_id} to {new_balance}")
+            logger.info(f"Changing balance for user {user_id} to {new_balance}")
             try:
                 await db.commit()
-                logging.info(f"Balance changed successfully for user {user_id}")
+                await invalidate_user_snapshot(user_id)
+                logger.info(f"Balance changed successfully for user {user_id}")
                 await message.answer(f"✅ Баланс пользователя с ID `{user_id}` успешно изменен на `{new_balance}` ₽.", parse_mode="Markdown")
             except SQLAlchemyError as e:
                 await db.rollback()
                 await message.answer("⚠️ Произошла ошибка при обновлении баланса. Попробуйте позже.")
-                logging.error(f"Error committing the change: {e}")
+                logger.error(f"Error committing the change: {e}")
         else:
             await message.answer("❌ Пользователь не найден.")
     
@@ -249,23 +289,15 @@ async def blacklist_user(callback_query: CallbackQuery, state: FSMContext):
     Обрабатывает нажатие на кнопку "Черный список" для админов.
     Запрашивает ID пользователя для блокировки.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer("🚫 Пожалуйста, введите ID пользователя для блокировки в формате:\n`<user_id>`", # type: ignore
-                                        parse_mode="Markdown", 
-                                        reply_markup=inline_kb
-                                        )
+    await navigation.show(callback_query, "🚫 Пожалуйста, введите ID пользователя для блокировки в формате:\n`<user_id>`", reply_markup=inline_kb, parse_mode="Markdown", screen="blacklist_user")
     await state.set_state(AdminMenu.blacklist_user)
 
 
 @router.message(AdminMenu.blacklist_user)
 async def blacklist_user_command(message: Message, state: FSMContext):
-    logging.info(f"Received command for blacklisting user: {message.text}")
+    logger.info(f"Received command for blacklisting user: {message.text}")
 
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-    
     args = message.text.split()  # type: ignore
     if len(args) != 1:
         await message.answer("❌ Некорректный формат.\nИспользуйте: `<user_id>`", parse_mode="Markdown")
@@ -295,15 +327,15 @@ async def blacklist_user_command(message: Message, state: FSMContext):
                             chat_id=GROUP_CHAT_ID, # type: ignore
                             user_id=db_user.user_id
                         )
-                        logging.info(f"User {user_id} added to blacklist and kicked from the group.")
+                        logger.info(f"User {user_id} added to blacklist and kicked from the group.")
                         await message.answer("✅ Пользователь заблокирован и исключен из чата.")
                     except TelegramBadRequest as e:
-                        logging.error(f"Error kicking user {user_id} from the group: {e}")
+                        logger.error(f"Error kicking user {user_id} from the group: {e}")
                         await message.answer("⚠️ Не удалось исключить пользователя {user_id} из чата. Возможно, бот не имеет прав администратора.")
 
                 except SQLAlchemyError as e:
                     await session.rollback()
-                    logging.error(f"Error adding user to blacklist: {e}")
+                    logger.error(f"Error adding user to blacklist: {e}")
                     await message.answer("❌ Произошла ошибка при добавлении пользователя в черный список.")
                     return
             else:
@@ -318,22 +350,20 @@ async def unblock_user(callback_query: CallbackQuery, state: FSMContext):
     Обрабатывает нажатие на кнопку "Разблокировать" для админов.
     Запрашивает ID пользователя для разблокировки.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer( # type: ignore
+    await navigation.show(
+        callback_query,
         "✅ Пожалуйста, введите ID пользователя для разблокировки в формате:\n`<user_id>`",
         parse_mode="Markdown", 
-        reply_markup=inline_kb
+        reply_markup=inline_kb,
+        screen="unblock_user"
     )
     await state.set_state(AdminMenu.unblock_user)
 
 @router.message(AdminMenu.unblock_user)
 async def unblock_user_command(message: Message, state: FSMContext):
-    logging.info(f"Received command for unblocking user: {message.text}")
+    logger.info(f"Received command for unblocking user: {message.text}")
 
-    if not await is_admins(message.from_user.id):  # type: ignore
-        return
-    
     args = message.text.split()  # type: ignore
     if len(args) != 1:
         await message.answer("❌ Некорректный формат.\nИспользуйте: `<user_id>`", parse_mode="Markdown")
@@ -355,16 +385,16 @@ async def unblock_user_command(message: Message, state: FSMContext):
                 try:
                     await session.delete(db_user)
                     await session.commit()
-                    logging.info(f"Admin {message.from_user.id} User unblocked user {user_id}") # type: ignore
+                    logger.info(f"Admin {message.from_user.id} User unblocked user {user_id}") # type: ignore
                     await message.answer("✅ Пользователь разблокирован.")
                     try:
                         await message.bot.unban_chat_member(chat_id=GROUP_CHAT_ID, user_id=user_id) # type: ignore
                         await message.bot.send_message(user_id, "✅ Вы были разблокированы и можете зайти в чат.\nБольше не нарушайте правила.\nДобро пожаловать!")  # type: ignore
                     except Exception as e: 
-                        logging.error(f"Error sending message to user {user_id}: {e}")
+                        logger.error(f"Error sending message to user {user_id}: {e}")
                 except SQLAlchemyError as e:
                     await session.rollback()
-                    logging.error(f"Error unblocking user: {e}")
+                    logger.error(f"Error unblocking user: {e}")
                     await message.answer("❌ Произошла ошибка при разблокировке пользователя.")
                     return
             else:
@@ -372,111 +402,333 @@ async def unblock_user_command(message: Message, state: FSMContext):
 
         await state.clear()
 
+TRANSACTIONS_PER_PAGE = 10  # Количество заявок в одном сообщении очереди
+AMOUNT_FILTERS = [0, 1000, 5000, 10000]  # Пороги фильтра "сумма от"
+URGENCY_FILTERS = {"all": "Все", "urgent": "Срочные", "normal": "Обычные"}
+DEFAULT_TRANSACTION_FILTERS = {"bank": None, "urgency": "all", "min_amount": 0}
+
+
+def transaction_queue_conditions(filters: dict) -> list:
+    """
+    Условия WHERE для очереди заявок на вывод с учетом фильтров администратора.
+    """
+    conditions = [WithdrawalHistory.status == 'pending']
+
+    if filters.get("bank"):
+        conditions.append(WithdrawalHistory.bank == filters['bank'])
+    if filters.get("urgency") == "urgent":
+        conditions.append(WithdrawalHistory.is_urgent == True)
+    elif filters.get("urgency") == "normal":
+        conditions.append(WithdrawalHistory.is_urgent == False)
+    if filters.get("min_amount"):
+        conditions.append(WithdrawalHistory.amount >= filters["min_amount"])
+
+    return conditions
+
+
+async def render_transaction_queue(db, filters: dict, page: int) -> tuple[str, InlineKeyboardMarkup, list[int], int]:
+    """
+    Формирует одну страницу очереди заявок на вывод.
+    Возвращает текст, клавиатуру, ID заявок на странице и фактический номер страницы.
+    """
+    conditions = transaction_queue_conditions(filters)
+
+    result = await db.execute(
+        select(func.count(WithdrawalHistory.id), func.coalesce(func.sum(WithdrawalHistory.amount), 0)).where(*conditions)
+    )
+    total_count, total_amount = result.one()
+
+    total_pages = max(1, -(-total_count // TRANSACTIONS_PER_PAGE))
+    page = min(max(1, page), total_pages)
+
+    transactions = await fetch_rows(db, QueueTransactionRow, (
+        transaction_queue_select()
+        .where(*conditions)
+        .order_by(WithdrawalHistory.is_urgent.desc(), WithdrawalHistory.withdrawal_date)
+        .offset((page - 1) * TRANSACTIONS_PER_PAGE)
+        .limit(TRANSACTIONS_PER_PAGE)
+    ))
+
+    bank_name = BANK_MAP.get(filters["bank"], "Все") if filters.get("bank") else "Все"
+    text = (
+        f"📋 *Очередь заявок на вывод*\n"
+        f"🔎 Банк: {bank_name} · Приоритет: {URGENCY_FILTERS[filters['urgency']]} · Сумма от {filters['min_amount']}₽\n"
+        f"🧾 Заявок: {total_count} на сумму {total_amount:.2f}₽ · Страница {page}/{total_pages}\n\n"
+    )
+
+    transaction_rows = []
+    for txn in transactions:
+        transaction_rows.append(
+            f"{'🔥' if txn.is_urgent else '💼'} *ID {txn.id}* · {txn.amount}₽ · {BANK_MAP.get(txn.bank or '', txn.bank or 'Нет')}\n"
+            f"👤 {escape_markdown(txn.last_name)} {escape_markdown(txn.first_name)} {escape_markdown(txn.patronymic or '')} ({escape_markdown(txn.first_name_tg)})\n"
+            f"💳 {escape_markdown(txn.requisites or 'Нет')}\n"
+            f"📅 {format_moscow_time(txn.withdrawal_date)}"
+        )
+    text += "\n──────────\n".join(transaction_rows) or "✅ Заявок нет."
+
+    keyboard = [
+        [InlineKeyboardButton(text=f"✅ {txn.id}", callback_data=f"approve_{txn.id}"),
+         InlineKeyboardButton(text=f"❌ {txn.id}", callback_data=f"cancel_{txn.id}")]
+        for txn in transactions
+    ]
+
+    pagination = []
+    if page > 1:
+        pagination.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"txq_page_{page - 1}"))
+    if page < total_pages:
+        pagination.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"txq_page_{page + 1}"))
+    if pagination:
+        keyboard.append(pagination)
+
+    keyboard.append([
+        InlineKeyboardButton(text=f"🏦 {bank_name}", callback_data="txq_bank"),
+        InlineKeyboardButton(text=f"⏳ {URGENCY_FILTERS[filters['urgency']]}", callback_data="txq_urgency"),
+        InlineKeyboardButton(text=f"💰 от {filters['min_amount']}₽", callback_data="txq_amount"),
+    ])
+    if transactions:
+        keyboard.append([
+            InlineKeyboardButton(text="✅ Одобрить страницу", callback_data="txq_approve_page"),
+            InlineKeyboardButton(text="📄 Выгрузить CSV", callback_data="txq_export"),
+        ])
+    keyboard.append([back_button])
+
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard), [txn.id for txn in transactions], page
+
+
+async def show_transaction_queue(callback_query: CallbackQuery, state: FSMContext, page: int | None = None):
+    """
+    Перерисовывает очередь заявок в текущем сообщении с сохраненными фильтрами.
+    """
+    data = await state.get_data()
+    filters = data.get("tx_filters") or dict(DEFAULT_TRANSACTION_FILTERS)
+    page = page if page is not None else data.get("tx_page", 1)
+
+    async with get_async_session() as db:
+        try:
+            text, keyboard, page_ids, page = await render_transaction_queue(db, filters, page)
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching transactions: {e}")
+            await callback_query.answer("⚠️ Произошла ошибка при получении транзакций. Попробуйте позже.", show_alert=True)
+            return
+
+    await state.update_data(tx_filters=filters, tx_page=page, tx_page_ids=page_ids)
+    await navigation.show(callback_query, text, reply_markup=keyboard, parse_mode="Markdown", screen="transaction_queue")
+
+
 @router.callback_query(F.data == "transactions")
-async def list_transactions(callback_query: CallbackQuery):
+async def list_transactions(callback_query: CallbackQuery, state: FSMContext):
     """
     Обрабатывает нажатие на кнопку "Транзакции" для админов.
+    Показывает очередь заявок на вывод постранично в одном сообщении.
     """
 
     user_id = callback_query.from_user.id  # type: ignore
-    logging.info(f"Admin menu called by user: {user_id}")
+    logger.info(f"Admin menu called by user: {user_id}")
 
-    # Проверяем, является ли пользователь администратором
-    if not await is_admins(user_id):
-        logging.warning(f"Access denied for user: {user_id}")
-        return
+    await state.update_data(tx_filters=dict(DEFAULT_TRANSACTION_FILTERS), tx_page=1)
+    await show_transaction_queue(callback_query, state, page=1)
+    await state.set_state(AdminMenu.transaction)
+    await callback_query.answer()
 
-    bot = callback_query.bot
 
-    await bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
-    await callback_query.message.answer("📋 *Транзакции* 📋", parse_mode="Markdown")  # type: ignore
+@router.callback_query(F.data.startswith("txq_page_") | F.data.in_({"txq_bank", "txq_urgency", "txq_amount"}))
+async def change_transaction_queue(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Переключает страницу очереди заявок или один из фильтров (банк, приоритет, сумма).
+    """
+    data = await state.get_data()
+    filters = data.get("tx_filters") or dict(DEFAULT_TRANSACTION_FILTERS)
+    page = 1
+
+    if callback_query.data.startswith("txq_page_"):  # type: ignore
+        page = int(callback_query.data.split("_")[-1])  # type: ignore
+    elif callback_query.data == "txq_bank":
+        # Переключаем банк по кругу: Все -> sber -> tinkoff -> ... -> Все
+        banks = [None] + list(BANK_MAP.keys())
+        filters["bank"] = banks[(banks.index(filters.get("bank")) + 1) % len(banks)]
+    elif callback_query.data == "txq_urgency":
+        urgencies = list(URGENCY_FILTERS.keys())
+        filters["urgency"] = urgencies[(urgencies.index(filters.get("urgency", "all")) + 1) % len(urgencies)]
+    elif callback_query.data == "txq_amount":
+        filters["min_amount"] = AMOUNT_FILTERS[(AMOUNT_FILTERS.index(filters.get("min_amount", 0)) + 1) % len(AMOUNT_FILTERS)]
+
+    await state.update_data(tx_filters=filters)
+    await show_transaction_queue(callback_query, state, page=page)
+    await callback_query.answer()
+
+
+async def set_transactions_status(transaction_ids: list[int], status: str) -> list[int]:
+    """
+    Переводит заявки из статуса 'pending' в status одним UPDATE.
+    Возвращает ID заявок, которые действительно были изменены.
+    """
+    if not transaction_ids:
+        return []
 
     async with get_async_session() as db:
         try:
-            # Срочные транзакции
-            urgent_transactions = await db.execute(
-                select(WithdrawalHistory)
-                .options(joinedload(WithdrawalHistory.user))  # Загрузка связанных данных пользователя
-                .filter(WithdrawalHistory.is_urgent == True, WithdrawalHistory.status == 'pending')
-                .order_by(WithdrawalHistory.withdrawal_date)
+            result = await db.execute(
+                update(WithdrawalHistory)
+                .where(WithdrawalHistory.id.in_(transaction_ids), WithdrawalHistory.status == 'pending')
+                .values(status=status)
+                .returning(WithdrawalHistory.id)
+                .execution_options(synchronize_session=False)
             )
-            urgent_transactions = urgent_transactions.scalars().all()
-
-            # Обычные транзакции
-            normal_transactions = await db.execute(
-                select(WithdrawalHistory)
-                .options(joinedload(WithdrawalHistory.user))  # Загрузка связанных данных пользователя
-                .filter(WithdrawalHistory.is_urgent == False, WithdrawalHistory.status == 'pending')
-                .order_by(WithdrawalHistory.withdrawal_date)
-            )
-            normal_transactions = normal_transactions.scalars().all()
+            changed_ids = list(result.scalars().all())
+            await db.commit()
+            return changed_ids
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Error changing status of transactions {transaction_ids} to {status}: {e}")
+            return []
+
+
+@router.callback_query(F.data == "txq_approve_page")
+async def approve_transaction_page(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Одобряет все заявки, показанные на текущей странице очереди.
+    """
+    data = await state.get_data()
+    approved_ids = await set_transactions_status(data.get("tx_page_ids", []), 'approved')
+    logger.info(f"Admin {callback_query.from_user.id} approved transactions {approved_ids}")
+
+    await callback_query.answer(f"Одобрено заявок: {len(approved_ids)}.", show_alert=True)
+    await show_transaction_queue(callback_query, state)
+
 
+@router.callback_query(F.data == "txq_export")
+async def export_transaction_queue(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Выгружает все заявки очереди с учетом текущих фильтров в CSV-файл.
+    """
+    data = await state.get_data()
+    filters = data.get("tx_filters") or dict(DEFAULT_TRANSACTION_FILTERS)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(["ID", "Telegram ID", "ФИО", "Сумма", "Дата", "Срочный", "Банк", "Реквизиты"])
+
+    async with get_async_session() as db:
+        try:
+            transactions = await fetch_rows(db, QueueTransactionRow, (
+                transaction_queue_select()
+                .where(*transaction_queue_conditions(filters))
+                .order_by(WithdrawalHistory.is_urgent.desc(), WithdrawalHistory.withdrawal_date)
+            ))
+            for txn in transactions:
+                writer.writerow([
+                    txn.id, txn.user_id, f"{txn.last_name} {txn.first_name} {txn.patronymic or ''}".strip(), txn.amount,
+                    format_moscow_time(txn.withdrawal_date),
+                    "да" if txn.is_urgent else "нет", BANK_MAP.get(txn.bank or '', txn.bank or ''), txn.requisites or ''
+                ])
         except SQLAlchemyError as e:
-            logging.error(f"Error fetching transactions: {e}")
-            await bot.send_message(callback_query.message.chat.id, "⚠️ Произошла ошибка при получении транзакции. Попробуйте позже.")  # type: ignore
+            logger.error(f"Error exporting transactions: {e}")
+            await callback_query.answer("⚠️ Произошла ошибка при выгрузке транзакций.", show_alert=True)
             return
-        
-        # Отправляем списки транзакций
-        await send_transaction_list(bot, callback_query.message.chat.id, urgent_transactions, "🔥 Срочные транзакции", db) # type: ignore
-        await send_transaction_list(bot, callback_query.message.chat.id, normal_transactions, "💼 Обычные транзакции", db) # type: ignore
 
+    file_name = f"transactions_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+    document = BufferedInputFile(buffer.getvalue().encode("utf-8-sig"), filename=file_name)
+    await callback_query.message.answer_document(document)  # type: ignore
     await callback_query.answer()
 
-@router.callback_query(F.data.startswith("approve_"))
-async def approve_transaction(callback_query: types.CallbackQuery):
 
-    user_id = callback_query.from_user.id  # type: ignore
-    bot = callback_query.bot
+async def send_payout_files(callback_query: CallbackQuery, db, batch_id: str):
+    """
+    Формирует реестры выгрузки batch_id по банкам и отправляет их администратору.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        payout_files = await write_payout_files(db, batch_id, directory)
+        for payout_file in payout_files:
+            await callback_query.message.answer_document(  # type: ignore
+                FSInputFile(payout_file.path, filename=os.path.basename(payout_file.path)),
+                caption=f"🏦 {BANK_MAP.get(payout_file.bank, 'Другие банки')}: {payout_file.count} заявок на сумму {payout_file.total:.2f}₽"
+            )
 
-    # Проверяем, является ли пользователь администратором
-    if not await is_admins(user_id):
-        logging.warning(f"Access denied for user: {user_id}")
-        return
-    
-    txn_id = int(callback_query.data.split("_")[1]) # type: ignore
 
-    # Обновляем статус транзакции в базе данных
-    async with get_async_session() as db:
-        result = await db.execute(select(WithdrawalHistory).filter(WithdrawalHistory.id == txn_id))
-        transaction = result.scalar_one_or_none()
+def payout_redownload_keyboard(batch_id: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔁 Скачать реестры повторно", callback_data=f"payout_batch_{batch_id}")]])
 
-        await callback_query.message.edit_reply_markup(reply_markup=None) # type: ignore
 
-        if transaction and transaction.status == 'pending':
-            transaction.status = 'approved'
+@router.callback_query(F.data == "payout_export")
+async def export_payouts(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Помечает все одобренные заявки выплаченными в новой выгрузке и отправляет реестры по банкам.
+    Отметка коммитится до отправки файлов: реестры, которые уже у администратора, не попадут
+    в следующую выгрузку, даже если отправка оборвется. Реестры выгрузки можно скачать повторно.
+    """
+    await callback_query.answer("⏳ Формирую реестры выплат...")
+    batch_id = new_payout_batch_id()
+
+    async with get_async_session() as db:
+        try:
+            marked = await mark_approved_as_paid(db, batch_id)
+            if not marked:
+                await db.rollback()
+                await callback_query.message.answer("✅ Одобренных заявок для выплаты нет.")  # type: ignore
+                return
             await db.commit()
-            await callback_query.answer(f"Транзакция ID {txn_id} одобрена.", show_alert=True)
-            await bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
-        else:
-            await callback_query.answer("Невозможно одобрить транзакцию.", show_alert=True)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Error marking payout batch {batch_id}: {e}")
+            await callback_query.message.answer("⚠️ Произошла ошибка при формировании выгрузки. Заявки не были помечены выплаченными.")  # type: ignore
+            return
 
-@router.callback_query(F.data.startswith("cancel_"))
-async def cancel_transaction(callback_query: CallbackQuery):
+        logger.info(f"Admin {callback_query.from_user.id} exported payout batch {batch_id} ({marked} withdrawals)")
+        try:
+            await send_payout_files(callback_query, db, batch_id)
+        except (SQLAlchemyError, TelegramAPIError, OSError) as e:
+            logger.error(f"Error sending payout batch {batch_id}: {e}")
+            await callback_query.message.answer(  # type: ignore
+                f"⚠️ Заявки выгрузки `{batch_id}` ({marked}) помечены выплаченными, но не все реестры отправлены. Скачайте их повторно.",
+                reply_markup=payout_redownload_keyboard(batch_id), parse_mode="Markdown"
+            )
+            return
 
-    user_id = callback_query.from_user.id  # type: ignore
-    bot = callback_query.bot
+    await callback_query.message.answer(  # type: ignore
+        f"✅ Выгрузка `{batch_id}`: {marked} заявок помечены выплаченными.",
+        reply_markup=payout_redownload_keyboard(batch_id), parse_mode="Markdown"
+    )
 
-    # Проверяем, является ли пользователь администратором
-    if not await is_admins(user_id):
-        logging.warning(f"Access denied for user: {user_id}")
-        return
-    
-    txn_id = int(callback_query.data.split("_")[1]) # type: ignore
 
-    # Обновляем статус транзакции в базе данных
+@router.callback_query(F.data.startswith("payout_batch_"))
+async def redownload_payouts(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Повторно отправляет реестры уже выполненной выгрузки; статусы заявок не меняются.
+    """
+    batch_id = callback_query.data.removeprefix("payout_batch_")  # type: ignore
+    await callback_query.answer("⏳ Формирую реестры выплат...")
+
     async with get_async_session() as db:
-        result = await db.execute(select(WithdrawalHistory).filter(WithdrawalHistory.id == txn_id))
-        transaction = result.scalar_one_or_none()
+        try:
+            await send_payout_files(callback_query, db, batch_id)
+        except (SQLAlchemyError, TelegramAPIError, OSError) as e:
+            logger.error(f"Error resending payout batch {batch_id}: {e}")
+            await callback_query.message.answer("⚠️ Не удалось отправить реестры. Попробуйте еще раз.", reply_markup=payout_redownload_keyboard(batch_id))  # type: ignore
 
-        await callback_query.message.edit_reply_markup(reply_markup=None) # type: ignore
 
-        if transaction and transaction.status == 'pending':
-            transaction.status = 'cancelled'
-            await db.commit()
-            await callback_query.answer(f"Транзакция ID {txn_id} отменена.", show_alert=True)
-            await bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
-        else:
-            await callback_query.answer("Невозможно отменить транзакцию.", show_alert=True)
+@router.callback_query(F.data.startswith("approve_"))
+async def approve_transaction(callback_query: types.CallbackQuery, state: FSMContext):
+    txn_id = int(callback_query.data.split("_")[1]) # type: ignore
+
+    # Обновляем статус транзакции в базе данных одним UPDATE с проверкой статуса
+    if await set_transactions_status([txn_id], 'approved'):
+        await callback_query.answer(f"Транзакция ID {txn_id} одобрена.", show_alert=True)
+    else:
+        await callback_query.answer("Невозможно одобрить транзакцию.", show_alert=True)
+
+    await show_transaction_queue(callback_query, state)
+
+@router.callback_query(F.data.startswith("cancel_"))
+async def cancel_transaction(callback_query: CallbackQuery, state: FSMContext):
+    txn_id = int(callback_query.data.split("_")[1]) # type: ignore
+
+    # Обновляем статус транзакции в базе данных одним UPDATE с проверкой статуса
+    if await set_transactions_status([txn_id], 'cancelled'):
+        await callback_query.answer(f"Транзакция ID {txn_id} отменена.", show_alert=True)
+    else:
+        await callback_query.answer("Невозможно отменить транзакцию.", show_alert=True)
+
+    await show_transaction_queue(callback_query, state)
 
 
 @router.callback_query(F.data == "delete_user")
@@ -485,12 +737,8 @@ async def process_delete_user(callback_query: CallbackQuery, state: FSMContext):
     Обрабатывает нажатие на кнопку "Удалить пользователя".
     Запрашивает у администратора ID пользователя для удаления.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer("🗑 Пожалуйста, введите ID пользователя для удаления в формате:\n`<user_id>`\n\nНе рекомендуется это действие, так как могут возникнуть проблемы с базой данных", # type: ignore
-                                        parse_mode="Markdown", 
-                                        reply_markup=inline_kb
-                                        )
+    await navigation.show(callback_query, "🗑 Пожалуйста, введите ID пользователя для удаления в формате:\n`<user_id>`\n\nНе рекомендуется это действие, так как могут возникнуть проблемы с базой данных", reply_markup=inline_kb, parse_mode="Markdown", screen="process_delete_user")
     await state.set_state(AdminMenu.delete_user)
 
 
@@ -500,11 +748,7 @@ async def delete_user_command(message: types.Message, state: FSMContext):
     Обработчик команды удаления пользователя для админов.
     Удаляет пользователя с указанным ID из базы данных.
     """
-    logging.info(f"Received command for deleting user: {message.text}")
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-
+    logger.info(f"Received command for deleting user: {message.text}")
     args = message.text.split()  # type: ignore
     if len(args) != 1:
         await message.answer("❗️ Некорректный формат. Используйте: `<user_id>`", parse_mode="Markdown")
@@ -517,21 +761,22 @@ async def delete_user_command(message: types.Message, state: FSMContext):
         return
 
     async with get_async_session() as db:
-        await db.execute(delete(Referral).where(Referral.user_id == user_id))
-        await db.execute(delete(Referral).where(Referral.referral_id == user_id))
-
         result = await db.execute(select(User).filter(User.user_id == user_id))
         db_user = result.scalar_one_or_none()
 
         if db_user:
             try:
+                # Связи в referrals и дереве рефералов ссылаются на users.id, а не на Telegram ID
+                await db.execute(delete(Referral).where((Referral.user_id == db_user.id) | (Referral.referral_id == db_user.id)))
+                await detach_subtree(db, db_user.id)
                 await db.delete(db_user)
                 await db.commit()
+                await invalidate_user_snapshot(user_id)
                 await message.answer(f"✅ Пользователь с ID `{user_id}` был успешно удален.", parse_mode="Markdown")
             except SQLAlchemyError as e:
                 await db.rollback()
                 await message.answer("❌ Произошла ошибка при удалении пользователя. Попробуйте позже.")
-                logging.error(f"Error committing the change: {e}")
+                logger.error(f"Error committing the change: {e}")
         else:
             await message.answer("❌ Пользователь с указанным ID не найден.")
     
@@ -544,16 +789,8 @@ async def process_change_vacancies(callback_query: CallbackQuery, state: FSMCont
     Обрабатывает нажатие на кнопку "Изменить вакансии".
     Запрашивает у администратора ID вакансий для изменения.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
-    if not await is_admins(callback_query.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user: {callback_query.from_user.id}")  # type: ignore
-        return
-    
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer("📝 Пожалуйста, введите ID вакансий для изменения в формате:\n`<vacancy_id>`", # type: ignore
-                                        parse_mode="Markdown", 
-                                        reply_markup=inline_kb
-                                        )
+    await navigation.show(callback_query, "📝 Пожалуйста, введите ID вакансий для изменения в формате:\n`<vacancy_id>`", reply_markup=inline_kb, parse_mode="Markdown", screen="process_change_vacancies")
     await state.set_state(AdminMenu.change_vacancies)
 
 @router.message(AdminMenu.change_vacancies)
@@ -561,11 +798,7 @@ async def change_vacancies_command(message: types.Message, state: FSMContext):
     """
     Обработчик команды изменения вакансий для админов.
     """
-    logging.info(f"Received command for changing vacancies: {message.text}")
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-    
+    logger.info(f"Received command for changing vacancies: {message.text}")
     args = message.text.split() # type: ignore
     if len(args) != 1:
         await message.answer("❗️ Некорректный формат. Используйте: `<vacancy_id>`", parse_mode="Markdown")
@@ -588,7 +821,7 @@ async def change_vacancies_command(message: types.Message, state: FSMContext):
             except SQLAlchemyError as e:
                 await db.rollback()
                 await message.answer("❌ Произошла ошибка при закрытии вакансии. Попробуйте позже.")
-                logging.error(f"Error committing the change: {e}")
+                logger.error(f"Error committing the change: {e}")
         else:
             await message.answer("❌ Вакансия с указанным ID не найдена.")
 
@@ -600,16 +833,8 @@ async def process_broadcast(callback_query: CallbackQuery, state: FSMContext):
     Обрабатывает нажатие на кнопку "Рассылка".
     Запрашивает у администратора сообщение для рассылки.
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id)  # type: ignore
-    if not await is_admins(callback_query.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user: {callback_query.from_user.id}")  # type: ignore
-        return
-    
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer("📨 Пожалуйста, введите сообщение для рассылки в формате:\n`<message>`", # type: ignore
-                                        parse_mode="Markdown", 
-                                        reply_markup=inline_kb
-                                        )
+    await navigation.show(callback_query, "📨 Пожалуйста, введите сообщение для рассылки в формате:\n`<message>`", reply_markup=inline_kb, parse_mode="Markdown", screen="process_broadcast")
     await state.set_state(AdminMenu.broadcast)
 
 
@@ -618,57 +843,59 @@ async def broadcast_command(message: types.Message, state: FSMContext):
     """
     Обработчик команды рассылки для админов.
     Рассылка сообщения всем пользователям в базе данных.
+    Рассылка идет минуты, поэтому выполняется отдельной задачей, чтобы не задерживать обновления администратора.
     """
-    logging.info(f"Received command for broadcasting: {message.text}")
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-
+    logger.info(f"Received command for broadcasting: {message.text}")
     message_text = message.text
     
-    await message.answer("✅ Рассылка началась. Ожидайте...")
-    await message.bot.send_chat_action(chat_id=message.chat.id, action="typing") # type: ignore
-    
     try:
         async with get_async_session() as db:
-            result = await db.execute(select(User))
-            users = result.scalars().all()
-
-        sent_count = 0
-        failed_count = 0
-
-        async def send_message_to_users(user):
-            nonlocal sent_count, failed_count
-            try:
-                async with limiter:
-                    await message.bot.send_message(chat_id=user.user_id, text=message_text, parse_mode="Markdown") # type: ignore
-                    sent_count += 1
-            except Exception as e:
-                logging.error(f"Failed to send message to user {user}: {e}")
-                failed_count += 1
-
-        await message.bot.delete_message(message.chat.id, message.message_id) # type: ignore
-        await asyncio.gather(*(send_message_to_users(user) for user in users))
-        await message.answer(f"✅ Рассылка завершена. Отправлено: {sent_count}. Ошибок: {failed_count}.")
-    
+            result = await db.execute(select(User.user_id))
+            recipient_ids = result.scalars().all()
     except SQLAlchemyError as e:
         await message.answer(f"❌ Произошла ошибка при отправке сообщения. Попробуйте позже.\n\n{e}")
-        logging.error(f"Error committing the change: {e}")
-    
+        logger.error(f"Error committing the change: {e}")
+        await state.clear()
+        return
+
     await state.clear()
+    await message.answer("✅ Рассылка началась. Ожидайте...")
+    await message.bot.send_chat_action(chat_id=message.chat.id, action="typing") # type: ignore
+    await message.bot.delete_message(message.chat.id, message.message_id) # type: ignore
+    _spawn(run_broadcast(message, message_text, recipient_ids)) # type: ignore
+
+
+async def run_broadcast(message: types.Message, message_text: str, recipient_ids: list[int]):
+    sent_count = 0
+    failed_count = 0
+
+    async def send_message_to_users(user_id):
+        nonlocal sent_count, failed_count
+        try:
+            async with limiter:
+                await message.bot.send_message(chat_id=user_id, text=message_text, parse_mode="Markdown") # type: ignore
+                sent_count += 1
+        except Exception as e:
+            logger.error(f"Failed to send message to user {user_id}: {e}")
+            failed_count += 1
+
+    await asyncio.gather(*(send_message_to_users(user_id) for user_id in recipient_ids))
+    logger.info(f"Broadcast finished: sent {sent_count}, failed {failed_count}")
+    await message.answer(f"✅ Рассылка завершена. Отправлено: {sent_count}. Ошибок: {failed_count}.")
 
 @router.callback_query(F.data == "info_about_user")
 async def info_about_user(callback_query: CallbackQuery, state: FSMContext):
     """
     Обработчик нажатия на кнопку "Информация о пользователе".
     """
-    await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id) # type: ignore
     inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
-    await callback_query.message.answer(  # type: ignore
+    await navigation.show(
+        callback_query,
         "👤 *Просмотр информации о пользователе*\n\n"
         "Введите ID пользователя для просмотра полной информации.",
         parse_mode="Markdown",
-        reply_markup=inline_kb
+        reply_markup=inline_kb,
+        screen="info_about_user"
     )
     await state.set_state(AdminMenu.info_about_user)
 
@@ -678,12 +905,8 @@ async def info_about_user_command(message: types.Message, state: FSMContext):
     Обработчик команды "Информация о пользователе".
     Запрашивает ID пользователя для просмотра полной информации.
     """
-    logging.info(f"Received command for getting info about user: {message.text}")
+    logger.info(f"Received command for getting info about user: {message.text}")
 
-    if not await is_admins(message.from_user.id):  # type: ignore
-        logging.warning(f"Access denied for user {message.from_user.id}")  # type: ignore
-        return
-    
     try:
         user_id = int(message.text.strip()) # type: ignore
     except ValueError:
@@ -691,61 +914,230 @@ async def info_about_user_command(message: types.Message, state: FSMContext):
         return
     
     async with get_async_session() as session:
+        try:
+            result = await session.execute(select(User).where(User.user_id == user_id))
+            db_user = result.scalar_one_or_none()
+
+            if not db_user:
+                await message.answer("❗️ Пользователь не найден.")
+                return
+
+            user_info, inline_kb = await render_user_card(session, db_user)
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting info about user {user_id}: {e}")
+            await message.answer("❌ Произошла ошибка при получении информации о пользователе.")
+            return
+
+    # Отправляем администратору карточку пользователя, истории листаются кнопками
+    await message.answer(user_info, reply_markup=inline_kb, parse_mode="Markdown")
+    await state.clear()
+
+
+USER_INFO_PAGE_SIZE = 10  # Количество записей истории на одной странице карточки пользователя
+USER_INFO_TOP_BRANCHES = 3  # Сколько самых доходных веток команды показывать в карточке
+USER_INFO_SECTIONS = {"ref": "👥 Рефералы", "rcpt": "💸 Поступления", "wdr": "📤 Выводы"}
+
+
+async def render_user_card(session, db_user: User) -> tuple[str, InlineKeyboardMarkup]:
+    """
+    Карточка пользователя для администратора: профиль и сводка по историям (агрегатные запросы, без загрузки строк).
+    """
+    result = await session.execute(select(func.count(Referral.id)).where(Referral.user_id == db_user.id))
+    referrals_count = result.scalar()
+
+    # Команда и самые доходные ветки — по таблице замыкания, без рекурсивных запросов
+    downline = await downline_stats(session, db_user.id)
+    branches = await branch_stats(session, db_user.id, USER_INFO_TOP_BRANCHES)
+    branches_info = "".join(
+        f"  - {escape_markdown(branch.first_name_tg)} ({branch.user_id}): {branch.members} чел., {branch.work_earnings:.2f} ₽\n"
+        for branch in branches
+    )
+
+    result = await session.execute(
+        select(func.count(ReceiptHistory.id), func.coalesce(func.sum(ReceiptHistory.amount), 0))
+        .where(ReceiptHistory.user_id == db_user.user_id)
+    )
+    receipts_count, receipts_sum = result.one()
+
+    result = await session.execute(
+        select(WithdrawalHistory.status, func.count(WithdrawalHistory.id), func.sum(WithdrawalHistory.amount))
+        .where(WithdrawalHistory.user_id == db_user.user_id)
+        .group_by(WithdrawalHistory.status)
+    )
+    withdrawals_by_status = result.all()
+    withdrawals_count = sum(count for _, count, _ in withdrawals_by_status)
+    withdrawals_info = "".join(
+        f"  - {STATUS_MAP.get(status, status)}: {count} на {total:.2f} ₽\n" for status, count, total in withdrawals_by_status
+    )
+
+    # История старше срока хранения перенесена в архив, по ней есть только итоги
+    archived = await archived_totals(session, db_user.user_id)
+    archive_info = (
+        f"🗄 В архиве: {archived.receipts_count} поступлений на {archived.receipts_amount:.2f} ₽, "
+        f"{archived.withdrawals_count} заявок на вывод (выплачено {archived.withdrawals_paid_amount:.2f} ₽)\n"
+    ) if archived else ""
+
+    user_info = (
+        f"👤 *Информация о пользователе*\n\n"
+        f"ID: {db_user.user_id}\n"
+        f"Дата регистрации: {format_moscow_time(db_user.created_at)}\n"
+        f"Последняя активность: {format_moscow_time(db_user.last_activity)}\n"
+        f"Имя TG: {escape_markdown(db_user.first_name_tg)} {escape_markdown(db_user.last_name_tg or '')}\n"
+        f"ФИО: {escape_markdown(db_user.last_name)} {escape_markdown(db_user.first_name)} {escape_markdown(db_user.patronymic or '')}\n"
+        f"Телефон: {escape_markdown(db_user.phone_number)}\n"
+        f"Баланс счета: {db_user.account_balance:.2f} ₽\n"
+        f"Заработок от работы: {db_user.work_earnings:.2f} ₽\n"
+        f"Реферальный заработок: {db_user.referral_earnings:.2f} ₽\n\n"
+        f"👥 Рефералов: {referrals_count}\n"
+        f"🌳 Команда: {downline.members} чел. на {downline.levels} уровнях, заработок {downline.work_earnings:.2f} ₽\n{branches_info}"
+        f"💸 Поступлений: {receipts_count} на {receipts_sum:.2f} ₽\n"
+        f"📤 Заявок на вывод: {withdrawals_count}\n{withdrawals_info}"
+        f"{archive_info}"
+    )
+
+    inline_kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"👥 Рефералы ({referrals_count})", callback_data=f"uinfo_ref_{db_user.user_id}_1")],
+        [InlineKeyboardButton(text=f"💸 Поступления ({receipts_count})", callback_data=f"uinfo_rcpt_{db_user.user_id}_1")],
+        [InlineKeyboardButton(text=f"📤 Выводы ({withdrawals_count})", callback_data=f"uinfo_wdr_{db_user.user_id}_1")],
+        [InlineKeyboardButton(text="📄 Выгрузить полную историю", callback_data=f"uinfo_export_{db_user.user_id}")],
+    ])
+    return user_info, inline_kb
+
+
+async def render_user_section(session, db_user: User, section: str, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    """
+    Одна страница истории пользователя (рефералы, поступления или выводы).
+    """
+    offset = (page - 1) * USER_INFO_PAGE_SIZE
+
+    if section == "ref":
         result = await session.execute(
-            select(User)
-            .options(joinedload(User.referrals), joinedload(User.withdrawals), joinedload(User.receipt_history))
-            .where(User.user_id == user_id)
+            select(User.user_id, User.last_name, User.first_name, User.patronymic, Referral.date_joined)
+            .join(Referral, Referral.referral_id == User.id)
+            .where(Referral.user_id == db_user.id)
+            .order_by(Referral.date_joined.desc())
+            .offset(offset).limit(USER_INFO_PAGE_SIZE + 1)
         )
-        db_user = result.unique().scalar_one_or_none()
+        rows = result.all()
+        has_next_page = len(rows) > USER_INFO_PAGE_SIZE
+        lines = [
+            f"- ID: {row.user_id}, ФИО: {escape_markdown(row.last_name)} {escape_markdown(row.first_name)} {escape_markdown(row.patronymic or '')}"
+            for row in rows[:USER_INFO_PAGE_SIZE]
+        ]
+    elif section == "rcpt":
+        receipts, has_next_page = await receipts_page(session, db_user.user_id, page, USER_INFO_PAGE_SIZE)
+        lines = [
+            f"- {format_moscow_time(receipt.date)} - {receipt.amount:.2f} ₽ - {escape_markdown(receipt.description or 'Описание отсутствует')}"
+            for receipt in receipts
+        ]
+    else:
+        withdrawals, has_next_page = await withdrawals_page(session, db_user.user_id, page, USER_INFO_PAGE_SIZE)
+        lines = [
+            f"- {format_moscow_time(withdrawal.withdrawal_date)} - {withdrawal.amount:.2f} ₽ - Статус: {STATUS_MAP.get(withdrawal.status, withdrawal.status)}\n"
+            f"- {'Быстрый' if withdrawal.is_urgent else 'Обычный'} - {format_bank_and_requisites(withdrawal.bank, withdrawal.requisites)}"
+            for withdrawal in withdrawals
+        ]
+
+    text = (
+        f"{USER_INFO_SECTIONS[section]} пользователя `{db_user.user_id}` · Страница {page}\n\n"
+        + ("\n".join(lines) or "Записей нет.")
+    )
+
+    # Запрашиваем на одну строку больше, чтобы понять, есть ли следующая страница, без COUNT(*)
+    pagination = []
+    if page > 1:
+        pagination.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"uinfo_{section}_{db_user.user_id}_{page - 1}"))
+    if has_next_page:
+        pagination.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"uinfo_{section}_{db_user.user_id}_{page + 1}"))
+
+    inline_kb = InlineKeyboardMarkup(inline_keyboard=[
+        pagination,
+        [InlineKeyboardButton(text="👤 К карточке пользователя", callback_data=f"uinfo_card_{db_user.user_id}")],
+    ])
+    return text, inline_kb
 
-        if not db_user:
-            await message.answer("❗️ Пользователь не найден.")
+
+@router.callback_query(F.data.startswith("uinfo_"))
+async def user_info_section(callback_query: CallbackQuery):
+    """
+    Листание историй в карточке пользователя и возврат к карточке.
+    Формат callback_data: uinfo_<ref|rcpt|wdr>_<user_id>_<page> или uinfo_card_<user_id>.
+    """
+    parts = callback_query.data.split("_")  # type: ignore
+    section, user_id = parts[1], int(parts[2])
+
+    if section == "export":
+        await export_user_history(callback_query, user_id)
+        return
+
+    async with get_async_session() as session:
+        try:
+            result = await session.execute(select(User).where(User.user_id == user_id))
+            db_user = result.scalar_one_or_none()
+
+            if not db_user:
+                await callback_query.answer("❗️ Пользователь не найден.", show_alert=True)
+                return
+
+            if section == "card":
+                text, inline_kb = await render_user_card(session, db_user)
+            else:
+                text, inline_kb = await render_user_section(session, db_user, section, max(1, int(parts[3])))
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting info about user {user_id}: {e}")
+            await callback_query.answer("❌ Произошла ошибка при получении информации о пользователе.", show_alert=True)
             return
 
-        user_info = (
-            f"👤 *Информация о пользователе*\n\n"
-            f"ID: {db_user.user_id}\n"
-            f"Дата регистрации: {db_user.created_at.astimezone(pytz.timezone('Europe/Moscow')).strftime('%d.%m.%Y %H:%M')}\n"
-            f"Последняя активность: {db_user.last_activity.astimezone(pytz.timezone('Europe/Moscow')).strftime('%d.%m.%Y %H:%M')}\n"
-            f"Имя TG: {db_user.first_name_tg} {db_user.last_name_tg or ''}\n"
-            f"ФИО: {db_user.last_name} {db_user.first_name} {db_user.patronymic or ''}\n"
-            f"Телефон: {db_user.phone_number}\n"
-            f"Баланс счета: {db_user.account_balance:.2f} ₽\n"
-            f"Заработок от работы: {db_user.work_earnings:.2f} ₽\n"
-            f"Реферальный заработок: {db_user.referral_earnings:.2f} ₽\n\n"
-        )
+    await callback_query.message.edit_text(text, reply_markup=inline_kb, parse_mode="Markdown")  # type: ignore
+    await callback_query.answer()
 
-        # Выводим информацию о рефералах
-        if db_user.referrals:
-            user_info += f"👥 *Рефералы*:\n"
-            for referral in db_user.referrals:
-                referred_user_result = await session.execute(select(User).where(User.id == referral.referral_id))
-                referred_user = referred_user_result.scalar_one_or_none()
-                if referred_user:
-                    user_info += (
-                        f"- ID: {referred_user.user_id}, ФИО: {referred_user.last_name} "
-                        f"{referred_user.first_name} {referred_user.patronymic or ''}\n"
-                    )
-            user_info += "\n"
 
-        # Выводим историю поступлений
-        if db_user.receipt_history:
-            user_info += f"💸 *История поступлений*:\n"
-            for receipt in db_user.receipt_history:
-                user_info += f"- {receipt.date.strftime('%Y-%m-%d %H:%M')} - {receipt.amount:.2f} ₽ - {receipt.description or 'Описание отсутствует'}\n"
-            user_info += "\n"
+USER_HISTORY_FETCH_SIZE = 1000  # Размер порции при потоковом чтении истории из базы
 
-        # Выводим историю выводов средств
-        if db_user.withdrawals:
-            user_info += f"📤 *История выводов средств*:\n"
-            for withdrawal in db_user.withdrawals:
-                user_info += f"- {withdrawal.withdrawal_date.strftime('%Y-%m-%d %H:%M')} - {withdrawal.amount:.2f} ₽ - Статус: {withdrawal.status}\n" + f"- {'Быстрый' if withdrawal.is_urgent else 'Обычный'} - {await get_bank_and_phone(session, withdrawal.id) or 'Нет'}\n\n"
-            user_info += "\n"
 
-        # Отправляем администратору информацию о пользователе
-        await message.answer(user_info, parse_mode="Markdown")
+async def export_user_history(callback_query: CallbackQuery, user_id: int):
+    """
+    Выгружает полную историю поступлений и выводов пользователя в CSV-файл.
+    Строки читаются через серверный курсор и сразу пишутся в файл.
+    """
+    await callback_query.answer("⏳ Формирую выгрузку...")
 
-    await state.clear()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"user_{user_id}_history.csv")
+
+        async with get_async_session() as session:
+            try:
+                with open(path, "w", newline="", encoding="utf-8-sig") as file:
+                    writer = csv.writer(file, delimiter=";")
+                    writer.writerow(["Тип", "ID", "Дата", "Сумма", "Статус", "Срочный", "Банк", "Реквизиты", "Описание"])
+
+                    receipts = await session.stream(
+                        select(ReceiptHistory.id, ReceiptHistory.date, ReceiptHistory.amount, ReceiptHistory.description)
+                        .where(ReceiptHistory.user_id == user_id)
+                        .order_by(ReceiptHistory.date)
+                        .execution_options(yield_per=USER_HISTORY_FETCH_SIZE)
+                    )
+                    async for row in receipts:
+                        writer.writerow(["Поступление", row.id, format_moscow_time(row.date),
+                                         f"{row.amount:.2f}", "", "", "", "", row.description or ""])
+
+                    withdrawals = await session.stream(
+                        select(WithdrawalHistory.id, WithdrawalHistory.withdrawal_date, WithdrawalHistory.amount, WithdrawalHistory.status,
+                               WithdrawalHistory.is_urgent, WithdrawalHistory.bank, WithdrawalHistory.requisites)
+                        .where(WithdrawalHistory.user_id == user_id)
+                        .order_by(WithdrawalHistory.withdrawal_date)
+                        .execution_options(yield_per=USER_HISTORY_FETCH_SIZE)
+                    )
+                    async for row in withdrawals:
+                        writer.writerow(["Вывод", row.id, format_moscow_time(row.withdrawal_date),
+                                         f"{row.amount:.2f}", STATUS_MAP.get(row.status, row.status), "да" if row.is_urgent else "нет",
+                                         BANK_MAP.get(row.bank or '', row.bank or ''), row.requisites or "", ""])
+            except SQLAlchemyError as e:
+                logger.error(f"Error exporting history of user {user_id}: {e}")
+                await callback_query.message.answer("❌ Произошла ошибка при выгрузке истории.")  # type: ignore
+                return
+
+        await callback_query.message.answer_document(FSInputFile(path, filename=os.path.basename(path)))  # type: ignore
 
 
 @router.callback_query(F.data == "info_about_bot")
@@ -770,6 +1162,18 @@ async def info_about_bot(callback_query: CallbackQuery, state: FSMContext):
             result = await session.execute(select(func.count(User.id)).where(User.created_at >= one_month_ago))
             users_month = result.scalar()
 
+            # Заявки в работе по банкам: агрегат по индексу (status, bank), без разбора строк в Python
+            result = await session.execute(
+                select(WithdrawalHistory.bank, WithdrawalHistory.status, func.count(WithdrawalHistory.id), func.sum(WithdrawalHistory.amount))
+                .where(WithdrawalHistory.status.in_(['pending', 'approved']))
+                .group_by(WithdrawalHistory.bank, WithdrawalHistory.status)
+                .order_by(WithdrawalHistory.bank)
+            )
+            bank_statistics = "\n".join(
+                f"🔹 {BANK_MAP.get(bank or '', bank or 'Не указан')} ({STATUS_MAP.get(status, status)}): {count} на {total:.2f}₽"
+                for bank, status, count, total in result
+            ) or "🔹 Заявок в работе нет"
+
             if total_users > 0:
                 active_users_percentage = (active_users / total_users) * 100
             else:
@@ -781,20 +1185,154 @@ async def info_about_bot(callback_query: CallbackQuery, state: FSMContext):
                 f"🔹 Новые пользователи за месяц: {users_month}\n"
                 f"🔹 Активные пользователи за неделю: {active_users}\n"
                 f"🔹 Процент активных пользователей: {active_users_percentage:.2f}%\n"
-                f"🔹 Всего зарегистрировано: {total_users}"
+                f"🔹 Всего зарегистрировано: {total_users}\n\n"
+                f"🏦 Заявки на вывод по банкам:\n{bank_statistics}"
             )
 
             inline_kb = InlineKeyboardMarkup(inline_keyboard=[[back_button]])
 
             await callback_query.message.edit_text(statistic_info, reply_markup=inline_kb) # type: ignore
         except SQLAlchemyError as e:
-            logging.error(f"Error: {e}")
+            logger.error(f"Error: {e}")
             await callback_query.message.answer("Произошла ошибка при получении статистики") # type: ignore
 
     await callback_query.answer()
     await state.set_state(AdminMenu.info_about_bot)
 
 
+FRAUD_FLAGS_LIMIT = 10  # Сколько флагов показывать на экране проверки
+FRAUD_REASONS = {
+    "burst": "всплеск регистраций",
+    "phone_cluster": "похожие номера рефералов",
+    "fresh_chain": "цепочка новых аккаунтов",
+    "ancestor_phone": "номер как у реферера выше по цепочке",
+    "early_leave": "рефералы выходят из группы",
+}
+
+
+@router.callback_query(F.data == "fraud_flags")
+async def fraud_flags_list(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Открытые флаги подозрительных рефереров, начиная с самого высокого счета.
+    """
+    async with get_async_session() as session:
+        try:
+            result = await session.execute(
+                select(FraudFlag.id, FraudFlag.user_id, FraudFlag.score, FraudFlag.reasons, FraudFlag.updated_at, User.first_name_tg)
+                .join(User, User.user_id == FraudFlag.user_id)
+                .where(FraudFlag.status == 'new')
+                .order_by(FraudFlag.score.desc())
+                .limit(FRAUD_FLAGS_LIMIT)
+            )
+            flags = result.all()
+        except SQLAlchemyError as e:
+            logger.error(f"Error loading fraud flags: {e}")
+            await callback_query.answer("Произошла ошибка при загрузке флагов", show_alert=True)
+            return
+
+    if flags:
+        text = "🚩 *Подозрительные рефереры*\n\n" + "\n\n".join(
+            f"👤 {escape_markdown(flag.first_name_tg)} (`{flag.user_id}`), счет {flag.score:g}\n"
+            f"Причины: {', '.join(FRAUD_REASONS.get(reason, reason) for reason in flag.reasons.split(', '))}\n"
+            f"Обновлено: {format_moscow_time(flag.updated_at)}"
+            for flag in flags
+        )
+    else:
+        text = "🚩 *Подозрительные рефереры*\n\nОткрытых флагов нет."
+
+    rows = [[InlineKeyboardButton(text=f"✅ Проверено: {flag.user_id}", callback_data=f"fraud_review_{flag.id}")] for flag in flags]
+    rows.append([back_button])
+    await callback_query.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=rows), parse_mode="Markdown")  # type: ignore
+    await callback_query.answer()
+    await state.set_state(AdminMenu.fraud_flags)
+
+
+@router.callback_query(F.data.startswith("fraud_review_"))
+async def fraud_flag_review(callback_query: CallbackQuery, state: FSMContext):
+    """
+    Закрывает флаг после проверки администратором и обновляет список.
+    """
+    flag_id = int(callback_query.data.split("_")[-1])  # type: ignore
+    async with get_async_session() as session:
+        try:
+            await session.execute(
+                update(FraudFlag)
+                .where(FraudFlag.id == flag_id, FraudFlag.status == 'new')
+                .values(status='reviewed', reviewed_by=callback_query.from_user.id, updated_at=func.now())
+            )
+            await session.commit()
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Error reviewing fraud flag {flag_id}: {e}")
+            await callback_query.answer("Произошла ошибка, попробуйте позже", show_alert=True)
+            return
+
+    logger.info(f"Fraud flag {flag_id} reviewed by {callback_query.from_user.id}")
+    await fraud_flags_list(callback_query, state)
+
+
+ROLE_COMMAND_USAGE = "Используйте: `/{command} <user_id> <роль>`\nРоли: " + ", ".join(f"`{role}` ({title})" for role, title in ROLE_TITLES.items())
+
+
+def parse_role_command(message: Message) -> tuple[int, str] | None:
+    args = (message.text or "").split()
+    if len(args) != 3 or not args[1].isdigit() or args[2] not in ROLE_TITLES:
+        return None
+    return int(args[1]), args[2]
+
+
+def format_roles(user_id: int) -> str:
+    return ", ".join(ROLE_TITLES.get(role, role) for role in sorted(roles_of(user_id))) or "нет"
+
+
+@router.message(Command("grant_role"))
+async def grant_role_command(message: Message):
+    """
+    Выдает пользователю роль сотрудника: /grant_role <user_id> <роль>.
+    """
+    parsed = parse_role_command(message)
+    if parsed is None:
+        await message.answer(ROLE_COMMAND_USAGE.format(command="grant_role"), parse_mode="Markdown")
+        return
+
+    user_id, role = parsed
+    try:
+        granted = await grant_role(user_id, role, message.from_user.id)  # type: ignore
+    except SQLAlchemyError as e:
+        logger.error(f"Error granting role {role} to {user_id}: {e}")
+        await message.answer("❌ Произошла ошибка при выдаче роли. Попробуйте позже.")
+        return
+
+    logger.info(f"Role {role} granted to {user_id} by {message.from_user.id}")  # type: ignore
+    status = "✅ Роль выдана." if granted else "ℹ️ Эта роль у пользователя уже есть."
+    await message.answer(f"{status}\nРоли пользователя `{user_id}`: {format_roles(user_id)}", parse_mode="Markdown")
+
+
+@router.message(Command("revoke_role"))
+async def revoke_role_command(message: Message):
+    """
+    Отзывает у пользователя роль сотрудника: /revoke_role <user_id> <роль>.
+    """
+    parsed = parse_role_command(message)
+    if parsed is None:
+        await message.answer(ROLE_COMMAND_USAGE.format(command="revoke_role"), parse_mode="Markdown")
+        return
+
+    user_id, role = parsed
+    try:
+        revoked = await revoke_role(user_id, role)
+    except SQLAlchemyError as e:
+        logger.error(f"Error revoking role {role} from {user_id}: {e}")
+        await message.answer("❌ Произошла ошибка при отзыве роли. Попробуйте позже.")
+        return
+
+    logger.info(f"Role {role} revoked from {user_id} by {message.from_user.id}")  # type: ignore
+    status = "✅ Роль отозвана." if revoked else "ℹ️ Этой роли у пользователя не было."
+    if user_id in BOOTSTRAP_ADMINS:
+        status += "\nАдминистратор из переменных окружения остается администратором."
+    await message.answer(f"{status}\nРоли пользователя `{user_id}`: {format_roles(user_id)}", parse_mode="Markdown")
+
+
 @router.callback_query(F.data == "back_in_admin_menu", StateFilter("*"))
 async def back_in_admin_menu(callback_query: CallbackQuery, state: FSMContext):
     """
@@ -809,27 +1347,24 @@ async def back_in_admin_menu(callback_query: CallbackQuery, state: FSMContext):
     
     current_state = await state.get_state()
 
-    if current_state in [AdminMenu.delete_user, AdminMenu.change_balance, AdminMenu.blacklist_user, AdminMenu.unblock_user, AdminMenu.broadcast, AdminMenu.funds_transfer, AdminMenu.change_vacancies, AdminMenu.info_about_user, AdminMenu.info_about_bot]:
+    if current_state in [AdminMenu.transaction, AdminMenu.delete_user, AdminMenu.change_balance, AdminMenu.blacklist_user, AdminMenu.unblock_user, AdminMenu.broadcast, AdminMenu.funds_transfer, AdminMenu.funds_transfer_confirm, AdminMenu.change_vacancies, AdminMenu.info_about_user, AdminMenu.info_about_bot, AdminMenu.fraud_flags]:
         #await callback_query.bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id) # type: ignore
         await callback_query.message.edit_text( # type: ignore
             text=last_message,
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="💸 Перевод средств", callback_data="funds_transfer")],
-                    [InlineKeyboardButton(text="💰 Изменить баланс", callback_data="change_balance")],
-                    [InlineKeyboardButton(text="🚫 Заблокировать пользователя", callback_data="blacklist_user")],
-                    [InlineKeyboardButton(text="✅ Разблокировать пользователя", callback_data="unblock_user")],
-                    [InlineKeyboardButton(text="🗑 Удалить пользователя", callback_data="delete_user")],
-                    [InlineKeyboardButton(text="📝 Вакансии", callback_data="change_vacancies")],
-                    [InlineKeyboardButton(text="🧾 Транзакции", callback_data="transactions")], 
-                    [InlineKeyboardButton(text="📨 Рассылка всем пользователям", callback_data="broadcast")],
-                    [InlineKeyboardButton(text="👤 Информация о пользователе", callback_data="info_about_user")],
-                    [InlineKeyboardButton(text="📊 Статистика бота", callback_data="info_about_bot")]
-                ]
-            ),
+            reply_markup=ADMIN_MENU,
             parse_mode="Markdown"
         )
         await state.set_state(AdminMenu.menu)
     else:
         await callback_query.message.answer("Что-то пошло не так. Пожалуйста, попробуйте позже.") # type: ignore
         await state.clear()
+
+
+@router.callback_query()
+async def access_denied(callback_query: CallbackQuery):
+    """
+    Нажатие сотрудника на кнопку, для которой у него нет роли: ни один обработчик не подошел,
+    отвечаем на callback, чтобы у пользователя пропали "часики".
+    """
+    logger.info(f"Staff member {callback_query.from_user.id} has no role for {callback_query.data}")
+    await callback_query.answer("Недостаточно прав", show_alert=True)
@@ -1,77 +1,91 @@
 import logging
 import re
-import pytz
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest 
 from database import Vacancy, get_async_session
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select
+from views import active_vacancies_page
+from utils import format_moscow_time
+from keyboards import paginated_keyboard
+import navigation
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
 class NavigationVacancies(StatesGroup):
     vacancies = State()
 
+REFERRAL_RATE_TAG = re.compile(r"#реф(\d+(?:[.,]\d+)?)%?")
+
+
 @router.message(F.chat.type.in_(['group', 'supergroup']) & F.text.contains("#вакансия"))
 async def track_vacancies(message: Message):
     """
     Функция для отслеживания сообщений с хэштегом #вакансия из чатов.
     """
     vacancy_text = re.sub(r"#вакансия", "", message.text).strip()  # type: ignore Убираем лишние пробелы в начале и конце текста
+
+    # Необязательный тег вида #реф15 — свой процент реферала для смен по этой вакансии
+    referral_percentage = None
+    rate_match = REFERRAL_RATE_TAG.search(vacancy_text)
+    if rate_match:
+        referral_percentage = float(rate_match.group(1).replace(",", ".")) / 100
+        vacancy_text = REFERRAL_RATE_TAG.sub("", vacancy_text).strip()
+
     async with get_async_session() as session:
         try:
             # Сохраняем сообщение с вакансией в базе данных
-            await add_vacancy(session, message.chat.id, message.message_id, vacancy_text)
-            logging.info(f"Вакансия добавлена из чата {message.chat.id}: {vacancy_text}")
+            await add_vacancy(session, message.chat.id, message.message_id, vacancy_text, referral_percentage)
+            logger.info(f"Вакансия добавлена из чата {message.chat.id}: {vacancy_text}")
         except SQLAlchemyError as e:
-            logging.error(f"Ошибка при добавлении вакансии: {str(e)}")
+            logger.error(f"Ошибка при добавлении вакансии: {str(e)}")
 
 
-async def add_vacancy(db, chat_id, message_id, text):
+async def add_vacancy(db, chat_id, message_id, text, referral_percentage=None):
     new_vacancy = Vacancy(
         chat_id=chat_id,
         message_id=message_id,
-        text=text
+        text=text,
+        referral_percentage=referral_percentage
     )
     db.add(new_vacancy)
     await db.commit()
 
+ITEMS_PER_PAGE = 3  # Количество вакансий на странице
+
+
+async def render_vacancies(db, page: int):
+    """
+    Текст и клавиатура страницы списка вакансий.
+    """
+    vacancies_page, total_vacancies = await active_vacancies_page(db, page, ITEMS_PER_PAGE)
+
+    # Формирование текста вакансий
+    vacancies_text = f"📋 *Доступные вакансии:\nКоличество вакансий: {total_vacancies}*\n\n"
+    vacancies_info = "\n\n──────────\n\n".join(
+        [f"🔹 *ID:* {vacancy.id}\n"
+         f"💼 *Описание:*\n\n {vacancy.text.strip()}\n\n"
+         f"📅 *Дата добавления:* {format_moscow_time(vacancy.posted_at)}\n"
+         for vacancy in vacancies_page]) or "🔹 Вакансий пока нет."
+
+    # Кнопки "Вперед" и "Назад"
+    inline_kb = paginated_keyboard("vacancy_page_", page, page * ITEMS_PER_PAGE < total_vacancies)
+    return vacancies_text + vacancies_info, inline_kb
+
+
 @router.message(F.text == "👷🏻‍♂️ Актуальные вакансии")
 async def show_vacancies(message: Message, state: FSMContext, page: int = 1):
 
-    items_per_page = 3  # Количество вакансий на странице
-
     async with get_async_session() as db:
         try:
-            result = await db.execute(select(Vacancy).filter_by(status='active').order_by(Vacancy.posted_at))
-            vacancies = result.scalars().all()
-
-            total_vacancies = len(vacancies)
-            start = (page - 1) * items_per_page
-            end = start + items_per_page
-            vacancies_page = vacancies[start:end]
-
-            # Формирование текста вакансий
-            vacancies_text = f"📋 *Доступные вакансии:\nКоличество вакансий: {total_vacancies}*\n\n"
-            vacancies_info = "\n\n──────────\n\n".join(
-                [f"🔹 *ID:* {vacancy.id}\n"
-                 f"💼 *Описание:*\n\n {vacancy.text.strip()}\n\n"
-                 f"📅 *Дата добавления:* {vacancy.posted_at.astimezone(pytz.timezone('Europe/Moscow')).strftime('%d.%m.%Y %H:%M')}\n"
-                 for vacancy in vacancies_page]) or "🔹 Вакансий пока нет."
-
-            # Кнопки "Вперед" и "Назад"
-            keyboard_buttons = []
-            if page > 1:
-                keyboard_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"vacancy_page_{page - 1}"))
-            if end < total_vacancies:
-                keyboard_buttons.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"vacancy_page_{page + 1}"))
-
-            inline_kb = InlineKeyboardMarkup(inline_keyboard=[keyboard_buttons], resize_keyboard=True)
+            text, inline_kb = await render_vacancies(db, page)
 
+            # Предыдущий список вакансий удаляем, новый отправляем вниз чата
             data = await state.get_data()
             last_message_id = data.get('last_message_id')
             if last_message_id:
@@ -80,14 +94,11 @@ async def show_vacancies(message: Message, state: FSMContext, page: int = 1):
                 except TelegramBadRequest:
                     pass
 
-            new_message = await message.answer(vacancies_text + vacancies_info, parse_mode="Markdown", reply_markup=inline_kb)
-            await state.update_data(last_message_id=new_message.message_id)
-
-            # Обновляем состояние страницы
-            await state.update_data(page=page)
+            new_message = await message.answer(text, parse_mode="Markdown", reply_markup=inline_kb)
+            await state.update_data(last_message_id=new_message.message_id, page=page)
 
         except SQLAlchemyError as e:
-            logging.error(f"Ошибка получения списка вакансий: {e}")
+            logger.error(f"Ошибка получения списка вакансий: {e}")
             await message.answer("🚫 Произошла ошибка при получении списка вакансий.")  # type: ignore
 
 
@@ -95,20 +106,21 @@ async def show_vacancies(message: Message, state: FSMContext, page: int = 1):
 @router.callback_query(F.data.startswith("vacancy_page_"))
 async def change_page(callback_query: CallbackQuery, state: FSMContext):
 
-    bot = callback_query.bot
-
-    # Удаляем предыдущее сообщение с вакансией
-    data = await state.get_data()
-    last_message_id = data.get('last_message_id')
-    if last_message_id:
-        await bot.delete_message(callback_query.message.chat.id, last_message_id) # type: ignore
-
     # Извлекаем номер страницы из callback_data
     page = int(callback_query.data.split("_")[-1]) # type: ignore
-    
-    # Получаем текущее сообщение, чтобы обновить его
-    await show_vacancies(callback_query.message, state, page)
+
+    async with get_async_session() as db:
+        try:
+            text, inline_kb = await render_vacancies(db, page)
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка получения списка вакансий: {e}")
+            await callback_query.answer("🚫 Произошла ошибка при получении списка вакансий.", show_alert=True)
+            return
+
+    # Листаем в том же сообщении
+    shown = await navigation.show(callback_query, text, reply_markup=inline_kb, parse_mode="Markdown", screen="vacancies")
+    if shown:
+        await state.update_data(last_message_id=shown.message_id, page=page)
 
     # Подтверждаем callback, чтобы не висел "часик" на кнопке
     await callback_query.answer()
-
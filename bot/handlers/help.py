@@ -4,6 +4,8 @@ from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, FSInputFile
 from aiogram.filters import Command
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
 
@@ -43,7 +45,7 @@ async def user_agreement_callback_handler(callback_query: CallbackQuery):
     
     if not os.path.exists(file_path):
         await callback_query.message.answer("Файл с пользовательским соглашением временно недоступен.") # type: ignore
-        logging.error(f"Файл {file_path} не найден.")
+        logger.error(f"Файл {file_path} не найден.")
         return
     
     # Создание объекта InputFile
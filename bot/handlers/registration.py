@@ -9,6 +9,9 @@ from sqlalchemy.future import select
 from sqlalchemy.exc import SQLAlchemyError
 from utils import prompt_for_registration, menu_handler
 from referral_system import ReferralSystem
+import fraud
+
+logger = logging.getLogger(__name__)
 
 #TODO доделать проверку на фио при регистрации
 #TODO чуть изменить начальное приветствие, сделать более красивым
@@ -33,9 +36,9 @@ async def start_command(message: Message, state: FSMContext):
     if len(parts) > 1 and parts[1].isdigit():  # type: ignore
         referrer_id = int(parts[1])  # type: ignore # Извлекаем ID реферера из ссылки
         await state.update_data(referrer_id=referrer_id)
-        logging.info(f"Referrer ID {referrer_id} saved in state for user {user_id}")
+        logger.info(f"Referrer ID {referrer_id} saved in state for user {user_id}")
     else:
-        logging.info(f"No referrer ID found for user {user_id}")
+        logger.info(f"No referrer ID found for user {user_id}")
         referrer_id = None
 
     # Проверка членства в группе
@@ -50,7 +53,7 @@ async def start_command(message: Message, state: FSMContext):
             # Если пользователь переходит по реферальной ссылке
             data = await state.get_data()
             referrer_id = data.get("referrer_id")
-            logging.info(f"User {user_id} has referrer ID {referrer_id}")
+            logger.info(f"User {user_id} has referrer ID {referrer_id}")
 
             # Запрос ввода ФИО для нового пользователя
             await message.answer(
@@ -108,7 +111,7 @@ async def contact_handler(message: Message, state: FSMContext):
     full_name = user_data.get("full_name")
     referrer_id = user_data.get("referrer_id")
 
-    logging.info(f"Processing user: user_id={user_id}, referrer_id={referrer_id}")
+    logger.info(f"Processing user: user_id={user_id}, referrer_id={referrer_id}")
 
     if not full_name:
         await message.answer("❗ Произошла ошибка. Попробуйте зарегистрироваться снова.")
@@ -121,38 +124,33 @@ async def contact_handler(message: Message, state: FSMContext):
         await message.answer("❗ Введите корректное полное имя в формате: Фамилия Имя Отчество.")
         return
 
-    # Работа с базой данных
-    async with get_async_session() as db:
-        result = await db.execute(select(User).filter(User.user_id == user_id))
-        db_user = result.scalar_one_or_none()
+    # Пользователь и связь с реферером создаются в одной транзакции
+    try:
+        status, referral_message = await ReferralSystem.register_user(
+            user_id,
+            referrer_id,
+            first_name_tg=user_name_tg,
+            last_name_tg=last_user_name_tg,
+            last_name=last_name,
+            first_name=first_name,
+            patronymic=patronymic,
+            phone_number=phone_number
+        )
+    except SQLAlchemyError as e:
+        await message.answer("❗ Произошла ошибка при регистрации, попробуйте позже.")
+        logger.error(f"Error saving user to database: {e}")
+        return
+
+    if status == "created":
+        fraud.observe_registration(user_id, referrer_id, phone_number)
+        if referral_message:
+            await message.answer(referral_message)
+        await menu_handler(message, "🎉 Спасибо, регистрация прошла успешно!")
+        logger.info(f"User {user_id} with referrer {referrer_id} has been added to the database.")
+    elif status == "exists":
+        await menu_handler(message, "👋 Добро пожаловать обратно!")
+    else:
+        await message.answer("❗ Этот номер телефона уже привязан к другому аккаунту. Обратитесь в поддержку *@refbot_admin*.", parse_mode="Markdown")
 
-        if not db_user:
-            # Создаем нового пользователя
-            new_user = User(
-                user_id=user_id,
-                first_name_tg=user_name_tg,
-                last_name_tg=last_user_name_tg,
-                last_name=last_name,
-                first_name=first_name,
-                patronymic=patronymic,
-                phone_number=phone_number
-            )
-            db.add(new_user)
-            try:
-                await db.commit()
-                # Отправляем сообщение пользователю
-                if referrer_id:
-                    success, msg = await ReferralSystem.process_referral(user_id, referrer_id)
-                    logging.info(f"Referral processed: {success}, message: {msg}")
-                    await message.answer(msg)
-                    
-                await menu_handler(message, "🎉 Спасибо, регистрация прошла успешно!")
-
-                logging.info(f"User {last_name, first_name, patronymic} - {user_name_tg} with ID {user_id} with referrer {referrer_id} has been added to the database.")
-            except SQLAlchemyError as e:
-                await db.rollback()
-                await message.answer("❗ Произошла ошибка при регистрации, попробуйте позже.")
-                logging.error(f"Error saving user to database: {e}")
-        
     await state.clear()
 
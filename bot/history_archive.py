@@ -0,0 +1,135 @@
+"""
+Обслуживание секционированных receipt_history и withdrawal_history (миграция 9).
+
+Задача планировщика заранее создает секции на ближайшие месяцы и переносит секции старше
+HISTORY_RETENTION_MONTHS в схему archive: итоги по пользователям добавляются в
+user_history_totals, секция отсоединяется от основной таблицы и остается доступной
+как archive.<имя секции>. Каждая секция переносится в своей транзакции.
+"""
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import text
+from config import HISTORY_RETENTION_MONTHS
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+MONTHS_AHEAD = 3  # На сколько месяцев вперед держать готовые секции
+
+# Итоги по пользователям, которые переносятся в user_history_totals вместе с секцией
+TOTALS_SQL = {
+    "receipt_history": """
+        INSERT INTO user_history_totals AS totals (user_id, receipts_count, receipts_amount)
+        SELECT p.user_id, count(*), sum(p.amount)
+        FROM {partition} p JOIN users u ON u.user_id = p.user_id
+        GROUP BY p.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            receipts_count = totals.receipts_count + EXCLUDED.receipts_count,
+            receipts_amount = totals.receipts_amount + EXCLUDED.receipts_amount,
+            updated_at = now()
+    """,
+    "withdrawal_history": """
+        INSERT INTO user_history_totals AS totals (user_id, withdrawals_count, withdrawals_paid_amount)
+        SELECT p.user_id, count(*), coalesce(sum(p.amount) FILTER (WHERE p.status = 'paid'), 0)
+        FROM {partition} p JOIN users u ON u.user_id = p.user_id
+        GROUP BY p.user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            withdrawals_count = totals.withdrawals_count + EXCLUDED.withdrawals_count,
+            withdrawals_paid_amount = totals.withdrawals_paid_amount + EXCLUDED.withdrawals_paid_amount,
+            updated_at = now()
+    """,
+}
+
+# Секции с заявками в работе не архивируются, пока заявки не будут выплачены или отменены
+OPEN_ROWS_SQL = {
+    "withdrawal_history": "SELECT EXISTS (SELECT 1 FROM {partition} WHERE status IN ('pending', 'approved'))",
+}
+
+
+def add_months(year: int, month: int, months: int) -> tuple[int, int]:
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def partition_name(table: str, year: int, month: int) -> str:
+    return f"{table}_y{year:04d}m{month:02d}"
+
+
+def partition_ddl(table: str, year: int, month: int) -> str:
+    next_year, next_month = add_months(year, month, 1)
+    return (
+        f"CREATE TABLE {partition_name(table, year, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{year:04d}-{month:02d}-01 00:00:00+00') TO ('{next_year:04d}-{next_month:02d}-01 00:00:00+00')"
+    )
+
+
+async def ensure_partitions(conn, table: str, now: datetime):
+    """
+    Создает секции текущего и следующих MONTHS_AHEAD месяцев, если их еще нет.
+    """
+    for offset in range(MONTHS_AHEAD + 1):
+        year, month = add_months(now.year, now.month, offset)
+        name = partition_name(table, year, month)
+
+        result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+        if result.scalar():
+            continue
+
+        await conn.execute(text(partition_ddl(table, year, month)))
+        logger.info(f"Created partition {name}")
+
+
+async def expired_partitions(conn, table: str, now: datetime) -> list[str]:
+    """
+    Секции таблицы за месяцы старше HISTORY_RETENTION_MONTHS (по имени секции).
+    """
+    cutoff = partition_name(table, *add_months(now.year, now.month, -HISTORY_RETENTION_MONTHS))
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass) AND c.relname ~ :pattern "
+        "ORDER BY c.relname"
+    ), {"table": table, "pattern": f"^{table}_y[0-9]{{4}}m[0-9]{{2}}$"})
+    return [name for (name,) in result if name < cutoff]
+
+
+async def archive_partition(conn, table: str, partition: str) -> bool:
+    if table in OPEN_ROWS_SQL:
+        result = await conn.execute(text(OPEN_ROWS_SQL[table].format(partition=partition)))
+        if result.scalar():
+            logger.warning(f"Partition {partition} has open rows, archiving postponed")
+            return False
+
+    await conn.execute(text(TOTALS_SQL[table].format(partition=partition)))
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+
+    # Архив не мешает удалению пользователей: внешние ключи архивной таблицы снимаются
+    result = await conn.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:partition AS regclass) AND contype = 'f'"
+    ), {"partition": partition})
+    for (constraint,) in result.all():
+        await conn.execute(text(f'ALTER TABLE {partition} DROP CONSTRAINT "{constraint}"'))
+
+    await conn.execute(text(f"ALTER TABLE {partition} SET SCHEMA archive"))
+    return True
+
+
+async def maintain_history():
+    """
+    Задача планировщика: будущие секции для обеих таблиц истории и перенос старых секций в архив.
+    """
+    now = datetime.now(timezone.utc)
+    for table in TOTALS_SQL:
+        async with engine.begin() as conn:
+            await ensure_partitions(conn, table, now)
+
+        if not HISTORY_RETENTION_MONTHS:
+            continue
+
+        async with engine.connect() as conn:
+            partitions = await expired_partitions(conn, table, now)
+
+        for partition in partitions:
+            async with engine.begin() as conn:
+                if await archive_partition(conn, table, partition):
+                    logger.info(f"Archived partition {partition}")
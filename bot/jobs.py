@@ -0,0 +1,151 @@
+"""
+Периодические задачи обслуживания, которые выполняет планировщик (scheduler.py).
+
+Задачи с lock_id выполняет один процесс на все копии бота; сброс активности выполняется
+в каждом процессе, потому что буфер активности у каждого процесса свой.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import update, delete, func, select, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from config import VACANCY_TTL_DAYS, FSM_STATE_TTL_DAYS, FSM_STORAGE, ACTIVITY_FLUSH_INTERVAL, STATS_ROLLUP_INTERVAL
+from database import get_async_session, User, Vacancy, FsmState, DailyStats, WithdrawalHistory, ReceiptHistory
+from history_archive import maintain_history
+from scheduler import Scheduler
+from utils import MOSCOW_TZ
+
+logger = logging.getLogger(__name__)
+
+# Ключи advisory-блокировок задач (рядом с ключом блокировки миграций 73020001)
+VACANCY_EXPIRY_LOCK_ID = 73020101
+STATS_ROLLUP_LOCK_ID = 73020102
+FSM_CLEANUP_LOCK_ID = 73020103
+HISTORY_MAINTENANCE_LOCK_ID = 73020104
+
+MAINTENANCE_INTERVAL = 3600  # Истечение вакансий и очистка FSM, секунд
+HISTORY_MAINTENANCE_INTERVAL = 86400  # Секции и архив истории, секунд
+
+# Пользователи, от которых приходили сообщения с последнего сброса активности
+_active_user_ids: set[int] = set()
+
+
+def record_activity(user_id: int):
+    """
+    Отмечает активность пользователя; в базу она попадет при следующем сбросе.
+    """
+    _active_user_ids.add(user_id)
+
+
+async def flush_activity():
+    """
+    Записывает накопленную активность одним UPDATE вместо запроса на каждое сообщение.
+    """
+    global _active_user_ids
+    if not _active_user_ids:
+        return
+
+    user_ids, _active_user_ids = _active_user_ids, set()
+    try:
+        async with get_async_session() as session:
+            await session.execute(
+                update(User)
+                .where(User.user_id.in_(bindparam("user_ids", expanding=True)))
+                .values(last_activity=func.now()),
+                {"user_ids": list(user_ids)}
+            )
+            await session.commit()
+    except BaseException:
+        # Не теряем активность и при отмене задачи на остановке: ее запишет финальный сброс
+        _active_user_ids |= user_ids
+        raise
+    logger.info(f"Flushed activity of {len(user_ids)} users")
+
+
+async def expire_vacancies():
+    """
+    Снимает с публикации вакансии старше VACANCY_TTL_DAYS дней.
+    """
+    async with get_async_session() as session:
+        result = await session.execute(
+            update(Vacancy)
+            .where(Vacancy.status == 'active', Vacancy.posted_at < func.now() - timedelta(days=VACANCY_TTL_DAYS))
+            .values(status='inactive')
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.info(f"Expired {result.rowcount} vacancies")
+
+
+async def rollup_day(session, day: date):
+    """
+    Пересчитывает статистику за день. Активность пересчитывается только в большую сторону:
+    last_activity перезаписывается, поэтому позже активных за прошлый день может найтись меньше.
+    """
+    start = MOSCOW_TZ.localize(datetime.combine(day, time.min))
+    end = start + timedelta(days=1)
+
+    values = {
+        "users_total": select(func.count(User.id)).where(User.created_at < end).scalar_subquery(),
+        "new_users": select(func.count(User.id)).where(User.created_at >= start, User.created_at < end).scalar_subquery(),
+        "active_users": select(func.count(User.id)).where(User.last_activity >= start, User.last_activity < end).scalar_subquery(),
+        "withdrawals_count": select(func.count(WithdrawalHistory.id)).where(
+            WithdrawalHistory.withdrawal_date >= start, WithdrawalHistory.withdrawal_date < end
+        ).scalar_subquery(),
+        "withdrawals_amount": select(func.coalesce(func.sum(WithdrawalHistory.amount), 0.0)).where(
+            WithdrawalHistory.withdrawal_date >= start, WithdrawalHistory.withdrawal_date < end
+        ).scalar_subquery(),
+        "receipts_amount": select(func.coalesce(func.sum(ReceiptHistory.amount), 0.0)).where(
+            ReceiptHistory.date >= start, ReceiptHistory.date < end
+        ).scalar_subquery(),
+    }
+    statement = pg_insert(DailyStats).values(day=day, **values)
+    excluded = statement.excluded
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={
+            "users_total": excluded.users_total,
+            "new_users": excluded.new_users,
+            "active_users": func.greatest(DailyStats.active_users, excluded.active_users),
+            "withdrawals_count": excluded.withdrawals_count,
+            "withdrawals_amount": excluded.withdrawals_amount,
+            "receipts_amount": excluded.receipts_amount,
+            "updated_at": func.now(),
+        }
+    ))
+
+
+async def rollup_stats():
+    """
+    Обновляет статистику за сегодня и вчера (чтобы дописать последние часы прошедшего дня).
+    """
+    today = datetime.now(MOSCOW_TZ).date()
+    async with get_async_session() as session:
+        for day in (today - timedelta(days=1), today):
+            await rollup_day(session, day)
+        await session.commit()
+
+
+async def cleanup_fsm_states():
+    """
+    Удаляет состояния FSM, которые не менялись FSM_STATE_TTL_DAYS дней.
+    """
+    async with get_async_session() as session:
+        result = await session.execute(
+            delete(FsmState).where(FsmState.updated_at < func.now() - timedelta(days=FSM_STATE_TTL_DAYS))
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.info(f"Removed {result.rowcount} stale FSM states")
+
+
+def build_scheduler() -> Scheduler:
+    scheduler = Scheduler()
+    scheduler.add("flush_activity", ACTIVITY_FLUSH_INTERVAL, flush_activity, run_on_stop=True)
+    if VACANCY_TTL_DAYS:
+        scheduler.add("expire_vacancies", MAINTENANCE_INTERVAL, expire_vacancies, lock_id=VACANCY_EXPIRY_LOCK_ID)
+    if STATS_ROLLUP_INTERVAL:
+        scheduler.add("rollup_stats", STATS_ROLLUP_INTERVAL, rollup_stats, lock_id=STATS_ROLLUP_LOCK_ID)
+    scheduler.add("maintain_history", HISTORY_MAINTENANCE_INTERVAL, maintain_history, lock_id=HISTORY_MAINTENANCE_LOCK_ID, run_on_start=True)
+    if FSM_STORAGE == "postgres" and FSM_STATE_TTL_DAYS:
+        scheduler.add("cleanup_fsm_states", MAINTENANCE_INTERVAL, cleanup_fsm_states, lock_id=FSM_CLEANUP_LOCK_ID)
+    return scheduler
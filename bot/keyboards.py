@@ -0,0 +1,91 @@
+"""
+Клавиатуры бота.
+
+Статические клавиатуры создаются один раз при импорте модуля, динамические (пагинация)
+собираются функциями с lru_cache. Объекты клавиатур общие для всех обработчиков,
+поэтому их нельзя изменять после создания.
+"""
+from functools import lru_cache
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+
+# Главное меню пользователя
+MAIN_MENU = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="👷🏻‍♂️ Актуальные вакансии"), KeyboardButton(text="🫂 Рефералы")],  # Первый ряд - вакансии и рефералы
+        [KeyboardButton(text="🆘 Помощь")],  # Второй ряд - помощь
+        [KeyboardButton(text="👤 Профиль")]  # Третий ряд - профиль
+    ],
+    resize_keyboard=True
+)
+
+CONTACT_REQUEST = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="📞 Отправить номер телефона", request_contact=True)]],
+    resize_keyboard=True
+)
+
+# Профиль и вывод средств
+BACK_IN_PROFILE = InlineKeyboardButton(text="👤 Вернуться в профиль", callback_data="back_in_profile")
+BACK_STEP_IN_PROFILE = InlineKeyboardButton(text="⬅️ Назад", callback_data="back_in_profile")
+BACK_TO_HISTORY = InlineKeyboardButton(text="💼 К выбору истории", callback_data="back_in_profile")
+
+PROFILE_ACTIONS = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text="📊 История", callback_data="history"),
+    InlineKeyboardButton(text="💸 Вывод средств", callback_data="money_withdrawal")
+]])
+
+HISTORY_SELECTION = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💼 История выводов", callback_data="history_of_withdrawal"),
+     InlineKeyboardButton(text="💰 История поступлений", callback_data="history_of_receipts")],
+    [BACK_IN_PROFILE]
+])
+
+BANK_SELECTION = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Сбербанк", callback_data="bank_sber"),
+     InlineKeyboardButton(text="Тинькофф", callback_data="bank_tinkoff")],
+    [InlineKeyboardButton(text="Альфа-банк", callback_data="bank_alfa"),
+     InlineKeyboardButton(text="ВТБ", callback_data="bank_vtb")],
+    [InlineKeyboardButton(text="Газпромбанк", callback_data="bank_gasprom"),
+     InlineKeyboardButton(text="Райффайзенбанк", callback_data="bank_riff")],
+    [BACK_IN_PROFILE]
+])
+
+WITHDRAWAL_METHOD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🏎 Моментальный вывод", callback_data="instant_withdrawal"),
+     InlineKeyboardButton(text="🕓 Вывод в течении 48 часов", callback_data="slow_withdrawal")],
+    [BACK_STEP_IN_PROFILE]
+])
+
+RETURN_TO_PROFILE = InlineKeyboardMarkup(inline_keyboard=[[BACK_IN_PROFILE]])
+
+# Админ-панель
+ADMIN_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💸 Перевод средств", callback_data="funds_transfer")],
+    [InlineKeyboardButton(text="💰 Изменить баланс", callback_data="change_balance")],
+    [InlineKeyboardButton(text="🚫 Заблокировать пользователя", callback_data="blacklist_user")],
+    [InlineKeyboardButton(text="✅ Разблокировать пользователя", callback_data="unblock_user")],
+    [InlineKeyboardButton(text="🗑 Удалить пользователя", callback_data="delete_user")],
+    [InlineKeyboardButton(text="📝 Вакансии", callback_data="change_vacancies")],
+    [InlineKeyboardButton(text="🧾 Транзакции", callback_data="transactions")],
+    [InlineKeyboardButton(text="🏦 Выгрузка выплат", callback_data="payout_export")],
+    [InlineKeyboardButton(text="📨 Рассылка всем пользователям", callback_data="broadcast")],
+    [InlineKeyboardButton(text="👤 Информация о пользователе", callback_data="info_about_user")],
+    [InlineKeyboardButton(text="📊 Статистика бота", callback_data="info_about_bot")],
+    [InlineKeyboardButton(text="🚩 Подозрительные рефереры", callback_data="fraud_flags")]
+])
+
+
+@lru_cache(maxsize=1024)
+def paginated_keyboard(prefix: str, page: int, has_next: bool, back_text: str = "", back_callback: str = "") -> InlineKeyboardMarkup:
+    """
+    Кнопки "Назад"/"Вперед" с callback_data вида f"{prefix}{page}" и необязательная кнопка возврата.
+    """
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"{prefix}{page - 1}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton(text="➡️ Вперед", callback_data=f"{prefix}{page + 1}"))
+
+    rows = [buttons]
+    if back_callback:
+        rows.append([InlineKeyboardButton(text=back_text, callback_data=back_callback)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -0,0 +1,172 @@
+"""
+Настройка логирования бота.
+
+- Записи складываются в очередь (QueueHandler), а форматирует и пишет их в stderr отдельный поток
+  (QueueListener): запись в лог не блокирует цикл событий.
+- Формат JSON (LOG_FORMAT=json, по умолчанию) или текст (LOG_FORMAT=text) для локальной отладки.
+- У каждой записи есть request_id — ID обновления Telegram, которое сейчас обрабатывается
+  (RequestIdMiddleware), по нему собираются все записи одного обновления.
+- Для шумных логгеров можно оставить только долю записей ниже WARNING: LOG_SAMPLING="membership=0.01,update_queues=0.1".
+- Номера телефонов и карт (с проверкой Луна) в тексте записей маскируются; примеры — в redact(),
+  проверка: python -m doctest logging_setup.py.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLING
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# 13-19 цифр, возможно через пробелы или дефисы, — кандидат в номера карт. Числа с минусом
+# (ID групп) и части идентификаторов через дефис (ID выгрузки выплат) не подходят
+CARD_PATTERN = re.compile(r"(?<![\d-])\d(?:[ -]?\d){12,18}(?![\d-])")
+# Российский номер: +7/8 и 10 цифр с необязательными разделителями
+PHONE_PATTERN = re.compile(r"(?<!\d)(?:\+7|8|7)[ -]?\(?\d{3}\)?[ -]?\d{3}[ -]?(\d{2})[ -]?(\d{2})(?!\d)")
+
+_listener: logging.handlers.QueueListener | None = None
+_listener_pid = 0
+
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit) * (2 if index % 2 else 1)
+        total += value - 9 if value > 9 else value
+    return total % 10 == 0
+
+
+def mask_card(match: re.Match) -> str:
+    digits = re.sub(r"\D", "", match.group(0))
+    # Номер карты проходит проверку Луна, длинные ID и суммы обычно нет
+    return f"****{digits[-4:]}" if luhn_valid(digits) else match.group(0)
+
+
+def redact(text: str) -> str:
+    """
+    Маскирует номера карт и телефонов.
+
+    >>> redact("Card 4111 1111 1111 1111, phone +7 912 345-67-89")
+    'Card ****1111, phone +7*******89'
+    >>> redact("Payout batch 20261019135806-1a2b3c4d")
+    'Payout batch 20261019135806-1a2b3c4d'
+    >>> redact("Message to chat -1001234567890")
+    'Message to chat -1001234567890'
+    >>> redact("Import 4111111111111112 rows")
+    'Import 4111111111111112 rows'
+    """
+    text = CARD_PATTERN.sub(mask_card, text)
+    return PHONE_PATTERN.sub(lambda match: f"+7*******{match.group(2)}", text)
+
+
+def parse_sampling(value: str) -> dict[str, float]:
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class ContextFilter(logging.Filter):
+    """
+    Добавляет request_id и отбрасывает часть записей шумных логгеров. Выполняется в потоке,
+    который пишет запись, поэтому видит request_id текущего обновления.
+    """
+
+    def __init__(self, sampling: dict[str, float]):
+        super().__init__()
+        self.sampling = sampling
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        if record.levelno >= logging.WARNING or not self.sampling:
+            return True
+        rate = self.sampling.get(record.name)
+        return rate is None or random.random() < rate
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "pid": record.process,
+            "message": redact(record.getMessage()),  # QueueHandler уже добавил в текст трассировку исключения
+        }
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging():
+    """
+    Настраивает корневой логгер. Повторный вызов (в том числе в дочернем процессе) заменяет настройку.
+    """
+    global _listener, _listener_pid
+    stop_logging()
+
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(RedactingFormatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(parse_sampling(LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener_pid = os.getpid()
+    _listener.start()
+
+
+@atexit.register
+def stop_logging():
+    """
+    Дописывает накопившиеся записи и останавливает поток логирования.
+    """
+    global _listener
+    # Поток слушателя есть только в процессе, который его запустил (после fork его нет)
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+class RequestIdMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для dp.update: записи, сделанные при обработке обновления, получают его ID.
+    Регистрируется после очередей пользователей, чтобы выполняться в обработчике очереди.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict
+    ) -> Any:
+        token = request_id.set(str(event.update_id) if isinstance(event, Update) else "-")
+        try:
+            return await handler(event, data)
+        finally:
+            request_id.reset(token)
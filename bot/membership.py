@@ -5,10 +5,9 @@ from typing import Callable, Any, Awaitable
 from aiogram.exceptions import TelegramBadRequest
 from config import GROUP_CHAT_ID
 from handlers.admin_menu import is_user_blocked
-from database import get_async_session, User
-from sqlalchemy import select
-from sqlalchemy.sql import func
-from sqlalchemy.exc import SQLAlchemyError
+from jobs import record_activity
+
+logger = logging.getLogger(__name__)
 
 class CheckUserMiddleware(BaseMiddleware):
     async def __call__(
@@ -22,18 +21,10 @@ class CheckUserMiddleware(BaseMiddleware):
         if isinstance(event, Message):
             message_text = event.text or ""
 
-            async with get_async_session() as session:
-                try:
-                    result = await session.execute(select(User).where(User.user_id == user_id))
-                    user = result.scalar_one_or_none()
-
-                    if user:
-                        user.last_activity = func.now()
-                        await session.commit()
-                except SQLAlchemyError as e:
-                    logging.error(f"Error updating user last_activity: {e}")
+            # last_activity записывается пачкой фоновой задачей flush_activity
+            record_activity(user_id) # type: ignore
 
-                # Если это команда /start, проверяем на реферальный ID и сохраняем его в FSM
+            # Если это команда /start, проверяем на реферальный ID и сохраняем его в FSM
             if message_text.startswith("/start"):
                 parts = message_text.split()
                 if len(parts) > 1 and parts[1].isdigit():
@@ -41,7 +32,7 @@ class CheckUserMiddleware(BaseMiddleware):
                     # Сохраняем реферальный ID в состояние FSM перед проверками
                     state = data.get("state")
                     await state.update_data(referrer_id=referrer_id) # type: ignore
-                    logging.info(f"Referrer ID {referrer_id} saved in middleware for user {user_id}")
+                    logger.info(f"Referrer ID {referrer_id} saved in middleware for user {user_id}")
 
 
         if await is_user_blocked(user_id): # type: ignore
@@ -81,6 +72,6 @@ async def check_membership(bot: Bot, message: Message) -> bool:
             )
             return False
     except TelegramBadRequest as e:
-        logging.error(f"Error checking user status in chat: {e}")
+        logger.error(f"Error checking user status in chat: {e}")
         await message.answer("❌ Произошла ошибка при проверке вашего статуса в чате. Пожалуйста, попробуйте позже.")
         return False
@@ -0,0 +1,206 @@
+"""
+Метрики обработчиков в формате Prometheus.
+
+Для каждого обработчика считаются время выполнения, число SQL-запросов
+(через события движка SQLAlchemy) и число вызовов Telegram API.
+Метрики отдаются локальным HTTP-эндпоинтом /metrics.
+"""
+import bisect
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}  # labels -> [счетчики по корзинам, сумма, количество]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        if key not in self.values:
+            self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        bucket_counts, _, _ = entry = self.values[key]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            bucket_counts[index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, (bucket_counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in key) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, description: str) -> Counter:
+        metric = Counter(name, description)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_duration = registry.histogram("bot_handler_duration_seconds", "Время выполнения обработчика")
+handler_calls = registry.counter("bot_handler_calls_total", "Количество вызовов обработчика")
+handler_sql_queries = registry.counter("bot_handler_sql_queries_total", "SQL-запросы, выполненные обработчиком")
+handler_telegram_calls = registry.counter("bot_handler_telegram_calls_total", "Вызовы Telegram API из обработчика")
+sql_queries = registry.counter("bot_sql_queries_total", "Все SQL-запросы к базе данных")
+telegram_duration = registry.histogram("bot_telegram_api_duration_seconds", "Время вызова метода Telegram API")
+telegram_errors = registry.counter("bot_telegram_api_errors_total", "Ошибки вызовов Telegram API")
+
+
+class UpdateStats:
+    """
+    Счетчики, которые накапливаются за время обработки одного обновления.
+    """
+    __slots__ = ("sql_queries", "telegram_calls")
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.telegram_calls = 0
+
+
+current_update_stats: contextvars.ContextVar[UpdateStats | None] = contextvars.ContextVar("current_update_stats", default=None)
+
+
+def _count_sql_query(conn, cursor, statement, parameters, context, executemany):
+    sql_queries.inc()
+    stats = current_update_stats.get()
+    if stats is not None:
+        stats.sql_queries += 1
+
+
+def instrument_engine(engine: AsyncEngine):
+    """
+    Подписывается на выполнение запросов движком, чтобы считать SQL-запросы по обработчикам.
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_sql_query)
+
+
+class TelegramApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: время и ошибки каждого вызова Telegram API.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        stats = current_update_stats.get()
+        if stats is not None:
+            stats.telegram_calls += 1
+
+        method_name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            telegram_errors.inc(method=method_name)
+            raise
+        finally:
+            telegram_duration.observe(time.perf_counter() - started, method=method_name)
+
+
+class InstrumentationMiddleware(BaseMiddleware):
+    """
+    Замеряет время, SQL-запросы и вызовы Telegram API для каждого обработчика.
+    Регистрируется перед CheckUserMiddleware, чтобы учитывать и её работу.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict
+    ) -> Any:
+        handler_object = data.get("handler")
+        handler_name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        stats = UpdateStats()
+        token = current_update_stats.set(stats)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, handler=handler_name)
+            handler_calls.inc(handler=handler_name, status=status)
+            handler_sql_queries.inc(stats.sql_queries, handler=handler_name)
+            handler_telegram_calls.inc(stats.telegram_calls, handler=handler_name)
+            current_update_stats.reset(token)
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP-сервер с эндпоинтом /metrics. Возвращает runner для остановки.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint started on http://{host}:{port}/metrics")
+    return runner
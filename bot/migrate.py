@@ -0,0 +1,50 @@
+"""
+Управление миграциями схемы базы данных.
+
+    python migrate.py upgrade [--target N]  — применить миграции
+    python migrate.py current               — показать текущую и последнюю версии
+    python migrate.py check                 — завершиться с ошибкой, если схема устарела
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import migrations
+from database import engine
+
+
+async def main(args) -> int:
+    try:
+        if args.command == "upgrade":
+            applied = await migrations.upgrade(engine, args.target)
+            print(f"Применены миграции: {applied}" if applied else "Схема уже актуальна.")
+
+        elif args.command == "current":
+            async with engine.connect() as conn:
+                current = await migrations.current_revision(conn)
+            print(f"Текущая версия: {current}, последняя: {migrations.head_revision()}")
+
+        elif args.command == "check":
+            try:
+                await migrations.check_schema(engine)
+            except RuntimeError as e:
+                print(e)
+                return 1
+            print("Схема актуальна.")
+    finally:
+        await engine.dispose()
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="Применить миграции")
+    upgrade_parser.add_argument("--target", type=int, default=None, help="Версия, до которой применить миграции")
+    subparsers.add_parser("current", help="Показать текущую версию схемы")
+    subparsers.add_parser("check", help="Проверить, что схема актуальна")
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
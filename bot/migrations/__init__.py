@@ -0,0 +1,146 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Каждая миграция — модуль `vNNNN_<название>.py` в этом пакете с атрибутами:
+    revision: int           — номер версии (строго по порядку, без пропусков)
+    description: str        — краткое описание
+    transactional: bool     — False для миграций с CREATE INDEX CONCURRENTLY,
+                              такие миграции выполняются в режиме AUTOCOMMIT
+    async def upgrade(conn) — применение миграции
+
+Применённые версии хранятся в таблице `schema_migrations`.
+Миграции применяются командой `python migrate.py upgrade`,
+бот при старте только проверяет, что схема актуальна.
+"""
+import importlib
+import logging
+import pkgutil
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_migrations"
+# Ключ advisory-блокировки, чтобы две копии migrate.py не применяли миграции одновременно
+MIGRATION_LOCK_ID = 73020001
+
+
+def load_migrations() -> list:
+    """
+    Загружает модули миграций пакета и возвращает их в порядке версий.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if module_info.name.startswith("v"):
+            migrations.append(importlib.import_module(f"{__name__}.{module_info.name}"))
+
+    migrations.sort(key=lambda migration: migration.revision)
+
+    for expected, migration in enumerate(migrations, start=1):
+        if migration.revision != expected:
+            raise RuntimeError(f"Нарушена последовательность миграций: ожидалась версия {expected}, найдена {migration.revision} ({migration.__name__})")
+
+    return migrations
+
+
+def head_revision() -> int:
+    migrations = load_migrations()
+    return migrations[-1].revision if migrations else 0
+
+
+async def current_revision(conn: AsyncConnection) -> int:
+    """
+    Возвращает последнюю применённую версию схемы (0, если миграций ещё не было).
+    """
+    result = await conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": VERSION_TABLE})
+    if not result.scalar():
+        return 0
+
+    result = await conn.execute(text(f"SELECT coalesce(max(revision), 0) FROM {VERSION_TABLE}"))
+    return result.scalar() or 0
+
+
+async def _ensure_version_table(conn: AsyncConnection):
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "revision INTEGER PRIMARY KEY, "
+        "description TEXT NOT NULL, "
+        "applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())"
+    ))
+
+
+async def _record_revision(conn: AsyncConnection, migration):
+    await conn.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (revision, description) VALUES (:revision, :description)"),
+        {"revision": migration.revision, "description": migration.description}
+    )
+
+
+async def upgrade(engine: AsyncEngine, target: int | None = None) -> list[int]:
+    """
+    Применяет все неприменённые миграции до версии target (по умолчанию — до последней).
+    Возвращает список применённых версий.
+    """
+    migrations = load_migrations()
+    target = target if target is not None else (migrations[-1].revision if migrations else 0)
+    applied = []
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+        try:
+            await _ensure_version_table(conn)
+            current = await current_revision(conn)
+
+            for migration in migrations:
+                if migration.revision <= current or migration.revision > target:
+                    continue
+
+                logger.info(f"Применение миграции {migration.revision}: {migration.description}")
+                if getattr(migration, "transactional", True):
+                    async with engine.begin() as tx_conn:
+                        await migration.upgrade(tx_conn)
+                        await _record_revision(tx_conn, migration)
+                else:
+                    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+                    await migration.upgrade(conn)
+                    await _record_revision(conn, migration)
+                applied.append(migration.revision)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+
+    return applied
+
+
+async def check_schema(engine: AsyncEngine):
+    """
+    Проверяет, что схема базы данных соответствует последней миграции.
+    Бросает RuntimeError, если схема устарела или новее кода.
+    """
+    head = head_revision()
+    async with engine.connect() as conn:
+        current = await current_revision(conn)
+
+    if current < head:
+        raise RuntimeError(f"Схема базы данных устарела (версия {current}, требуется {head}). Выполните `python migrate.py upgrade`.")
+    if current > head:
+        raise RuntimeError(f"Схема базы данных новее кода бота (версия {current}, код знает {head}). Обновите бота.")
+
+
+async def create_index_concurrently(conn: AsyncConnection, name: str, table: str, columns: str, unique: bool = False):
+    """
+    Создаёт индекс без блокировки записи в таблицу.
+    Если предыдущая попытка была прервана и оставила невалидный индекс, он пересоздаётся.
+    """
+    result = await conn.execute(text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name})
+    if result.scalar():
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+    unique_sql = "UNIQUE " if unique else ""
+    await conn.execute(text(f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+async def drop_index_concurrently(conn: AsyncConnection, name: str):
+    await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
@@ -0,0 +1,90 @@
+"""
+Исходная схема, которую раньше создавал Base.metadata.create_all.
+Все операторы идемпотентны, поэтому миграция безопасно применяется к уже существующей базе.
+"""
+from sqlalchemy import text
+
+revision = 1
+description = "Исходная схема (users, referrals, withdrawal_history, vacancies, blacklist, receipt_history)"
+transactional = True
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        first_name_tg VARCHAR NOT NULL,
+        last_name_tg VARCHAR,
+        last_name VARCHAR NOT NULL,
+        first_name VARCHAR NOT NULL,
+        patronymic VARCHAR,
+        phone_number VARCHAR NOT NULL UNIQUE,
+        referrer_id BIGINT REFERENCES users (id) ON DELETE SET NULL,
+        referral_earnings FLOAT,
+        work_earnings FLOAT,
+        account_balance FLOAT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        last_activity TIMESTAMP WITH TIME ZONE DEFAULT now()
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_user_id ON users (user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_id ON users (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS referrals (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        referral_id BIGINT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        date_joined TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        CONSTRAINT _user_referral_uc UNIQUE (user_id, referral_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS withdrawal_history (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+        amount FLOAT NOT NULL,
+        withdrawal_date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        status VARCHAR(20),
+        is_urgent BOOLEAN,
+        description TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_withdrawal_history_user_id ON withdrawal_history (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS vacancies (
+        id SERIAL PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        message_id BIGINT NOT NULL,
+        text TEXT NOT NULL,
+        posted_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        status VARCHAR(20)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_vacancies_chat_id ON vacancies (chat_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_message ON vacancies (chat_id, message_id)",
+    """
+    CREATE TABLE IF NOT EXISTS blacklist (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        CONSTRAINT _user_uc UNIQUE (user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_id_blacklist ON blacklist (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS receipt_history (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (user_id),
+        amount FLOAT NOT NULL,
+        date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        description TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_receipt_user_id ON receipt_history (user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_receipt_date ON receipt_history (date)",
+]
+
+
+async def upgrade(conn):
+    for statement in STATEMENTS:
+        await conn.execute(text(statement))
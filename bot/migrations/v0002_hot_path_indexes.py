@@ -0,0 +1,15 @@
+"""
+Составные индексы для горячих запросов:
+- очередь заявок на вывод (status, is_urgent, withdrawal_date);
+- статистика активности пользователей (last_activity).
+"""
+from migrations import create_index_concurrently
+
+revision = 2
+description = "Индексы withdrawal_history(status, is_urgent, withdrawal_date) и users(last_activity)"
+transactional = False
+
+
+async def upgrade(conn):
+    await create_index_concurrently(conn, "idx_withdrawal_status_urgent_date", "withdrawal_history", "status, is_urgent, withdrawal_date")
+    await create_index_concurrently(conn, "idx_users_last_activity", "users", "last_activity")
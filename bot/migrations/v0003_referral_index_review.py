@@ -0,0 +1,47 @@
+"""
+Ревизия индексов:
+- индекс на referrals(referral_id) — поиск реферера по рефералу при регистрации и начислениях;
+- удаление дублирующих индексов users(user_id) (ix_users_user_id и idx_user_id)
+  и blacklist(user_id) (уникальное ограничение _user_uc уже даёт индекс);
+- составные индексы (user_id, дата) для историй поступлений и выводов вместо индексов только по user_id.
+"""
+from sqlalchemy import text
+from migrations import create_index_concurrently, drop_index_concurrently
+
+revision = 3
+description = "Индекс referrals(referral_id), удаление дублей индексов users/blacklist, индексы историй (user_id, дата)"
+transactional = False
+
+
+async def _drop_duplicate_user_id_index(conn):
+    # Внешние ключи на users.user_id опираются на один из двух уникальных индексов — удаляем второй
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "WHERE c.relname IN ('ix_users_user_id', 'idx_user_id') "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = c.oid) "
+        "ORDER BY c.relname = 'idx_user_id' DESC"
+    ))
+    unused = [row[0] for row in result]
+
+    existing = await conn.execute(text(
+        "SELECT count(*) FROM pg_class WHERE relname IN ('ix_users_user_id', 'idx_user_id')"
+    ))
+    if existing.scalar() < 2 or not unused:
+        return
+
+    await drop_index_concurrently(conn, unused[0])
+    if unused[0] == "ix_users_user_id":
+        await conn.execute(text("ALTER INDEX idx_user_id RENAME TO ix_users_user_id"))
+
+
+async def upgrade(conn):
+    await create_index_concurrently(conn, "idx_referrals_referral_id", "referrals", "referral_id")
+
+    await _drop_duplicate_user_id_index(conn)
+    await drop_index_concurrently(conn, "idx_user_id_blacklist")
+
+    await create_index_concurrently(conn, "idx_receipt_user_date", "receipt_history", "user_id, date")
+    await drop_index_concurrently(conn, "idx_receipt_user_id")
+
+    await create_index_concurrently(conn, "idx_withdrawal_user_date", "withdrawal_history", "user_id, withdrawal_date")
+    await drop_index_concurrently(conn, "ix_withdrawal_history_user_id")
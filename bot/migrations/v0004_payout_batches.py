@@ -0,0 +1,15 @@
+"""
+Отметка о выплате заявок: время выплаты и идентификатор выгрузки (реестра), в которую попала заявка.
+"""
+from sqlalchemy import text
+from migrations import create_index_concurrently
+
+revision = 4
+description = "Колонки withdrawal_history.paid_at и payout_batch"
+transactional = False
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE withdrawal_history ADD COLUMN IF NOT EXISTS paid_at TIMESTAMP WITH TIME ZONE"))
+    await conn.execute(text("ALTER TABLE withdrawal_history ADD COLUMN IF NOT EXISTS payout_batch VARCHAR(32)"))
+    await create_index_concurrently(conn, "idx_withdrawal_payout_batch", "withdrawal_history", "payout_batch")
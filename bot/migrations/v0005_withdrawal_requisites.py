@@ -0,0 +1,31 @@
+"""
+Отдельные колонки банка и реквизитов вместо строки description вида "Банк: X, Реквизиты: Y".
+Существующие строки заполняются пачками по диапазонам id, каждая пачка — отдельная транзакция,
+чтобы не держать долгих блокировок на withdrawal_history.
+"""
+from sqlalchemy import text
+from migrations import create_index_concurrently
+
+revision = 5
+description = "Колонки withdrawal_history.bank и requisites с заполнением из description"
+transactional = False
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE withdrawal_history ADD COLUMN IF NOT EXISTS bank VARCHAR(32)"))
+    await conn.execute(text("ALTER TABLE withdrawal_history ADD COLUMN IF NOT EXISTS requisites VARCHAR(255)"))
+
+    result = await conn.execute(text("SELECT coalesce(min(id), 0), coalesce(max(id), 0) FROM withdrawal_history"))
+    low, high = result.one()
+
+    for batch_start in range(low - 1, high, BACKFILL_BATCH_SIZE):
+        await conn.execute(text(
+            "UPDATE withdrawal_history SET "
+            "bank = lower(substring(description from '^Банк: ([^,]*), ')), "
+            "requisites = substring(description from '^Банк: [^,]*, Реквизиты: (.*)$') "
+            "WHERE id > :start AND id <= :end AND bank IS NULL AND description LIKE 'Банк: %'"
+        ), {"start": batch_start, "end": batch_start + BACKFILL_BATCH_SIZE})
+
+    await create_index_concurrently(conn, "idx_withdrawal_status_bank", "withdrawal_history", "status, bank")
@@ -0,0 +1,20 @@
+"""
+Хранилище состояний FSM в базе данных, общее для всех процессов бота.
+"""
+from sqlalchemy import text
+
+revision = 6
+description = "Таблица fsm_states для состояний и данных FSM"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key VARCHAR(255) PRIMARY KEY,
+            state VARCHAR(255),
+            data JSONB NOT NULL DEFAULT '{}'::jsonb,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states (updated_at)"))
@@ -0,0 +1,27 @@
+"""
+У пользователя может быть только один реферер: уникальный индекс на referrals(referral_id).
+Регистрация вставляет связь через INSERT ... ON CONFLICT DO NOTHING, поэтому параллельные
+/start по разным ссылкам не создают вторую запись.
+Перед созданием индекса удаляются дубли (остается самая ранняя связь), а users.referrer_id
+приводится в соответствие с оставшейся связью.
+"""
+from sqlalchemy import text
+from migrations import create_index_concurrently, drop_index_concurrently
+
+revision = 7
+description = "Уникальный индекс referrals(referral_id) вместо обычного, удаление дублей рефералов"
+transactional = False
+
+
+async def upgrade(conn):
+    await conn.execute(text(
+        "DELETE FROM referrals r USING referrals earlier "
+        "WHERE r.referral_id = earlier.referral_id AND r.id > earlier.id"
+    ))
+    await conn.execute(text(
+        "UPDATE users u SET referrer_id = r.user_id FROM referrals r "
+        "WHERE r.referral_id = u.id AND u.referrer_id IS DISTINCT FROM r.user_id"
+    ))
+
+    await create_index_concurrently(conn, "uq_referrals_referral_id", "referrals", "referral_id", unique=True)
+    await drop_index_concurrently(conn, "idx_referrals_referral_id")
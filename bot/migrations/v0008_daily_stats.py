@@ -0,0 +1,27 @@
+"""
+Фоновые задачи планировщика:
+- таблица daily_stats с ежедневной статистикой (активность за прошлые дни из users не восстановить);
+- индекс vacancies(status, posted_at) для списка активных вакансий и их истечения.
+"""
+from sqlalchemy import text
+from migrations import create_index_concurrently
+
+revision = 8
+description = "Таблица daily_stats и индекс vacancies(status, posted_at)"
+transactional = False
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day DATE PRIMARY KEY,
+            users_total INTEGER NOT NULL DEFAULT 0,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            withdrawals_count INTEGER NOT NULL DEFAULT 0,
+            withdrawals_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+            receipts_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    await create_index_concurrently(conn, "idx_vacancies_status_posted_at", "vacancies", "status, posted_at")
@@ -0,0 +1,96 @@
+"""
+Помесячное секционирование receipt_history и withdrawal_history.
+
+Таблицы пересоздаются как секционированные по дате (RANGE) и заполняются из старых:
+секции по месяцам от самой старой записи до трех месяцев вперед плюс секция DEFAULT.
+Первичный ключ секционированной таблицы обязан содержать ключ секционирования,
+поэтому он становится (id, дата); последовательность id сохраняется.
+
+Также создаются схема archive для отсоединенных старых секций и таблица user_history_totals
+с итогами по пользователю за архивные периоды (см. history_archive.py).
+
+Миграция переписывает обе таблицы целиком в одной транзакции — на время применения
+бота нужно остановить.
+"""
+from sqlalchemy import text
+
+revision = 9
+description = "Секционирование receipt_history и withdrawal_history по месяцам, схема archive и user_history_totals"
+transactional = True
+
+MONTHS_AHEAD = 3
+
+HISTORY_TABLES = [
+    {
+        "table": "receipt_history",
+        "column": "date",
+        "foreign_key": "FOREIGN KEY (user_id) REFERENCES users (user_id)",
+        "indexes": {
+            "idx_receipt_user_date": "user_id, date",
+            "idx_receipt_date": "date",
+        },
+    },
+    {
+        "table": "withdrawal_history",
+        "column": "withdrawal_date",
+        "foreign_key": "FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE",
+        "indexes": {
+            "idx_withdrawal_status_urgent_date": "status, is_urgent, withdrawal_date",
+            "idx_withdrawal_user_date": "user_id, withdrawal_date",
+            "idx_withdrawal_payout_batch": "payout_batch",
+            "idx_withdrawal_status_bank": "status, bank",
+        },
+    },
+]
+
+
+async def partition_table(conn, table: str, column: str, foreign_key: str, indexes: dict[str, str]):
+    old_table = f"{table}_unpartitioned"
+
+    await conn.execute(text(f"UPDATE {table} SET {column} = now() WHERE {column} IS NULL"))
+    await conn.execute(text(f"ALTER TABLE {table} RENAME TO {old_table}"))
+    await conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE"))  # Иначе удалится вместе со старой таблицей
+
+    # Колонки, NOT NULL и значения по умолчанию (в том числе nextval для id) — как у старой таблицы
+    await conn.execute(text(f"CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})"))
+    await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+
+    result = await conn.execute(text(
+        f"SELECT month FROM generate_series("
+        f"date_trunc('month', coalesce((SELECT min({column}) FROM {old_table}), now()) AT TIME ZONE 'UTC'), "
+        f"date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months', "
+        f"interval '1 month') AS month"
+    ))
+    for (month,) in result.all():
+        next_month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        await conn.execute(text(
+            f"CREATE TABLE {table}_y{month.year:04d}m{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{next_month:%Y-%m-%d} 00:00:00+00')"
+        ))
+    await conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    await conn.execute(text(f"INSERT INTO {table} SELECT * FROM {old_table}"))
+    await conn.execute(text(f"DROP TABLE {old_table}"))
+
+    await conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+    await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {column})"))
+    await conn.execute(text(f"ALTER TABLE {table} ADD {foreign_key}"))
+    for name, columns in indexes.items():
+        await conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns})"))
+
+
+async def upgrade(conn):
+    for options in HISTORY_TABLES:
+        await partition_table(conn, **options)
+
+    await conn.execute(text("CREATE SCHEMA IF NOT EXISTS archive"))
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_history_totals (
+            user_id BIGINT PRIMARY KEY REFERENCES users (user_id) ON DELETE CASCADE,
+            receipts_count INTEGER NOT NULL DEFAULT 0,
+            receipts_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+            withdrawals_count INTEGER NOT NULL DEFAULT 0,
+            withdrawals_paid_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
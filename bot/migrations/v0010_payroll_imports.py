@@ -0,0 +1,23 @@
+"""
+Журнал загруженных таблиц начислений: уникальный хэш содержимого не дает начислить одну таблицу дважды.
+"""
+from sqlalchemy import text
+
+revision = 10
+description = "Таблица payroll_imports с уникальным хэшем содержимого"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS payroll_imports (
+            id SERIAL PRIMARY KEY,
+            content_hash VARCHAR(64) NOT NULL UNIQUE,
+            source TEXT NOT NULL,
+            admin_id BIGINT NOT NULL,
+            users_count INTEGER NOT NULL,
+            work_amount DOUBLE PRECISION NOT NULL,
+            referral_amount DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
@@ -0,0 +1,12 @@
+"""
+Процент реферера первого уровня для смен по конкретной вакансии (commissions.py).
+"""
+from sqlalchemy import text
+
+revision = 11
+description = "Колонка vacancies.referral_percentage"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE vacancies ADD COLUMN IF NOT EXISTS referral_percentage DOUBLE PRECISION"))
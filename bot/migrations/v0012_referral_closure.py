@@ -0,0 +1,34 @@
+"""
+Таблица замыкания реферального дерева и ее заполнение по существующим referrals.
+"""
+from sqlalchemy import text
+
+revision = 12
+description = "Таблица referral_closure (предок, потомок, глубина)"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS referral_closure (
+            ancestor_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            descendant_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        )
+    """))
+    # Цепочка рефереров пользователя: поиск по потомку
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_referral_closure_descendant_depth ON referral_closure (descendant_id, depth)"))
+
+    await conn.execute(text("""
+        INSERT INTO referral_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth, path) AS (
+            SELECT id, id, 0, ARRAY[id] FROM users
+            UNION ALL
+            SELECT t.ancestor_id, r.referral_id::integer, t.depth + 1, t.path || r.referral_id::integer
+            FROM tree t JOIN referrals r ON r.user_id = t.descendant_id
+            WHERE NOT r.referral_id::integer = ANY(t.path)
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+        ON CONFLICT DO NOTHING
+    """))
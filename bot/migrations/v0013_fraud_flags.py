@@ -0,0 +1,25 @@
+"""
+Флаги подозрительных рефереров для проверки администратором (fraud.py).
+"""
+from sqlalchemy import text
+
+revision = 13
+description = "Таблица fraud_flags с одним открытым флагом на пользователя"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS fraud_flags (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+            score DOUBLE PRECISION NOT NULL,
+            reasons TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'new',
+            reviewed_by BIGINT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    await conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_fraud_flags_open ON fraud_flags (user_id) WHERE status = 'new'"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_fraud_flags_status_score ON fraud_flags (status, score)"))
@@ -0,0 +1,35 @@
+"""
+Роли сотрудников (admin_roles.py): администратор, оператор выплат, модератор вакансий.
+Триггер уведомляет процессы бота об изменении ролей, чтобы они перечитали кэш.
+"""
+from sqlalchemy import text
+
+revision = 14
+description = "Таблица admin_roles и уведомление об изменении ролей"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS admin_roles (
+            user_id BIGINT NOT NULL,
+            role VARCHAR(32) NOT NULL,
+            granted_by BIGINT,
+            granted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (user_id, role)
+        )
+    """))
+    await conn.execute(text("""
+        CREATE OR REPLACE FUNCTION notify_admin_roles_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('admin_roles_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    await conn.execute(text("DROP TRIGGER IF EXISTS admin_roles_changed ON admin_roles"))
+    await conn.execute(text("""
+        CREATE TRIGGER admin_roles_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON admin_roles
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_admin_roles_changed()
+    """))
@@ -0,0 +1,24 @@
+"""
+Сигналы накрутки рефералов (fraud.py) для многопроцессного режима.
+
+Регистрации одного реферера обрабатываются разными процессами, поэтому счет подозрительности
+реферера суммируется по этой таблице, а не в памяти процесса.
+"""
+from sqlalchemy import text
+
+revision = 15
+description = "Таблица fraud_signals для общего счета подозрительности рефереров"
+transactional = True
+
+
+async def upgrade(conn):
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS fraud_signals (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL REFERENCES users (user_id) ON DELETE CASCADE,
+            signal VARCHAR(32) NOT NULL,
+            weight DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_fraud_signals_user_created ON fraud_signals (user_id, created_at)"))
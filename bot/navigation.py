@@ -0,0 +1,51 @@
+"""
+Переходы по меню редактированием сообщения, на котором нажата кнопка.
+
+Раньше обработчики удаляли сообщение и отправляли новое — два вызова Telegram API на нажатие
+и "мигание" чата. Редактирование — один вызов. Если сообщение отредактировать нельзя
+(документ, слишком старое, уже удалено), оно удаляется, если возможно, и отправляется новое.
+"""
+import logging
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+api_calls_saved = registry.counter("bot_navigation_api_calls_saved_total", "Вызовы Telegram API, сэкономленные редактированием сообщения вместо удаления и отправки")
+fallbacks = registry.counter("bot_navigation_fallbacks_total", "Переходы, для которых пришлось отправить новое сообщение")
+
+
+async def show(
+    callback_query: CallbackQuery,
+    text: str,
+    reply_markup: Optional[InlineKeyboardMarkup] = None,
+    parse_mode: Optional[str] = None,
+    screen: str = ""
+) -> Optional[Message]:
+    """
+    Показывает экран в сообщении с кнопкой. Возвращает сообщение, в котором он показан.
+    screen — название экрана для метрик.
+    """
+    message = callback_query.message
+    if not isinstance(message, Message):
+        return None  # Сообщение недоступно (слишком старое), отвечать некуда
+
+    if message.text is not None:
+        try:
+            edited = await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            api_calls_saved.inc(screen=screen)
+            return edited if isinstance(edited, Message) else message
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                api_calls_saved.inc(screen=screen)
+                return message
+            logger.debug(f"Message {message.message_id} was not edited, sending a new one: {e}")
+
+    fallbacks.inc(screen=screen)
+    try:
+        await message.delete()
+    except TelegramBadRequest:
+        pass  # Уже удалено или слишком старое для удаления
+    return await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
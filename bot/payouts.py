@@ -0,0 +1,98 @@
+"""
+Выгрузка реестров выплат по банкам для одобренных заявок на вывод.
+"""
+import csv
+import logging
+import os
+import uuid
+from datetime import datetime
+from sqlalchemy import update, func
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import BANK_MAP
+from utils import format_moscow_time
+from database import User, WithdrawalHistory
+
+logger = logging.getLogger(__name__)
+
+PAYOUT_FETCH_SIZE = 1000  # Сколько строк забирать с сервера за один раз при потоковом чтении
+PAYOUT_FILE_HEADER = ["№", "ID заявки", "Telegram ID", "ФИО", "Реквизиты", "Сумма", "Срочный", "Дата заявки"]
+
+
+class PayoutFile:
+    """
+    Реестр выплат одного банка, который дописывается построчно.
+    """
+
+    def __init__(self, bank: str, path: str):
+        self.bank = bank
+        self.path = path
+        self.count = 0
+        self.total = 0.0
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file, delimiter=";")
+        self._writer.writerow(PAYOUT_FILE_HEADER)
+
+    def write(self, row):
+        self.count += 1
+        self.total += row.amount
+        self._writer.writerow([
+            self.count, row.id, row.user_id, f"{row.last_name} {row.first_name} {row.patronymic or ''}".strip(),
+            row.requisites or "", f"{row.amount:.2f}", "да" if row.is_urgent else "нет",
+            format_moscow_time(row.withdrawal_date)
+        ])
+
+    def close(self):
+        self._file.close()
+
+
+def new_payout_batch_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+async def mark_approved_as_paid(session: AsyncSession, batch_id: str) -> int:
+    """
+    Помечает все одобренные заявки выплаченными и привязывает их к выгрузке batch_id.
+    Не коммитит: вызывающий код коммитит отметку до отправки реестров.
+    """
+    result = await session.execute(
+        update(WithdrawalHistory)
+        .where(WithdrawalHistory.status == 'approved')
+        .values(status='paid', paid_at=func.now(), payout_batch=batch_id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount  # type: ignore
+
+
+async def write_payout_files(session: AsyncSession, batch_id: str, directory: str) -> list[PayoutFile]:
+    """
+    Потоково (через серверный курсор) читает заявки выгрузки batch_id
+    и раскладывает их по CSV-реестрам банков из BANK_MAP.
+    Заявки с неизвестным банком попадают в реестр "other".
+    """
+    files: dict[str, PayoutFile] = {}
+    result = await session.stream(
+        select(
+            WithdrawalHistory.id, WithdrawalHistory.user_id, WithdrawalHistory.amount, WithdrawalHistory.is_urgent,
+            WithdrawalHistory.withdrawal_date, WithdrawalHistory.bank, WithdrawalHistory.requisites,
+            User.last_name, User.first_name, User.patronymic
+        )
+        .join(User, User.user_id == WithdrawalHistory.user_id)
+        .where(WithdrawalHistory.payout_batch == batch_id)
+        .order_by(WithdrawalHistory.bank, WithdrawalHistory.id)
+        .execution_options(yield_per=PAYOUT_FETCH_SIZE)
+    )
+
+    try:
+        async for row in result:
+            bank = row.bank if row.bank in BANK_MAP else "other"
+
+            if bank not in files:
+                files[bank] = PayoutFile(bank, os.path.join(directory, f"payouts_{bank}_{batch_id}.csv"))
+            files[bank].write(row)
+    finally:
+        for payout_file in files.values():
+            payout_file.close()
+
+    logger.info(f"Payout batch {batch_id}: " + ", ".join(f"{f.bank}={f.count}" for f in files.values()))
+    return list(files.values())
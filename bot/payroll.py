@@ -0,0 +1,220 @@
+"""
+Начисление зарплаты по таблице Google Sheets в два этапа.
+
+1. План: вся таблица разбирается и проверяется в памяти, суммы по пользователям и реферальные
+   начисления всех уровней (commissions.py) считаются для всей таблицы сразу — по каждой строке
+   (смене) отдельно, чтобы потолок начисления действовал на смену, — администратор
+   получает сводку — ничего не меняется.
+2. Применение (после подтверждения): все начисления одной транзакцией, пачками UPDATE/INSERT.
+   Хэш содержимого таблицы записывается в payroll_imports, повторная загрузка той же таблицы отклоняется.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from commissions import Bonus, compute_bonuses, describe, vacancy_rates
+from database import User, ReceiptHistory, PayrollImport
+
+ID_COLUMN = "ID tg"
+AMOUNT_COLUMN = "зп"
+VACANCY_COLUMN = "вакансия"  # Необязательная колонка с ID вакансии (для процента реферала по вакансии)
+TOP_PAYOUTS = 5  # Сколько крупнейших начислений показывать в сводке
+MAX_LISTED = 20  # Сколько ID и строк показывать в каждом списке сводки, чтобы она поместилась в сообщение
+WORK_DESCRIPTION = "Поступление средств за отработанную смену"
+
+users = User.__table__  # UPDATE по таблице (Core) выполняется как executemany, без ORM-синхронизации сессии
+
+
+class PayrollLine(NamedTuple):
+    """
+    Одна строка таблицы — одна смена.
+    """
+    user_id: int
+    vacancy_id: Optional[int]
+    amount: float
+
+
+class PayrollPlan(NamedTuple):
+    lines: list[PayrollLine]
+    bonuses: list[Bonus]
+    unknown_ids: list[int]  # ID из таблицы, которых нет среди пользователей
+    unknown_vacancy_ids: list[int]  # ID вакансий, которых нет в базе (реферальный процент по умолчанию)
+    duplicate_ids: list[int]  # ID, встретившиеся в таблице несколько раз (суммы сложены)
+    invalid_rows: list[int]  # Номера строк таблицы с некорректным ID или суммой
+
+    @property
+    def work_total(self) -> float:
+        return sum(line.amount for line in self.lines)
+
+    @property
+    def referral_bonuses(self) -> dict[int, float]:
+        """
+        Сумма реферальных начислений по получателям.
+        """
+        bonuses: dict[int, float] = {}
+        for bonus in self.bonuses:
+            bonuses[bonus.user_id] = bonuses.get(bonus.user_id, 0.0) + bonus.amount
+        return bonuses
+
+
+def content_hash(rows: list[dict]) -> str:
+    """
+    Хэш содержимого таблицы (все колонки), не зависящий от порядка ключей в строках.
+    """
+    payload = json.dumps(rows, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_rows(rows: list[dict]) -> tuple[list[PayrollLine], list[int], list[int]]:
+    """
+    Смены по строкам таблицы, повторяющиеся ID и номера некорректных строк (с учетом строки заголовка).
+    """
+    lines: list[PayrollLine] = []
+    seen: set[int] = set()
+    duplicates: list[int] = []
+    invalid_rows: list[int] = []
+
+    for number, row in enumerate(rows, start=2):
+        try:
+            user_id = int(str(row[ID_COLUMN]).strip())
+            amount = float(str(row[AMOUNT_COLUMN]).replace(" ", "").replace(",", "."))
+            vacancy = str(row.get(VACANCY_COLUMN, "")).strip()
+            vacancy_id = int(vacancy) if vacancy else None
+        except (KeyError, ValueError):
+            invalid_rows.append(number)
+            continue
+        if amount <= 0:
+            invalid_rows.append(number)
+            continue
+
+        if user_id in seen and user_id not in duplicates:
+            duplicates.append(user_id)
+        seen.add(user_id)
+        lines.append(PayrollLine(user_id, vacancy_id, amount))
+
+    return lines, duplicates, invalid_rows
+
+
+async def build_plan(session: AsyncSession, lines: list[PayrollLine], duplicates: list[int], invalid_rows: list[int]) -> PayrollPlan:
+    """
+    Проверяет пользователей и вакансии и считает реферальные начисления для всей таблицы.
+    """
+    user_ids = {line.user_id for line in lines}
+    result = await session.execute(select(User.user_id).where(User.user_id.in_(list(user_ids))))
+    known_ids = set(result.scalars())
+
+    lines = [line for line in lines if line.user_id in known_ids]
+    unknown_ids = sorted(user_ids - known_ids)
+    rates = await vacancy_rates(session, (line.vacancy_id for line in lines))
+    unknown_vacancy_ids = sorted({line.vacancy_id for line in lines if line.vacancy_id is not None} - rates.keys())
+    bonuses = await compute_bonuses(session, lines, rates)
+    return PayrollPlan(lines, bonuses, unknown_ids, unknown_vacancy_ids, duplicates, invalid_rows)
+
+
+async def find_import(session: AsyncSession, digest: str) -> Optional[datetime]:
+    """
+    Время предыдущей загрузки таблицы с тем же содержимым или None.
+    """
+    result = await session.execute(select(PayrollImport.created_at).where(PayrollImport.content_hash == digest))
+    return result.scalar_one_or_none()
+
+
+def format_list(items: list) -> str:
+    """
+    Первые MAX_LISTED элементов через запятую и число остальных.
+    """
+    listed = ", ".join(items[:MAX_LISTED])
+    if len(items) > MAX_LISTED:
+        listed += f" и ещё {len(items) - MAX_LISTED}"
+    return listed
+
+
+def format_summary(plan: PayrollPlan) -> str:
+    bonuses = plan.referral_bonuses
+    worker_totals: dict[int, float] = {}
+    for line in plan.lines:
+        worker_totals[line.user_id] = worker_totals.get(line.user_id, 0.0) + line.amount
+    largest = sorted(worker_totals.items(), key=lambda item: item[1], reverse=True)[:TOP_PAYOUTS]
+    levels = sorted({bonus.level for bonus in plan.bonuses})
+
+    summary = (
+        f"📋 *Проверка таблицы начислений*\n\n"
+        f"Пользователей к начислению: {len(worker_totals)}\n"
+        f"Сумма за смены: {plan.work_total:.2f} ₽\n"
+        f"Реферальные начисления: {sum(bonuses.values()):.2f} ₽ ({len(bonuses)} реферерам)\n"
+        + "".join(
+            f"  - уровень {level}: {sum(bonus.amount for bonus in plan.bonuses if bonus.level == level):.2f} ₽\n"
+            for level in levels
+        ) +
+        f"Итого: {plan.work_total + sum(bonuses.values()):.2f} ₽\n"
+    )
+    if largest:
+        summary += "\n💰 Крупнейшие начисления:\n" + "".join(f"  - `{user_id}`: {amount:.2f} ₽\n" for user_id, amount in largest)
+    if plan.unknown_ids:
+        summary += f"\n❓ Не найдены (будут пропущены): {format_list([f'`{user_id}`' for user_id in plan.unknown_ids])}\n"
+    if plan.unknown_vacancy_ids:
+        summary += f"\n❓ Вакансии не найдены (реферальный процент по умолчанию): {format_list([f'`{vacancy_id}`' for vacancy_id in plan.unknown_vacancy_ids])}\n"
+    if plan.duplicate_ids:
+        summary += f"\n⚠️ Повторяются (суммы сложены): {format_list([f'`{user_id}`' for user_id in plan.duplicate_ids])}\n"
+    if plan.invalid_rows:
+        summary += f"\n🚫 Некорректные строки (будут пропущены): {format_list([str(number) for number in plan.invalid_rows])}\n"
+    return summary
+
+
+async def apply_plan(session: AsyncSession, plan: PayrollPlan, digest: str, source: str, admin_id: int) -> bool:
+    """
+    Применяет план одной транзакцией. Возвращает False, если таблица с таким хэшем уже была загружена.
+    """
+    bonuses = plan.referral_bonuses
+
+    result = await session.execute(
+        pg_insert(PayrollImport)
+        .values(
+            content_hash=digest, source=source, admin_id=admin_id, users_count=len({line.user_id for line in plan.lines}),
+            work_amount=plan.work_total, referral_amount=sum(bonuses.values())
+        )
+        .on_conflict_do_nothing(index_elements=[PayrollImport.content_hash])
+        .returning(PayrollImport.id)
+    )
+    if result.scalar_one_or_none() is None:
+        await session.rollback()
+        return False
+
+    work_totals: dict[int, float] = {}
+    for line in plan.lines:
+        work_totals[line.user_id] = work_totals.get(line.user_id, 0.0) + line.amount
+
+    if work_totals:
+        await session.execute(
+            update(users)
+            .where(users.c.user_id == bindparam("target_user_id"))
+            .values(
+                account_balance=users.c.account_balance + bindparam("amount"),
+                work_earnings=users.c.work_earnings + bindparam("amount")
+            ),
+            [{"target_user_id": user_id, "amount": amount} for user_id, amount in work_totals.items()]
+        )
+        await session.execute(insert(ReceiptHistory), [
+            {"user_id": line.user_id, "amount": line.amount, "description": WORK_DESCRIPTION} for line in plan.lines
+        ])
+
+    if bonuses:
+        await session.execute(
+            update(users)
+            .where(users.c.user_id == bindparam("target_user_id"))
+            .values(
+                account_balance=users.c.account_balance + bindparam("amount"),
+                referral_earnings=users.c.referral_earnings + bindparam("amount")
+            ),
+            [{"target_user_id": user_id, "amount": amount} for user_id, amount in bonuses.items()]
+        )
+        await session.execute(insert(ReceiptHistory), [
+            {"user_id": bonus.user_id, "amount": bonus.amount, "description": describe(bonus)} for bonus in plan.bonuses
+        ])
+
+    await session.commit()
+    return True
@@ -0,0 +1,151 @@
+"""
+Проверка планов горячих запросов.
+
+Выполняет EXPLAIN для каждого запроса из HOT_QUERIES и завершается с ошибкой,
+если план содержит последовательное сканирование (Seq Scan) таблицы.
+Запускать на локальной базе с заполненными данными — на пустых таблицах
+планировщик всегда выбирает Seq Scan (поэтому пустые секции таблиц истории не учитываются):
+
+    python query_plans.py --seed 50000   — заполнить локальную базу синтетическими данными и проверить
+    python query_plans.py                — проверить планы на текущих данных
+"""
+import argparse
+import asyncio
+import json
+import sys
+from sqlalchemy import text
+from database import engine
+
+# Синтетические пользователи получают ID начиная с этого значения, чтобы не пересекаться с настоящими
+SEED_USER_ID_BASE = 9_000_000_000_000
+LOCAL_HOSTS = (None, "localhost", "127.0.0.1", "::1")
+
+# Запросы обработчиков, которые выполняются на каждое действие пользователя.
+# {user_id} — Telegram ID, {user_pk} — users.id
+HOT_QUERIES = {
+    "user_by_telegram_id": "SELECT * FROM users WHERE user_id = {user_id}",
+    "referrer_by_referral": "SELECT * FROM referrals WHERE referral_id = {user_pk}",
+    "referrals_of_user": "SELECT * FROM referrals WHERE user_id = {user_pk}",
+    "receipts_of_user": "SELECT * FROM receipt_history WHERE user_id = {user_id} ORDER BY date DESC LIMIT 3",
+    "withdrawals_of_user": "SELECT * FROM withdrawal_history WHERE user_id = {user_id} ORDER BY withdrawal_date DESC LIMIT 3",
+    "pending_withdrawals": "SELECT * FROM withdrawal_history WHERE status = 'pending' AND is_urgent = true ORDER BY withdrawal_date LIMIT 10",
+    "pending_withdrawals_by_bank": "SELECT * FROM withdrawal_history WHERE status = 'pending' AND bank = 'sber' LIMIT 10",
+    "active_users_week": "SELECT count(*) FROM users WHERE last_activity >= now() - interval '7 days'",
+    "blacklist_check": "SELECT * FROM blacklist WHERE user_id = {user_id}",
+}
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO users (user_id, first_name_tg, last_name, first_name, patronymic, phone_number,
+                       referral_earnings, work_earnings, account_balance, created_at, last_activity)
+    SELECT :base + g, 'User' || g, 'Иванов', 'Иван', 'Иванович', '+7999' || lpad(g::text, 9, '0'),
+           0, 0, 0, now() - (g % 365) * interval '1 day', now() - (g % 365) * interval '1 day'
+    FROM generate_series(1, :count) g
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO referrals (user_id, referral_id)
+    SELECT referrer.id, referral.id
+    FROM users referral
+    JOIN users referrer ON referrer.user_id = :base + greatest(1, (referral.user_id - :base) / 2)
+    WHERE referral.user_id > :base + 1
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO receipt_history (user_id, amount, date, description)
+    SELECT u.user_id, 1000, now() - k * interval '7 days', 'seed'
+    FROM users u, generate_series(1, 4) k
+    WHERE u.user_id > :base
+    """,
+    """
+    INSERT INTO withdrawal_history (user_id, amount, withdrawal_date, status, is_urgent, bank, requisites, description)
+    SELECT u.user_id, 500, now() - k * interval '3 days',
+           CASE WHEN u.user_id % 50 = 0 THEN 'pending' ELSE 'paid' END,
+           k = 1, (ARRAY['sber', 'tinkoff', 'alfa', 'vtb'])[1 + u.user_id % 4], u.phone_number,
+           'Банк: sber, Реквизиты: ' || u.phone_number
+    FROM users u, generate_series(1, 2) k
+    WHERE u.user_id > :base
+    """,
+    """
+    INSERT INTO blacklist (user_id)
+    SELECT u.user_id FROM users u
+    WHERE u.user_id > :base AND u.user_id % 100 = 0
+    ON CONFLICT DO NOTHING
+    """,
+    "ANALYZE",
+]
+
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """
+    Рекурсивно обходит узлы плана и возвращает таблицы, которые сканируются последовательно.
+    """
+    tables = []
+    if plan.get("Node Type") == "Seq Scan":
+        tables.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        tables.extend(find_seq_scans(child))
+    return tables
+
+
+async def seed(count: int):
+    if engine.url.host not in LOCAL_HOSTS:
+        raise RuntimeError(f"Заполнение синтетическими данными разрешено только для локальной базы, а не {engine.url.host}")
+
+    async with engine.begin() as conn:
+        for statement in SEED_STATEMENTS[:-1]:
+            await conn.execute(text(statement), {"base": SEED_USER_ID_BASE, "count": count})
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(SEED_STATEMENTS[-1]))
+
+
+async def check_plans() -> list[str]:
+    """
+    Возвращает список нарушений вида "<запрос>: Seq Scan on <таблица>".
+    """
+    failures = []
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT id, user_id FROM users ORDER BY id DESC LIMIT 1"))
+        sample = result.first()
+        if not sample:
+            raise RuntimeError("Таблица users пуста — заполните базу (--seed), иначе планы не показательны")
+
+        # Секции истории на будущие месяцы пустые, их последовательное сканирование ничего не стоит
+        result = await conn.execute(text("SELECT relname FROM pg_class WHERE relispartition AND reltuples <= 0"))
+        empty_partitions = set(result.scalars())
+
+        for name, query in HOT_QUERIES.items():
+            sql = query.format(user_pk=int(sample.id), user_id=int(sample.user_id))
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            seq_scans = [table for table in find_seq_scans(plan[0]["Plan"]) if table not in empty_partitions]
+            status = "OK" if not seq_scans else "SEQ SCAN: " + ", ".join(seq_scans)
+            print(f"{name:<25} {status}")
+            failures.extend(f"{name}: Seq Scan on {table}" for table in seq_scans)
+
+    return failures
+
+
+async def main(args) -> int:
+    try:
+        if args.seed:
+            await seed(args.seed)
+        failures = await check_plans()
+    finally:
+        await engine.dispose()
+
+    if failures:
+        print("\nГорячие запросы без индекса:\n" + "\n".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов")
+    parser.add_argument("--seed", type=int, default=0, help="Заполнить локальную базу указанным числом синтетических пользователей")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,9 +1,9 @@
 import logging
-from config import REFERRAL_PERCENTAGE
+from config import REFERRAL_LEVELS
 from database import get_async_session, User, Referral
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -11,7 +11,12 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import StateFilter
 import urllib.parse
 from utils import save_previous_state
-from membership import is_user_blocked
+from user_cache import get_user_snapshot
+from views import referrals_of, downline_stats
+from referral_tree import add_to_tree
+import navigation
+
+logger = logging.getLogger(__name__)
 
 #TODO получше разобраться с работой рефералов и сделать наглядно сколько с каждого заработал
 #TODO мб мб сделать как в скрудже донат команде со списком лучших и тд)) 
@@ -24,27 +29,28 @@ class NavigationForReferral(StatesGroup):
 
 back_button = InlineKeyboardButton(text="Назад", callback_data="back_in_referral")
 
+# Условия реферальной программы по уровням из REFERRAL_LEVELS
+REFERRAL_TERMS = f"👷🏻 За каждую отработанную смену вашего реферала вы получаете {REFERRAL_LEVELS[0] * 100:g}% от суммы сделки."
+if len(REFERRAL_LEVELS) > 1:
+    REFERRAL_TERMS += "\n🔗 С рефералов ваших рефералов: " + ", ".join(
+        f"{level} уровень — {share * 100:g}%" for level, share in enumerate(REFERRAL_LEVELS[1:], start=2)
+    ) + "."
+
 class ReferralSystem:
 
     @staticmethod
     async def get_users_referrals(user_id: int):
         async with get_async_session() as db:
             try:
-                result = await db.execute(select(User).filter(User.user_id == user_id))
-                db_user = result.scalar_one_or_none()
+                result = await db.execute(select(User.id).filter(User.user_id == user_id))
+                user_pk = result.scalar_one_or_none()
             
-                if db_user:
-                    result = await db.execute(
-                        select(User)
-                        .join(Referral, User.id == Referral.referral_id)
-                        .filter(Referral.user_id == db_user.id)
-                    )
-                    referrals = result.scalars().all()
-                    return referrals
+                if user_pk:
+                    return await referrals_of(db, user_pk)
                 else:
                     return None
             except SQLAlchemyError as e:
-                logging.error(f"Failed to get referrals: {user_id}. Error: {e}")
+                logger.error(f"Failed to get referrals: {user_id}. Error: {e}")
                 return None
 
 
@@ -58,54 +64,55 @@ class ReferralSystem:
                 return True
             except SQLAlchemyError as e:
                 await db.rollback()
-                logging.error(f"Failed to add referral: {referrer_id} -> {referral_id}. Error: {e}")
+                logger.error(f"Failed to add referral: {referrer_id} -> {referral_id}. Error: {e}")
                 return False
             
     @staticmethod
-    async def process_referral(user_id: int, referrer_id: int):
+    async def register_user(user_id: int, referrer_id: int | None, **profile) -> tuple[str, str | None]:
         """
-        Обрабатывает реферальную ссылку. Добавляет пользователя как реферала к рефереру,
-        если реферер существует, и пользователь уже не зарегистрирован как реферал.
+        Регистрирует пользователя и его связь с реферером в одной транзакции.
+        Конфликты по user_id и phone_number обрабатываются через INSERT ... ON CONFLICT DO NOTHING,
+        поэтому повторный /start или одновременные регистрации не приводят к ошибкам.
+
+        Возвращает статус ("created", "exists" или "phone_taken") и сообщение о реферальной ссылке (или None).
         """
         async with get_async_session() as db:
             try:
-                # Проверяем, существует ли реферер
-                result = await db.execute(select(User).filter(User.user_id == referrer_id))
-                referrer = result.scalar_one_or_none()
-
-                if not referrer:
-                    return False, "❗ Некорректная реферальная ссылка."
-
-                # Проверяем, зарегистрирован ли пользователь, которого хотят добавить в рефералы
-                result = await db.execute(select(User).filter(User.user_id == user_id))
-                user = result.scalar_one_or_none()
-
-                if not user:
-                    logging.error(f"Пользователь с ID {user_id} не найден в таблице users.")
-                    return False, "❗ Пользователь должен быть зарегистрирован перед использованием реферальной ссылки."
-
-                # Проверяем, не существует ли уже запись реферала
-                result = await db.execute(select(Referral).filter(Referral.referral_id == user_id))
-                existing_referral = result.scalar_one_or_none()
-
-                if existing_referral:
-                    return False, "❗ Вы уже зарегистрированы как реферал."
-
-                # Логирование перед созданием записи
-                logging.info(f"Добавляем запись о реферале: {referrer.id} -> {user.id}")
+                # Реферер подставляется подзапросом прямо во вставку пользователя
+                referrer_pk = select(User.id).where(User.user_id == referrer_id).scalar_subquery() if referrer_id else None
+                result = await db.execute(
+                    pg_insert(User)
+                    .values(user_id=user_id, referrer_id=referrer_pk, **profile)
+                    .on_conflict_do_nothing()
+                    .returning(User.id, User.referrer_id)
+                )
+                created = result.first()
+
+                if not created:
+                    await db.rollback()
+                    result = await db.execute(select(User.id).where(User.user_id == user_id))
+                    return ("exists" if result.scalar_one_or_none() else "phone_taken"), None
+
+                referral_message = None
+                await add_to_tree(db, created.id, created.referrer_id)
+                if created.referrer_id:
+                    # Уникальный индекс по referral_id: у пользователя может быть только один реферер
+                    await db.execute(
+                        pg_insert(Referral)
+                        .values(user_id=created.referrer_id, referral_id=created.id)
+                        .on_conflict_do_nothing()
+                    )
+                    logger.info(f"Добавляем запись о реферале: {created.referrer_id} -> {created.id}")
+                    referral_message = "🎉 Реферальная ссылка успешно обработана!"
+                elif referrer_id:
+                    referral_message = "❗ Некорректная реферальная ссылка."
 
-                # Создание новой записи реферала
-                new_referral = Referral(user_id=referrer.id, referral_id=user.id)
-                db.add(new_referral)
-                user.referrer_id = referrer.id
                 await db.commit()
+                return "created", referral_message
 
-                return True, "🎉 Реферальная ссылка успешно обработана!"
-
-            except SQLAlchemyError as e:
+            except SQLAlchemyError:
                 await db.rollback()
-                logging.error(f"Ошибка при обработке реферальной ссылки: {e}")
-                return False, "⚠️ Ошибка при обработке реферальной системы."
+                raise
 
 
 @router.message(F.text == "🫂 Рефералы")
@@ -117,48 +124,42 @@ async def referrals_handler(message: Message, state: FSMContext):
     await save_previous_state(state)
     user_id = message.from_user.id  # type: ignore
 
+    db_user = await get_user_snapshot(user_id)
+
+    if not db_user:
+        await message.answer("❗ Пользователь не найден.")
+        return
+
     async with get_async_session() as db:
-        # Запрашиваем пользователя и его рефералов, используя joinedload для явной загрузки связанных данных
-        result = await db.execute(
-            select(User)
-            .options(joinedload(User.referrals).joinedload(Referral.referral_user))  # Загружаем данные о рефералах и связанных пользователях
-            .filter(User.user_id == user_id)
+        # Рефералы вместе с отметкой о блокировке одним запросом
+        referrals = await referrals_of(db, db_user.id)
+        downline = await downline_stats(db, db_user.id) if referrals else None
+
+    if referrals:
+        referral_list = []
+        for referral in referrals:
+            status = " (заблокирован)" if referral.is_blocked else ""
+            referral_list.append(f"👤 {referral.first_name_tg}{status} (ID: {referral.user_id}){status}")
+
+        # Формируем список рефералов
+        referral_list_text = "\n".join(referral_list)
+        earnings_info = f"💸 *Заработок с рефералов:* {db_user.referral_earnings} рублей."
+        if downline and downline.levels > 1:
+            # Команда на всех уровнях — только если есть рефералы рефералов
+            earnings_info += f"\n🌳 *Вся команда:* {downline.members} чел. на {downline.levels} уровнях, заработали {downline.work_earnings:.2f} рублей."
+        response_text = (
+            f"🫂 *Ваши рефералы:*\n\n"
+            f"{referral_list_text}\n\n"
+            f"{earnings_info}\n\n"
+            f"{REFERRAL_TERMS}\n\n🤝 Продолжайте приглашать друзей, чтобы зарабатывать больше!"
+        )
+
+    else:
+        response_text = (
+            "🫂 *Ваши рефералы:*\n\n"
+            "У вас пока нет рефералов.\n\n"
+            f"{REFERRAL_TERMS}\n\n🤝 Приглашайте друзей, чтобы заработать с каждого приглашенного!"
         )
-        db_user = result.unique().scalar_one_or_none()  # Применяем unique() перед scalar_one_or_none()
-
-        if not db_user:
-            await message.answer("❗ Пользователь не найден.")
-            return
-
-        referrals = db_user.referrals
-
-        if referrals:
-            referral_list = []
-            for referral in referrals:
-                referral_user = referral.referral_user
-                if referral_user:
-                    is_blocked = await is_user_blocked(referral_user.user_id)  # type: ignore
-                    status = " (заблокирован)" if is_blocked else ""
-                    referral_list.append(f"👤 {referral_user.first_name_tg}{status} (ID: {referral_user.user_id}){status}")
-                else:
-                    referral_list.append(f"Пользователь удален")
-
-            # Формируем список рефералов
-            referral_list_text = "\n".join(referral_list)
-            earnings_info = f"💸 *Заработок с рефералов:* {db_user.referral_earnings} рублей."
-            response_text = (
-                f"🫂 *Ваши рефералы:*\n\n"
-                f"{referral_list_text}\n\n"
-                f"{earnings_info}\n\n"
-                f"👷🏻 За каждую отработанную смену вашего реферала вы получаете {int(REFERRAL_PERCENTAGE * 100)}% от суммы сделки.\n\n🤝 Продолжайте приглашать друзей, чтобы зарабатывать больше!"
-            )
-
-        else:
-            response_text = (
-                "🫂 *Ваши рефералы:*\n\n"
-                "У вас пока нет рефералов.\n\n"
-                f"👷🏻 За каждую отработанную смену вашего реферала вы получаете {int(REFERRAL_PERCENTAGE * 100)}% от суммы сделки.\n\n🤝 Приглашайте друзей, чтобы заработать с каждого приглашенного!"
-            )
 
     # Добавляем кнопку генерации ссылки
     generate_referral_url_button = InlineKeyboardButton(text="🔗 Сгенерировать пригласительную ссылку", callback_data="generate_referral_url")
@@ -175,8 +176,6 @@ async def referral_callback_handler(callback_query: CallbackQuery, state: FSMCon
     """
     Обрабатывает нажатие на кнопку "Сгенерировать пригласительную ссылку".
     """
-    bot = callback_query.bot
-    await bot.delete_message(callback_query.message.chat.id, callback_query.message.message_id) # type: ignore
     encoded_text = urllib.parse.quote("Присоединяйся и зарабатывай вместе со мной!")
     user_id = callback_query.from_user.id  # type: ignore
     bot_username = (await callback_query.bot.get_me()).username  # type: ignore
@@ -197,7 +196,7 @@ async def referral_callback_handler(callback_query: CallbackQuery, state: FSMCon
         "👥 Чем больше друзей вы пригласите, тем больше бонусов вы получите!"
     )
 
-    await callback_query.message.answer(referral_text, parse_mode="Markdown", reply_markup=inline_kb)  # type: ignore
+    await navigation.show(callback_query, referral_text, reply_markup=inline_kb, parse_mode="Markdown", screen="referral_link")
     await callback_query.answer()  # Подтверждение обработки callback
     await state.set_state(NavigationForReferral.referral_link)
 
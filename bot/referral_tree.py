@@ -0,0 +1,56 @@
+"""
+Таблица замыкания реферального дерева (referral_closure).
+
+Для каждого пользователя хранятся строки (предок, потомок, глубина) для всех его предков
+и строка (сам, сам, 0). Размер команды, заработок ветки и цепочка рефереров читаются
+одним обычным запросом без рекурсии. Таблица поддерживается при регистрации (add_to_tree)
+и удалении пользователя (detach_subtree).
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Полное перестроение по referrals (после загрузки данных); путь в массиве защищает от циклов
+REBUILD_SQL = """
+    INSERT INTO referral_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE tree (ancestor_id, descendant_id, depth, path) AS (
+        SELECT id, id, 0, ARRAY[id] FROM users
+        UNION ALL
+        SELECT t.ancestor_id, r.referral_id::integer, t.depth + 1, t.path || r.referral_id::integer
+        FROM tree t JOIN referrals r ON r.user_id = t.descendant_id
+        WHERE NOT r.referral_id::integer = ANY(t.path)
+    )
+    SELECT ancestor_id, descendant_id, depth FROM tree
+    ON CONFLICT DO NOTHING
+"""
+
+
+async def add_to_tree(db: AsyncSession, user_pk: int, referrer_pk: int | None):
+    """
+    Добавляет нового пользователя (users.id) в дерево: строка на себя и по строке на каждого предка реферера.
+    Не коммитит — вызывается в транзакции регистрации.
+    """
+    await db.execute(text(
+        "INSERT INTO referral_closure (ancestor_id, descendant_id, depth) VALUES (:user_pk, :user_pk, 0) "
+        "ON CONFLICT DO NOTHING"
+    ), {"user_pk": user_pk})
+
+    if referrer_pk:
+        await db.execute(text(
+            "INSERT INTO referral_closure (ancestor_id, descendant_id, depth) "
+            "SELECT ancestor_id, :user_pk, depth + 1 FROM referral_closure WHERE descendant_id = :referrer_pk "
+            "ON CONFLICT DO NOTHING"
+        ), {"user_pk": user_pk, "referrer_pk": referrer_pk})
+
+
+async def detach_subtree(db: AsyncSession, user_pk: int):
+    """
+    Перед удалением пользователя отвязывает его поддерево от его предков: рефералы удаляемого
+    становятся корнями своих веток. Строки самого пользователя удалятся каскадно вместе с ним.
+    Не коммитит.
+    """
+    await db.execute(text(
+        "DELETE FROM referral_closure c USING referral_closure up, referral_closure down "
+        "WHERE up.descendant_id = :user_pk AND up.depth > 0 "
+        "AND down.ancestor_id = :user_pk "
+        "AND c.ancestor_id = up.ancestor_id AND c.descendant_id = down.descendant_id"
+    ), {"user_pk": user_pk})
@@ -0,0 +1,106 @@
+"""
+Планировщик периодических фоновых задач.
+
+Каждая задача выполняется в своем цикле asyncio: запуск, затем пауза interval секунд,
+поэтому запуски одной задачи никогда не пересекаются. Задачи с lock_id при нескольких
+процессах/копиях бота выполняет только тот, кто взял advisory-блокировку PostgreSQL
+с этим ключом; остальные пропускают запуск. Задачи с run_on_stop=True выполняются
+еще раз при остановке (например, сброс накопленных в памяти данных).
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+from sqlalchemy import text
+from database import engine
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+job_duration = registry.histogram("bot_job_duration_seconds", "Время выполнения фоновой задачи")
+job_runs = registry.counter("bot_job_runs_total", "Запуски фоновых задач")
+
+
+class Job:
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[None]], lock_id: int | None, run_on_start: bool, run_on_stop: bool):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.lock_id = lock_id  # None — задача выполняется в каждом процессе
+        self.run_on_start = run_on_start
+        self.run_on_stop = run_on_stop
+        self.lock = asyncio.Lock()
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: list[Job] = []
+        self.tasks: list[asyncio.Task] = []
+
+    def add(self, name: str, interval: float, func: Callable[[], Awaitable[None]], lock_id: int | None = None, run_on_start: bool = False, run_on_stop: bool = False):
+        """
+        Регистрирует задачу. lock_id — ключ advisory-блокировки для задач, которые должен выполнять один процесс;
+        run_on_start — первый запуск сразу, а не через interval (для редких задач, которые не должны зависеть от перезапусков).
+        """
+        self.jobs.append(Job(name, interval, func, lock_id, run_on_start, run_on_stop))
+
+    async def run(self, job: Job):
+        """
+        Однократный запуск задачи с защитой от наложения и учетом в метриках.
+        """
+        if job.lock.locked():
+            job_runs.inc(job=job.name, status="skipped")
+            return
+
+        async with job.lock:
+            if job.lock_id is None:
+                await self._timed(job)
+                return
+
+            async with engine.connect() as conn:
+                result = await conn.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": job.lock_id})
+                if not result.scalar():
+                    job_runs.inc(job=job.name, status="skipped")
+                    return
+                try:
+                    await self._timed(job)
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": job.lock_id})
+
+    async def _timed(self, job: Job):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await job.func()
+        except Exception as e:
+            status = "error"
+            logger.exception(f"Job {job.name} failed: {e}")
+        finally:
+            job_duration.observe(time.perf_counter() - started, job=job.name)
+            job_runs.inc(job=job.name, status=status)
+
+    async def _loop(self, job: Job):
+        delay = 0 if job.run_on_start else job.interval
+        while True:
+            await asyncio.sleep(delay)
+            delay = job.interval
+            try:
+                await self.run(job)
+            except Exception as e:
+                # Например, недоступна база при взятии блокировки — пробуем на следующем интервале
+                logger.error(f"Job {job.name} was not run: {e}")
+
+    async def start(self):
+        self.tasks = [asyncio.create_task(self._loop(job), name=f"job-{job.name}") for job in self.jobs]
+        logger.info(f"Scheduler started: {', '.join(job.name for job in self.jobs)}")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+        for job in self.jobs:
+            if job.run_on_stop:
+                await self.run(job)
+        logger.info("Scheduler stopped")
@@ -0,0 +1,139 @@
+"""
+Многопроцессный режим бота.
+
+Главный процесс только получает обновления (long polling) и раскладывает их по
+WORKER_PROCESSES процессам-обработчикам по Telegram ID пользователя, поэтому обновления
+одного пользователя всегда попадают в один процесс и обрабатываются по порядку.
+Каждый процесс-обработчик запускает обычный Dispatcher из bot_work.py со своим пулом
+соединений к базе. Состояния FSM хранятся в PostgreSQL (FSM_STORAGE=postgres).
+
+    WORKER_PROCESSES=4 FSM_STORAGE=postgres python sharded_bot.py
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from aiogram.types import Update
+from config import API_KEY, FSM_STORAGE, METRICS_HOST, METRICS_PORT, WORKER_PROCESSES, WORKER_QUEUE_SIZE
+from logging_setup import setup_logging
+
+logger = logging.getLogger("sharded_bot")  # Запускается как скрипт, где __name__ == "__main__"
+
+POLLING_TIMEOUT = 30
+# Типы обновлений, на которые подписан бот (обычный polling определяет их по зарегистрированным обработчикам)
+ALLOWED_UPDATES = ["message", "callback_query", "chat_member"]
+
+
+def shard_key(update: Update) -> int:
+    """
+    Telegram ID отправителя, а для обновлений без отправителя — ID чата.
+    """
+    try:
+        event = update.event
+    except Exception:
+        return 0
+
+    user = getattr(event, "from_user", None)
+    if user:
+        return user.id
+    chat = getattr(event, "chat", None)
+    return chat.id if chat else 0
+
+
+async def worker_main(index: int, queue):
+    import bot_work
+    from database import init_db
+    from metrics import start_metrics_server
+
+    await init_db()
+    bot_work.dp.include_router(bot_work.router)
+    # Эндпоинт метрик у каждого процесса свой: METRICS_PORT + 1 + номер процесса
+    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + index) if METRICS_PORT else None
+    await bot_work.dp.emit_startup(bot=bot_work.bot)
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            try:
+                await bot_work.dp.feed_raw_update(bot_work.bot, update)
+            except Exception as e:
+                logger.exception(f"Worker {index}: error processing update {update.get('update_id')}: {e}")
+    finally:
+        await bot_work.dp.emit_shutdown(bot=bot_work.bot)
+        await bot_work.bot.session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        logger.info(f"Worker {index} stopped")
+
+
+def run_worker(index: int, queue):
+    # Остановкой обработчиков управляет главный процесс, чтобы они успели доработать очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(worker_main(index, queue))
+
+
+async def polling_main(queues: list, processes: list):
+    bot = Bot(token=API_KEY)
+    loop = asyncio.get_running_loop()
+    offset = None
+
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        while True:
+            dead = [process.name for process in processes if not process.is_alive()]
+            if dead:
+                raise RuntimeError(f"Процессы-обработчики завершились: {', '.join(dead)}")
+
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=ALLOWED_UPDATES)
+            except (TelegramNetworkError, TelegramAPIError) as e:
+                logger.error(f"Failed to fetch updates: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                payload = update.model_dump(mode="json", exclude_unset=True)
+                # Ожидание при заполненной очереди тормозит получение обновлений
+                await loop.run_in_executor(None, queues[shard_key(update) % len(queues)].put, payload)
+                offset = update.update_id + 1
+    finally:
+        await bot.session.close()
+
+
+def main():
+    setup_logging()
+
+    if WORKER_PROCESSES < 1:
+        raise RuntimeError("Укажите WORKER_PROCESSES — число процессов-обработчиков")
+    if FSM_STORAGE != "postgres":
+        raise RuntimeError("Многопроцессный режим требует общего хранилища FSM: FSM_STORAGE=postgres")
+
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue(maxsize=WORKER_QUEUE_SIZE) for _ in range(WORKER_PROCESSES)]
+    processes = [
+        context.Process(target=run_worker, args=(index, queue), name=f"bot-worker-{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {len(processes)} worker processes")
+
+    try:
+        asyncio.run(polling_main(queues, processes))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for queue, process in zip(queues, processes):
+            if process.is_alive():
+                queue.put(None)
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Параллельная обработка обновлений с сохранением порядка для каждого пользователя.
+
+У каждого пользователя своя очередь: обновления одного пользователя выполняются строго по порядку
+(FSM не ломается от двойного нажатия), а разные пользователи обрабатываются параллельно —
+одновременно выполняется не больше UPDATE_WORKERS обработчиков.
+
+Polling только раскладывает обновления по очередям: долгий обработчик задерживает лишь обновления
+своего пользователя. Всего ждать обработки может не больше UPDATE_MAX_PENDING обновлений — когда
+обработчики не успевают (например, медленная база), polling ждет свободного места и замедляется,
+а память не растет. Нажатия на кнопки сверх UPDATE_QUEUE_SIZE в очереди одного пользователя
+отбрасываются с ответом на callback; сообщения не отбрасываются никогда.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+queue_wait = registry.histogram("bot_update_queue_wait_seconds", "Время ожидания обновления в очереди пользователя")
+queue_errors = registry.counter("bot_update_queue_errors_total", "Необработанные исключения в обработчиках очередей")
+queue_dropped = registry.counter("bot_update_queue_dropped_total", "Нажатия на кнопки, отброшенные из-за переполненной очереди пользователя")
+queue_backpressure = registry.histogram("bot_update_queue_backpressure_seconds", "Сколько polling ждал свободного места в очередях")
+
+
+class PerUserQueueMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для dp.update: ставит обновление в очередь пользователя и сразу возвращается.
+    Очередь пользователя разбирает своя задача, которая живет, пока в очереди есть обновления.
+    Регистрируется вместе с start/stop на startup/shutdown диспетчера.
+    Пока обработка не запущена (например, в нагрузочном тесте), обновления обрабатываются напрямую.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int, max_pending: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_pending = max_pending
+        self.semaphore: asyncio.Semaphore | None = None
+        self.pending: asyncio.Semaphore | None = None  # Места для обновлений, ожидающих обработки
+        self.queues: dict[int, deque] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict
+    ) -> Any:
+        if self.semaphore is None:
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key = user.id if user else (chat.id if chat else 0)
+
+        queue = self.queues.get(key)
+        callback_query = event.callback_query if isinstance(event, Update) else None
+        if queue is not None and len(queue) >= self.queue_size and callback_query is not None:
+            queue_dropped.inc()
+            logger.warning(f"Update queue of {key} is full, dropping callback {callback_query.data}")
+            try:
+                await callback_query.answer("Бот обрабатывает предыдущие нажатия, повторите чуть позже.")
+            except TelegramAPIError as e:
+                logger.debug(f"Failed to answer dropped callback: {e}")
+            return None
+
+        # Backpressure: при переполнении polling ждет здесь, пока обработчики не освободят место
+        started = time.perf_counter()
+        await self.pending.acquire()  # type: ignore
+        queue_backpressure.observe(time.perf_counter() - started)
+
+        queue = self.queues.get(key)  # Пока ждали, очередь могла опустеть и удалиться
+        if queue is None:
+            queue = self.queues[key] = deque()
+            task = asyncio.create_task(self._drain(key, queue))
+            self.tasks.add(task)  # Держим ссылку, иначе задача может быть собрана до завершения
+            task.add_done_callback(self.tasks.discard)
+
+        queue.append((handler, event, data, time.perf_counter()))
+
+    async def _drain(self, key: int, queue: deque):
+        try:
+            while queue:
+                handler, event, data, enqueued = queue[0]
+                try:
+                    async with self.semaphore:  # type: ignore
+                        queue_wait.observe(time.perf_counter() - enqueued)
+                        await self._handle(handler, event, data)
+                finally:
+                    queue.popleft()
+                    self.pending.release()  # type: ignore
+        finally:
+            # Новые обновления пользователя создадут новую очередь и задачу
+            if self.queues.get(key) is queue:
+                del self.queues[key]
+
+    async def _handle(self, handler, event, data):
+        try:
+            # Состояние FSM было прочитано при постановке в очередь и могло устареть,
+            # пока выполнялись предыдущие обновления этого пользователя
+            state = data.get("state")
+            if state is not None:
+                data["raw_state"] = await state.get_state()
+            await handler(event, data)
+        except Exception as e:
+            queue_errors.inc()
+            logger.exception(f"Error processing update {getattr(event, 'update_id', '?')}: {e}")
+
+    async def start(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.pending = asyncio.Semaphore(self.max_pending)
+        logger.info(f"Processing updates with up to {self.concurrency} concurrent handlers and {self.max_pending} pending updates")
+
+    async def stop(self):
+        # Дорабатываем уже принятые обновления
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.semaphore = None
+        self.pending = None
@@ -0,0 +1,117 @@
+"""
+Кэш профилей пользователей для экранов, которые только читают данные (профиль, вывод средств, история).
+
+Хранит легкие снимки UserSnapshot по Telegram ID и читает базу только при промахе.
+Каждый код, который меняет пользователя (баланс, заработок, удаление), после коммита вызывает
+invalidate_user_snapshot. Сброс рассылается остальным процессам (sharded_bot.py) и экземплярам
+бота через PostgreSQL NOTIFY; отключить рассылку (USER_CACHE_BROADCAST=0) можно, только если бот
+запущен одним процессом в одном экземпляре.
+"""
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+from cachetools import TTLCache
+from sqlalchemy import text
+from sqlalchemy.future import select
+from config import USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_BROADCAST, WORKER_PROCESSES
+from database import User, engine, get_async_session
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "user_snapshot_invalidate"
+# Процессы sharded_bot.py делят пользователей, поэтому без рассылки им не обойтись
+BROADCAST = bool(USER_CACHE_BROADCAST or WORKER_PROCESSES)
+
+cache_requests = registry.counter("bot_user_cache_requests_total", "Обращения к кэшу профилей пользователей")
+
+
+class UserSnapshot(NamedTuple):
+    id: int
+    user_id: int
+    first_name_tg: str
+    last_name: str
+    first_name: str
+    patronymic: Optional[str]
+    phone_number: str
+    referral_earnings: float
+    work_earnings: float
+    account_balance: float
+    created_at: datetime
+
+
+SNAPSHOT_COLUMNS = [getattr(User, field) for field in UserSnapshot._fields]
+
+_cache: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# Увеличивается при каждом сбросе: снимок, прочитанный до сброса, не попадет в кэш
+_generation = 0
+_listener_connection = None
+
+
+async def get_user_snapshot(user_id: int) -> Optional[UserSnapshot]:
+    """
+    Возвращает снимок пользователя по Telegram ID (None, если пользователь не зарегистрирован).
+    """
+    snapshot = _cache.get(user_id)
+    if snapshot is not None:
+        cache_requests.inc(result="hit")
+        return snapshot
+
+    cache_requests.inc(result="miss")
+    generation = _generation
+    async with get_async_session() as session:
+        result = await session.execute(select(*SNAPSHOT_COLUMNS).where(User.user_id == user_id))
+        row = result.first()
+
+    if row is None:
+        return None
+
+    snapshot = UserSnapshot(*row)
+    if generation == _generation:
+        _cache[user_id] = snapshot
+    return snapshot
+
+
+def _drop(user_id: int):
+    global _generation
+    _generation += 1
+    _cache.pop(user_id, None)
+
+
+async def invalidate_user_snapshot(*user_ids: int):
+    """
+    Сбрасывает снимки пользователей. Вызывается после коммита изменений.
+    """
+    for user_id in user_ids:
+        _drop(user_id)
+
+    if BROADCAST and user_ids:
+        try:
+            async with engine.connect() as conn:
+                for user_id in user_ids:
+                    await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": INVALIDATION_CHANNEL, "payload": str(user_id)})
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to broadcast user snapshot invalidation for {user_ids}: {e}")
+
+
+def _on_invalidation(connection, pid, channel, payload):
+    _drop(int(payload))
+
+
+async def start_invalidation_listener():
+    """
+    Подписывается на сбросы кэша из других процессов. Держит отдельное соединение из пула.
+    """
+    global _listener_connection
+    _listener_connection = await engine.connect()
+    raw_connection = await _listener_connection.get_raw_connection()
+    await raw_connection.driver_connection.add_listener(INVALIDATION_CHANNEL, _on_invalidation)  # type: ignore
+    logger.info("Listening for user snapshot invalidations")
+
+
+async def stop_invalidation_listener():
+    global _listener_connection
+    if _listener_connection is not None:
+        await _listener_connection.close()
+        _listener_connection = None
@@ -0,0 +1,204 @@
+"""
+Легкие строки для экранов, которые только читают данные.
+
+Запросы выбирают только нужные колонки и возвращают именованные кортежи вместо ORM-объектов:
+без identity map, отслеживания изменений и загрузки лишних полей.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from database import User, Referral, BlackList, ReceiptHistory, WithdrawalHistory, Vacancy, UserHistoryTotals, ReferralClosure
+
+
+class ReceiptRow(NamedTuple):
+    id: int
+    amount: float
+    date: datetime
+    description: Optional[str]
+
+
+class WithdrawalRow(NamedTuple):
+    id: int
+    amount: float
+    withdrawal_date: datetime
+    status: str
+    is_urgent: bool
+    bank: Optional[str]
+    requisites: Optional[str]
+
+
+class ReferralRow(NamedTuple):
+    user_id: int
+    first_name_tg: str
+    is_blocked: bool
+
+
+class DownlineRow(NamedTuple):
+    members: int  # Все рефералы пользователя на всех уровнях
+    levels: int
+    work_earnings: float  # Заработок всей команды за смены
+
+
+class BranchRow(NamedTuple):
+    user_id: int  # Прямой реферал — корень ветки
+    first_name_tg: str
+    members: int  # Вместе с самим рефералом
+    work_earnings: float
+
+
+class VacancyRow(NamedTuple):
+    id: int
+    text: str
+    posted_at: datetime
+
+
+class QueueTransactionRow(NamedTuple):
+    id: int
+    user_id: int
+    amount: float
+    withdrawal_date: datetime
+    is_urgent: bool
+    bank: Optional[str]
+    requisites: Optional[str]
+    last_name: str
+    first_name: str
+    patronymic: Optional[str]
+    first_name_tg: str
+
+
+class ArchivedTotalsRow(NamedTuple):
+    receipts_count: int
+    receipts_amount: float
+    withdrawals_count: int
+    withdrawals_paid_amount: float
+
+
+async def fetch_rows(session: AsyncSession, row_type, statement) -> list:
+    result = await session.execute(statement)
+    return [row_type._make(row) for row in result]
+
+
+async def receipts_page(session: AsyncSession, user_id: int, page: int, per_page: int) -> tuple[list[ReceiptRow], bool]:
+    """
+    Страница истории поступлений и признак того, что есть следующая страница.
+    """
+    rows = await fetch_rows(session, ReceiptRow, (
+        select(ReceiptHistory.id, ReceiptHistory.amount, ReceiptHistory.date, ReceiptHistory.description)
+        .where(ReceiptHistory.user_id == user_id)
+        .order_by(ReceiptHistory.date.desc())
+        .offset((page - 1) * per_page).limit(per_page + 1)
+    ))
+    return rows[:per_page], len(rows) > per_page
+
+
+async def withdrawals_page(session: AsyncSession, user_id: int, page: int, per_page: int) -> tuple[list[WithdrawalRow], bool]:
+    """
+    Страница истории выводов и признак того, что есть следующая страница.
+    """
+    rows = await fetch_rows(session, WithdrawalRow, (
+        select(
+            WithdrawalHistory.id, WithdrawalHistory.amount, WithdrawalHistory.withdrawal_date, WithdrawalHistory.status,
+            WithdrawalHistory.is_urgent, WithdrawalHistory.bank, WithdrawalHistory.requisites
+        )
+        .where(WithdrawalHistory.user_id == user_id)
+        .order_by(WithdrawalHistory.withdrawal_date.desc())
+        .offset((page - 1) * per_page).limit(per_page + 1)
+    ))
+    return rows[:per_page], len(rows) > per_page
+
+
+async def archived_totals(session: AsyncSession, user_id: int) -> Optional[ArchivedTotalsRow]:
+    """
+    Итоги по истории пользователя, перенесенной в архив, или None, если архивной истории нет.
+    """
+    rows = await fetch_rows(session, ArchivedTotalsRow, (
+        select(
+            UserHistoryTotals.receipts_count, UserHistoryTotals.receipts_amount,
+            UserHistoryTotals.withdrawals_count, UserHistoryTotals.withdrawals_paid_amount
+        )
+        .where(UserHistoryTotals.user_id == user_id)
+    ))
+    return rows[0] if rows else None
+
+
+async def referrals_of(session: AsyncSession, user_pk: int) -> list[ReferralRow]:
+    """
+    Рефералы пользователя (users.id) с отметкой о блокировке — одним запросом.
+    """
+    return await fetch_rows(session, ReferralRow, (
+        select(User.user_id, User.first_name_tg, BlackList.id.is_not(None))
+        .join(Referral, Referral.referral_id == User.id)
+        .outerjoin(BlackList, BlackList.user_id == User.user_id)
+        .where(Referral.user_id == user_pk)
+        .order_by(Referral.date_joined)
+    ))
+
+
+async def downline_stats(session: AsyncSession, user_pk: int) -> DownlineRow:
+    """
+    Размер, глубина и заработок всей команды пользователя (users.id) — одним запросом по referral_closure.
+    """
+    rows = await fetch_rows(session, DownlineRow, (
+        select(
+            func.count(ReferralClosure.descendant_id),
+            func.coalesce(func.max(ReferralClosure.depth), 0),
+            func.coalesce(func.sum(User.work_earnings), 0.0)
+        )
+        .join(User, User.id == ReferralClosure.descendant_id)
+        .where(ReferralClosure.ancestor_id == user_pk, ReferralClosure.depth > 0)
+    ))
+    return rows[0]
+
+
+async def branch_stats(session: AsyncSession, user_pk: int, limit: int) -> list[BranchRow]:
+    """
+    Ветки команды пользователя (по прямым рефералам), отсортированные по заработку.
+    """
+    root = aliased(User)
+    branch = aliased(ReferralClosure)
+    member = aliased(User)
+    earnings = func.coalesce(func.sum(member.work_earnings), 0.0)  # Иначе ветки без заработка (NULL) в Postgres идут первыми
+    return await fetch_rows(session, BranchRow, (
+        select(root.user_id, root.first_name_tg, func.count(branch.descendant_id), earnings)
+        .select_from(ReferralClosure)
+        .join(root, root.id == ReferralClosure.descendant_id)
+        .join(branch, branch.ancestor_id == ReferralClosure.descendant_id)
+        .join(member, member.id == branch.descendant_id)
+        .where(ReferralClosure.ancestor_id == user_pk, ReferralClosure.depth == 1)
+        .group_by(root.user_id, root.first_name_tg)
+        .order_by(earnings.desc())
+        .limit(limit)
+    ))
+
+
+async def active_vacancies_page(session: AsyncSession, page: int, per_page: int) -> tuple[list[VacancyRow], int]:
+    """
+    Страница активных вакансий и общее число активных вакансий.
+    """
+    result = await session.execute(select(func.count(Vacancy.id)).where(Vacancy.status == 'active'))
+    total = result.scalar() or 0
+
+    rows = await fetch_rows(session, VacancyRow, (
+        select(Vacancy.id, Vacancy.text, Vacancy.posted_at)
+        .where(Vacancy.status == 'active')
+        .order_by(Vacancy.posted_at)
+        .offset((page - 1) * per_page).limit(per_page)
+    ))
+    return rows, total
+
+
+def transaction_queue_select():
+    """
+    Заявки очереди вместе с ФИО пользователя; условия, порядок и страницу добавляет вызывающий код.
+    """
+    return (
+        select(
+            WithdrawalHistory.id, WithdrawalHistory.user_id, WithdrawalHistory.amount, WithdrawalHistory.withdrawal_date,
+            WithdrawalHistory.is_urgent, WithdrawalHistory.bank, WithdrawalHistory.requisites,
+            User.last_name, User.first_name, User.patronymic, User.first_name_tg
+        )
+        .join(User, User.user_id == WithdrawalHistory.user_id)
+    )